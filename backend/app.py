@@ -1,6 +1,6 @@
 from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, joinedload, contains_eager
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta
 from pydantic import BaseModel
@@ -12,8 +12,10 @@ from threading import Event
 
 from models import (
     get_db, create_tables, Symbol, StockPrice, OptionContract,
-    OptionPrice, IVAnalysis, TradingOpportunity, UserWatchlist
+    OptionPrice, IVAnalysis, TradingOpportunity, UserWatchlist,
+    OptionType, OpportunityType
 )
+from migrations import run_migrations
 from data_fetcher import DataFetcher
 from opportunities import OpportunityDetector
 
@@ -151,6 +153,8 @@ async def startup_event():
     """Initialize database on startup"""
     create_tables()
     logger.info("Database tables created/verified")
+    # Migrate before serving; the worker may not have started yet
+    run_migrations()
     logger.info("API ready - background worker handles scheduled tasks")
 
     # Setup signal handlers for graceful shutdown
@@ -359,6 +363,8 @@ async def get_option_contracts(
     )
 
     if option_type:
+        if option_type.lower() not in OptionType.CODES:
+            return []
         query = query.filter(OptionContract.option_type == option_type.lower())
     if min_expiry:
         query = query.filter(OptionContract.expiry_date >= min_expiry)
@@ -460,6 +466,8 @@ async def get_opportunities(
     if min_score is not None:
         query = query.filter(TradingOpportunity.score >= min_score)
     if opportunity_type:
+        if opportunity_type.lower() not in OpportunityType.CODES:
+            return []
         query = query.filter(TradingOpportunity.opportunity_type == opportunity_type)
 
     opportunities = query.order_by(
@@ -482,12 +490,13 @@ async def get_symbol_opportunities(
     if not symbol_obj:
         raise HTTPException(status_code=404, detail="Symbol not found")
 
-    # Get opportunities through option contracts
-    opportunities = db.query(TradingOpportunity).options(
-        joinedload(TradingOpportunity.contract)
-    ).join(
+    # Get opportunities through option contracts, filling each
+    # opportunity's contract from the same join
+    opportunities = db.query(TradingOpportunity).join(
         OptionContract,
         TradingOpportunity.contract_id == OptionContract.id
+    ).options(
+        contains_eager(TradingOpportunity.contract)
     ).filter(
         OptionContract.symbol_id == symbol_obj.id,
         TradingOpportunity.is_active == is_active
@@ -9,6 +9,7 @@ This module now contains only helper functions for:
 - Intrinsic and time value calculations
 - IV analysis (rank, percentile, historical volatility)
 """
+import math
 import numpy as np
 import pandas as pd
 from datetime import datetime
@@ -22,10 +23,55 @@ except ImportError:
     logging.warning("py_vollib not available, using scipy fallback")
     bs_price = None
 
-from scipy.stats import norm
+try:
+    from numba import njit
+except ImportError:
+    logging.warning("numba not available, Black-Scholes kernel runs as plain Python")
+    njit = None
 
 logger = logging.getLogger(__name__)
 
+# Standard normal density constant, so n(x) is a single exp() instead of a
+# scipy.stats.norm call
+_INV_SQRT_2PI = 1.0 / math.sqrt(2.0 * math.pi)
+_INV_SQRT_2 = 1.0 / math.sqrt(2.0)
+
+# Batch pricing treats an option as worth its discounted intrinsic value once
+# both of its d1/d2 terms lie beyond this many standard deviations in the money
+DEEP_ITM_STDEVS = 6.0
+
+
+def _jit(func):
+    """Compile func with numba when it is installed, otherwise leave it as is"""
+    if njit is None:
+        return func
+    return njit(cache=True, fastmath=True)(func)
+
+
+@_jit
+def _bs_price_and_vega(S, K, t, sigma, r, is_call):
+    """
+    Black-Scholes price and vega (per 1% vol) for a single option
+
+    Scalar math-module kernel for the per-contract paths (theoretical price,
+    Newton-Raphson IV); numba compiles it to native code when available.
+    """
+    sqrt_t = math.sqrt(t)
+    d1 = (math.log(S / K) + (r + 0.5 * sigma * sigma) * t) / (sigma * sqrt_t)
+    d2 = d1 - sigma * sqrt_t
+    discounted_strike = K * math.exp(-r * t)
+
+    # N(x) as 0.5 * erfc(-x / sqrt(2)) keeps its relative accuracy in the
+    # lower tail, where 1 + erf(x) cancels to 0; puts use N(-d1)/N(-d2)
+    # directly for the same reason
+    sign = 1.0 if is_call else -1.0
+    nd1 = 0.5 * math.erfc(-sign * d1 * _INV_SQRT_2)
+    nd2 = 0.5 * math.erfc(-sign * d2 * _INV_SQRT_2)
+    price = sign * (S * nd1 - discounted_strike * nd2)
+
+    vega = S * _INV_SQRT_2PI * math.exp(-0.5 * d1 * d1) * sqrt_t / 100.0
+    return price, vega
+
 
 class OptionsCalculator:
     """
@@ -35,6 +81,8 @@ class OptionsCalculator:
     This calculator provides helper functions for pricing and analysis.
     """
 
+    __slots__ = ('risk_free_rate', 'use_py_vollib')
+
     def __init__(self, risk_free_rate: float = 0.05):
         """
         Initialize calculator
@@ -45,17 +93,20 @@ class OptionsCalculator:
         self.risk_free_rate = risk_free_rate
         self.use_py_vollib = bs_price is not None
 
-    def calculate_time_to_expiry(self, expiry_date: datetime) -> float:
+    def calculate_time_to_expiry(self, expiry_date: datetime, now: Optional[datetime] = None) -> float:
         """
         Calculate time to expiry in years
 
         Args:
             expiry_date: Option expiration date
+            now: Reference time; batch callers pass one shared value
+                (defaults to datetime.now())
 
         Returns:
             Time to expiry in years
         """
-        now = datetime.now()
+        if now is None:
+            now = datetime.now()
         days_to_expiry = (expiry_date - now).total_seconds() / 86400
         return max(days_to_expiry / 365.0, 0.0001)  # Minimum to avoid division by zero
 
@@ -114,13 +165,79 @@ class OptionsCalculator:
         sigma: float, option_type: str, r: float
     ) -> float:
         """Scipy fallback for Black-Scholes pricing"""
-        d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * t) / (sigma * np.sqrt(t))
-        d2 = d1 - sigma * np.sqrt(t)
+        price, _ = _bs_price_and_vega(float(S), float(K), float(t), float(sigma), float(r), option_type.lower() == 'call')
+        return price
 
-        if option_type.lower() == 'call':
-            price = S * norm.cdf(d1) - K * np.exp(-r * t) * norm.cdf(d2)
-        else:
-            price = K * np.exp(-r * t) * norm.cdf(-d2) - S * norm.cdf(-d1)
+    def calculate_theoretical_prices(
+        self,
+        stock_price,
+        strike_price,
+        time_to_expiry,
+        volatility,
+        is_call,
+        risk_free_rate: Optional[float] = None
+    ) -> np.ndarray:
+        """
+        Calculate Black-Scholes prices for a whole batch of options at once
+
+        Inputs may be scalars or NumPy arrays and are broadcast together, so
+        an entire option chain is priced with a handful of array operations.
+
+        Args:
+            stock_price: Current stock price(s)
+            strike_price: Option strike price(s)
+            time_to_expiry: Time(s) to expiry in years
+            volatility: Volatility(ies) as decimals
+            is_call: True for calls, False for puts (bool or bool array)
+            risk_free_rate: Risk-free rate
+
+        Returns:
+            Array of theoretical option prices
+        """
+        if risk_free_rate is None:
+            risk_free_rate = self.risk_free_rate
+
+        S, K, t, sigma, is_call = np.broadcast_arrays(
+            np.asarray(stock_price, dtype=np.float64),
+            np.asarray(strike_price, dtype=np.float64),
+            np.asarray(time_to_expiry, dtype=np.float64),
+            np.asarray(volatility, dtype=np.float64),
+            np.asarray(is_call, dtype=bool)
+        )
+        r = risk_free_rate
+
+        moneyness = np.log(S / K)
+        vol_sqrt_t = sigma * np.sqrt(t)
+        discounted_strike = K * np.exp(-r * t)
+
+        # d1/d2 include the (r +/- sigma^2/2)t drift, which for low-vol,
+        # long-dated lanes moves them well away from moneyness / sigma*sqrt(t)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            d1 = (moneyness + (r + 0.5 * sigma ** 2) * t) / vol_sqrt_t
+        d2 = d1 - vol_sqrt_t
+
+        # A call with d2 (a put with -d1) beyond 6 has both of its CDFs within
+        # ~1e-9 of 1, so it takes its intrinsic limit S - K*exp(-rt) (resp.
+        # K*exp(-rt) - S), off by at most ~1e-9 * (S + K), and ndtr skips the
+        # lane. Out-of-the-money options are always priced exactly: callers
+        # compare them in relative terms, and a 0 there would hide a quote far
+        # above fair value.
+        deep_itm = np.where(is_call, d2 > DEEP_ITM_STDEVS, -d1 > DEEP_ITM_STDEVS)
+        price = np.where(is_call, S - discounted_strike, discounted_strike - S)
+
+        exact = ~deep_itm
+        if exact.any():
+            # Only the batch path needs scipy; importing it here keeps it off
+            # the module import path
+            from scipy.special import ndtr
+
+            # Calls and puts share one formula with the signs of d1/d2 flipped,
+            # which keeps each option's own tail probabilities (no put-call
+            # parity cancellation for far out-of-the-money puts)
+            sign = np.where(is_call[exact], 1.0, -1.0)
+            price[exact] = sign * (
+                S[exact] * ndtr(sign * d1[exact]) - discounted_strike[exact] * ndtr(sign * d2[exact])
+            )
 
         return price
 
@@ -181,10 +298,12 @@ class OptionsCalculator:
     ) -> Optional[float]:
         """Newton-Raphson method for IV calculation"""
         sigma = 0.5  # Initial guess
+        is_call = option_type.lower() == 'call'
+        S, K, t, r = float(S), float(K), float(t), float(r)
 
         for _ in range(max_iterations):
-            price = self._bs_price_scipy(S, K, t, sigma, option_type, r)
-            vega_val = self._calculate_vega_scipy(S, K, t, sigma, r)
+            # Price and vega from one kernel call (shared d1)
+            price, vega_val = _bs_price_and_vega(S, K, t, sigma, r, is_call)
 
             diff = price - target_price
 
@@ -203,8 +322,8 @@ class OptionsCalculator:
 
     def _calculate_vega_scipy(self, S: float, K: float, t: float, sigma: float, r: float) -> float:
         """Calculate vega using scipy"""
-        d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * t) / (sigma * np.sqrt(t))
-        return S * norm.pdf(d1) * np.sqrt(t) / 100.0
+        _, vega = _bs_price_and_vega(float(S), float(K), float(t), float(sigma), float(r), True)
+        return vega
 
     def calculate_intrinsic_value(
         self,
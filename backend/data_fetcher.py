@@ -6,13 +6,21 @@ Fetches stock and options data from IVolatility REST API
 import os
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Dict, List, Optional
+import numpy as np
 import pandas as pd
 import ivolatility as ivol
 from sqlalchemy.orm import Session
 
-from models import Symbol, StockPrice, OptionContract, OptionPrice, IVAnalysis, SessionLocal, UserWatchlist
+from models import (
+    Symbol, StockPrice, OptionContract, OptionPrice, IVAnalysis, SessionLocal, UserWatchlist,
+    UPSERT_INSERTS, analyze_tables, begin_write_transaction, bulk_insert, insert_statement, update_or_insert_rows, contract_key
+)
+from rate_limiter import TokenBucket
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,12 +38,71 @@ if not IVOLATILITY_API_KEY:
 # Configure IVolatility SDK
 ivol.setLoginParams(apiKey=IVOLATILITY_API_KEY)
 
+@lru_cache(maxsize=None)
+def ivol_method(endpoint: str):
+    """Return the IVolatility SDK callable for an endpoint, built once per process"""
+    return ivol.setMethod(endpoint)
+
+
+# Shared pacing for every IVolatility call, across all fetch threads
+IVOLATILITY_CALLS_PER_SECOND = 2
+
+# Number of symbols fetched concurrently by update_all_symbols
+IVOLATILITY_FETCH_WORKERS = int(os.getenv('IVOLATILITY_FETCH_WORKERS', '4'))
+
+# Number of options-rawiv pricing batches requested concurrently per symbol
+OPTION_PRICING_WORKERS = 4
+
+# Option series (contract listings) change rarely intraday, so they are
+# reused for this many seconds before being fetched again
+OPTION_CHAIN_CACHE_TTL = 3600
+
+# Columns of the stock-prices payload we keep, mapped to our internal names
+STOCK_PRICE_COLUMNS = {
+    'date': 'Date',
+    'open': 'Open',
+    'high': 'High',
+    'low': 'Low',
+    'close': 'Close',
+    'volume': 'Volume'
+}
+
+# StockPrice columns an upsert overwrites on a bar that is already stored
+STOCK_PRICE_VALUE_COLUMNS = ('open_price', 'high_price', 'low_price', 'close_price', 'volume')
+
+# Repeated short labels in the options frames are stored as categoricals;
+# a fixed dtype keeps call and put frames concatenating as categorical
+OPTION_TYPE_DTYPE = pd.CategoricalDtype(['call', 'put'])
+
+# Columns of the options frame stored on OptionPrice, keyed by frame column
+OPTION_PRICE_FLOAT_FIELDS = {
+    'bid': 'bid',
+    'ask': 'ask',
+    'lastPrice': 'last_price',
+    'impliedVolatility': 'implied_volatility',
+    'delta': 'delta',
+    'gamma': 'gamma',
+    'theta': 'theta',
+    'vega': 'vega',
+    'rho': 'rho'
+}
+OPTION_PRICE_INT_FIELDS = {
+    'volume': 'volume',
+    'openInterest': 'open_interest'
+}
+
+
 class IVolatilityDataFetcher:
     """Data fetcher using IVolatility API"""
 
+    __slots__ = ('session', 'api_key', '_chain_cache', '_symbol_ids', 'rate_limiter')
+
     def __init__(self):
         self.session = None
         self.api_key = IVOLATILITY_API_KEY
+        self._chain_cache = {}  # (symbol, days_forward) -> (expires_at, DataFrame)
+        self._symbol_ids = {}  # symbol -> Symbol.id (rows are never deleted, so IDs are stable)
+        self.rate_limiter = TokenBucket(IVOLATILITY_CALLS_PER_SECOND, period=1.0)
 
     def get_session(self) -> Session:
         """Get database session"""
@@ -49,40 +116,87 @@ class IVolatilityDataFetcher:
             self.session.close()
             self.session = None
 
+    def fork(self) -> 'IVolatilityDataFetcher':
+        """
+        Fetcher with its own database session that shares this fetcher's
+        option chain and symbol ID caches and API rate limiter
+
+        A Session must not be used from two threads at once, so concurrent
+        jobs each store through a fork of one long-lived fetcher.
+        """
+        fetcher = IVolatilityDataFetcher()
+        fetcher._chain_cache = self._chain_cache
+        fetcher._symbol_ids = self._symbol_ids
+        fetcher.rate_limiter = self.rate_limiter
+        return fetcher
+
+    def get_symbol_id(self, symbol: str) -> Optional[int]:
+        """
+        Resolve a symbol to its database ID, querying only on the first lookup
+
+        Args:
+            symbol: Stock symbol
+
+        Returns:
+            Symbol ID, or None if the symbol is not in the database
+        """
+        symbol = symbol.upper()
+        symbol_id = self._symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self.get_session().query(Symbol.id).filter(Symbol.symbol == symbol).scalar()
+            if symbol_id is not None:
+                self._symbol_ids[symbol] = symbol_id
+        return symbol_id
+
     def add_symbol_to_watchlist(self, symbol: str, company_name: str = None) -> bool:
         """Add a symbol to the database and watchlist"""
-        try:
-            db = self.get_session()
+        return self.add_symbols_to_watchlist([symbol], {symbol: company_name} if company_name else None)
 
-            # Check if symbol already exists
-            existing = db.query(Symbol).filter(Symbol.symbol == symbol.upper()).first()
-            if existing:
-                logger.info(f"Symbol {symbol} already exists")
-                existing.is_active = True
-                db.commit()
-                return True
+    def add_symbols_to_watchlist(self, symbols: List[str], company_names: Optional[Dict[str, str]] = None) -> bool:
+        """
+        Add several symbols to the database and watchlist in one transaction
 
-            # Get company info if not provided
-            if not company_name:
-                company_name = symbol.upper()
+        Args:
+            symbols: Stock symbols to add
+            company_names: Optional mapping of symbol to company name
 
-            # Create new symbol
-            new_symbol = Symbol(
-                symbol=symbol.upper(),
-                company_name=company_name,
-                sector="",
-                is_active=True
-            )
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            db = self.get_session()
 
-            db.add(new_symbol)
+            wanted = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+            names = {symbol.upper(): name for symbol, name in (company_names or {}).items()}
+
+            # Reactivate the symbols that already exist (one SELECT for all)
+            existing = db.query(Symbol).filter(Symbol.symbol.in_(wanted)).all()
+            for symbol_obj in existing:
+                logger.info(f"Symbol {symbol_obj.symbol} already exists")
+                symbol_obj.is_active = True
+
+            # Create the rest
+            known = {symbol_obj.symbol for symbol_obj in existing}
+            new_symbols = [
+                Symbol(
+                    symbol=symbol,
+                    company_name=names.get(symbol) or symbol,
+                    sector="",
+                    is_active=True
+                )
+                for symbol in wanted if symbol not in known
+            ]
+
+            db.add_all(new_symbols)
             db.commit()
-            db.refresh(new_symbol)
 
-            logger.info(f"Added symbol {symbol} to watchlist")
+            self._symbol_ids.update((symbol_obj.symbol, symbol_obj.id) for symbol_obj in existing + new_symbols)
+            for symbol_obj in new_symbols:
+                logger.info(f"Added symbol {symbol_obj.symbol} to watchlist")
             return True
 
         except Exception as e:
-            logger.error(f"Error adding symbol {symbol}: {str(e)}")
+            logger.error(f"Error adding symbols {', '.join(symbols)}: {str(e)}")
             db.rollback()
             return False
 
@@ -101,13 +215,14 @@ class IVolatilityDataFetcher:
             logger.info(f"Fetching stock data for {symbol} (last {days} days)")
 
             # Set up the API method
-            getStockPrices = ivol.setMethod('/equities/eod/stock-prices')
+            getStockPrices = ivol_method('/equities/eod/stock-prices')
 
             # Calculate date range
             to_date = datetime.now()
             from_date = to_date - timedelta(days=days)
 
             # Fetch data
+            self.rate_limiter.acquire()
             df = getStockPrices(
                 symbol=symbol.upper(),
                 **{
@@ -120,22 +235,18 @@ class IVolatilityDataFetcher:
                 logger.warning(f"No stock data returned for {symbol}")
                 return None
 
-            # Rename columns to match our internal format
-            df = df.rename(columns={
-                'date': 'Date',
-                'open': 'Open',
-                'high': 'High',
-                'low': 'Low',
-                'close': 'Close',
-                'volume': 'Volume'
-            })
-
-            # Ensure Date is datetime
+            # Keep only the OHLCV columns we store, renamed to our internal
+            # format, so the remaining steps don't carry the rest of the payload
+            df = df[list(STOCK_PRICE_COLUMNS)].rename(columns=STOCK_PRICE_COLUMNS)
+
+            # Cast each column once to the types the models store
             df['Date'] = pd.to_datetime(df['Date'])
+            df[['Open', 'High', 'Low', 'Close']] = df[['Open', 'High', 'Low', 'Close']].astype(np.float64)
+            df['Volume'] = df['Volume'].fillna(0).astype(np.int64)
             df['Symbol'] = symbol.upper()
 
             # Sort by date
-            df = df.sort_values('Date')
+            df = df.sort_values('Date', ignore_index=True)
 
             logger.info(f"Fetched {len(df)} days of stock data for {symbol}")
             return df
@@ -155,17 +266,24 @@ class IVolatilityDataFetcher:
         Returns:
             DataFrame with options chain or None on error
         """
+        cache_key = (symbol.upper(), days_forward)
+        cached = self._chain_cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            logger.info(f"Using cached options chain for {symbol}")
+            return cached[1]
+
         try:
             logger.info(f"Fetching options chain for {symbol}")
 
             # Set up the API method
-            getOptionsChain = ivol.setMethod('/equities/option-series')
+            getOptionsChain = ivol_method('/equities/option-series')
 
             # Calculate date range
             today = datetime.now()
             expiry_end = today + timedelta(days=days_forward)
 
             # Fetch options chain
+            self.rate_limiter.acquire()
             df = getOptionsChain(
                 symbol=symbol.upper(),
                 expFrom=today.strftime('%Y-%m-%d'),
@@ -179,7 +297,11 @@ class IVolatilityDataFetcher:
             # Ensure expiration date is datetime
             df['expirationDate'] = pd.to_datetime(df['expirationDate'])
 
+            # Only two distinct values across the whole chain
+            df['callPut'] = df['callPut'].astype('category')
+
             logger.info(f"Fetched {len(df)} option contracts for {symbol}")
+            self._chain_cache[cache_key] = (time.monotonic() + OPTION_CHAIN_CACHE_TTL, df)
             return df
 
         except Exception as e:
@@ -203,28 +325,25 @@ class IVolatilityDataFetcher:
             logger.info(f"Fetching pricing for {len(option_symbols)} option contracts")
 
             # Set up the API method for real-time options with IV
-            getOptionPricing = ivol.setMethod('/equities/rt/options-rawiv')
+            getOptionPricing = ivol_method('/equities/rt/options-rawiv')
 
             # Fetch pricing data (API accepts comma-separated symbols)
-            # Process in batches of 50 to avoid URL length issues
+            # Process in batches of 50 to avoid URL length issues, with the
+            # batches in flight concurrently (paced by the shared rate limiter)
             batch_size = 50
-            all_data = []
-
-            for i in range(0, len(option_symbols), batch_size):
-                batch = option_symbols[i:i+batch_size]
-                symbols_str = ','.join(batch)
+            batches = [option_symbols[i:i+batch_size] for i in range(0, len(option_symbols), batch_size)]
 
+            def fetch_batch(batch_num, batch):
                 try:
-                    df = getOptionPricing(symbols=symbols_str)
-                    if df is not None and not df.empty:
-                        all_data.append(df)
+                    self.rate_limiter.acquire()
+                    return getOptionPricing(symbols=','.join(batch))
                 except Exception as e:
-                    logger.warning(f"Error fetching batch {i//batch_size + 1}: {str(e)}")
-                    continue
+                    logger.warning(f"Error fetching batch {batch_num}: {str(e)}")
+                    return None
 
-                # Small delay between batches
-                if i + batch_size < len(option_symbols):
-                    time.sleep(0.5)
+            with ThreadPoolExecutor(max_workers=OPTION_PRICING_WORKERS) as batch_pool:
+                results = batch_pool.map(fetch_batch, range(1, len(batches) + 1), batches)
+                all_data = [df for df in results if df is not None and not df.empty]
 
             if not all_data:
                 logger.warning("No pricing data returned from API")
@@ -253,67 +372,65 @@ class IVolatilityDataFetcher:
             if chain_df is None or chain_df.empty:
                 return {}
 
-            # Get unique expiration dates
-            expirations = sorted(chain_df['expirationDate'].unique())
-
             options_data = {}
 
+            # Only the first 6 expirations are kept, so only price those
+            # contracts (fewer rawiv batches for the concurrent pricing pool)
+            nearest_expirations = sorted(chain_df['expirationDate'].unique())[:6]
+            chain_df = chain_df[chain_df['expirationDate'].isin(nearest_expirations)]
+
             # Fetch pricing for all contracts at once
             all_symbols = chain_df['OptionSymbol'].tolist()
             pricing_df = self.fetch_option_pricing(all_symbols)
 
-            # Create a lookup dict for pricing data
-            pricing_lookup = {}
+            # Index pricing by contract symbol for vectorized lookups
+            # (later rows win, as with the old per-row dict)
+            pricing = None
             if pricing_df is not None and not pricing_df.empty:
-                for _, row in pricing_df.iterrows():
-                    pricing_lookup[row['symbol']] = row
-
-            # Process each expiration date
-            for exp_date in expirations[:6]:  # Limit to first 6 expirations
-                exp_str = pd.to_datetime(exp_date).strftime('%Y-%m-%d')
-
-                # Filter for this expiration
-                exp_df = chain_df[chain_df['expirationDate'] == exp_date].copy()
+                pricing = pricing_df.drop_duplicates('symbol', keep='last').set_index('symbol')
 
-                # Split into calls and puts
-                calls = exp_df[exp_df['callPut'] == 'C'].copy()
-                puts = exp_df[exp_df['callPut'] == 'P'].copy()
+            # Format the data to match our expected structure
+            def format_chain_data(df):
+                if df.empty:
+                    return df
 
-                # Format the data to match our expected structure
-                def format_chain_data(df):
-                    if df.empty:
-                        return df
+                quotes = pricing.reindex(df['OptionSymbol']) if pricing is not None else pd.DataFrame(index=df['OptionSymbol'])
 
-                    df = df.rename(columns={
-                        'OptionSymbol': 'contractSymbol',
-                        'strike': 'strike',
-                        'expirationDate': 'expiry_date',
-                        'callPut': 'option_type'
-                    })
+                def quote(column, default=0.0):
+                    if column not in quotes:
+                        return default
+                    return quotes[column].fillna(default).to_numpy()
 
+                return df.rename(columns={
+                    'OptionSymbol': 'contractSymbol',
+                    'expirationDate': 'expiry_date',
+                    'callPut': 'option_type'
+                }).assign(
                     # Map C/P to call/put
-                    df['option_type'] = df['option_type'].map({'C': 'call', 'P': 'put'})
-
-                    # Merge pricing data
-                    for idx, row in df.iterrows():
-                        contract_symbol = row['contractSymbol']
-                        pricing = pricing_lookup.get(contract_symbol, {})
-
-                        df.at[idx, 'lastPrice'] = pricing.get('lastPrice', 0.0)
-                        df.at[idx, 'bid'] = pricing.get('bidPrice', 0.0)
-                        df.at[idx, 'ask'] = pricing.get('askPrice', 0.0)
-                        df.at[idx, 'volume'] = pricing.get('cumulativeVolume', 0)
-                        df.at[idx, 'openInterest'] = pricing.get('openInterest', 0)
-                        df.at[idx, 'impliedVolatility'] = pricing.get('iv', 0.0)
-                        df.at[idx, 'delta'] = pricing.get('delta', 0.0)
-                        df.at[idx, 'gamma'] = pricing.get('gamma', 0.0)
-                        df.at[idx, 'theta'] = pricing.get('theta', 0.0)
-                        df.at[idx, 'vega'] = pricing.get('vega', 0.0)
-                        df.at[idx, 'rho'] = pricing.get('rho', 0.0)
-
-                    df['symbol'] = symbol.upper()
+                    option_type=df['callPut'].map({'C': 'call', 'P': 'put'}).astype(OPTION_TYPE_DTYPE),
+                    lastPrice=quote('lastPrice'),
+                    bid=quote('bidPrice'),
+                    ask=quote('askPrice'),
+                    volume=quote('cumulativeVolume', 0),
+                    openInterest=quote('openInterest', 0),
+                    impliedVolatility=quote('iv'),
+                    delta=quote('delta'),
+                    gamma=quote('gamma'),
+                    theta=quote('theta'),
+                    vega=quote('vega'),
+                    rho=quote('rho'),
+                    symbol=pd.Categorical([symbol.upper()] * len(df))
+                )
 
-                    return df
+            # Process each expiration date in one grouping pass over the chain
+            expiration_groups = chain_df.groupby('expirationDate', sort=True)
+            for exp_date, exp_df in expiration_groups:
+                exp_str = exp_date.strftime('%Y-%m-%d')
+
+                # Split into calls and puts (group frames are already independent)
+                sides = dict(tuple(exp_df.groupby('callPut', observed=True)))
+                calls = sides.get('C', exp_df.iloc[:0])
+                puts = sides.get('P', exp_df.iloc[:0])
 
                 calls = format_chain_data(calls)
                 puts = format_chain_data(puts)
@@ -329,250 +446,285 @@ class IVolatilityDataFetcher:
             logger.error(f"Error fetching options data for {symbol}: {str(e)}")
             return {}
 
-    def store_stock_data(self, symbol: str, stock_data: pd.DataFrame) -> bool:
-        """Store stock price data in database"""
+    @contextmanager
+    def _write_scope(self, commit: bool):
+        """
+        Transaction scope for one store call
+
+        With commit=True the session is committed when the block completes and
+        rolled back if it raises. With commit=False the block runs in a
+        savepoint instead, so a failing store only rolls back its own writes
+        and never what earlier stores left in the caller's transaction.
+        """
+        db = self.get_session()
+        if not commit:
+            with db.begin_nested():
+                yield db
+            return
+
         try:
-            db = self.get_session()
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
 
-            # Get symbol ID
-            symbol_obj = db.query(Symbol).filter(Symbol.symbol == symbol.upper()).first()
-            if not symbol_obj:
-                logger.error(f"Symbol {symbol} not found in database")
-                return False
-
-            # Process each row
-            for _, row in stock_data.iterrows():
-                # Check if this timestamp already exists
-                existing = db.query(StockPrice).filter(
-                    StockPrice.symbol_id == symbol_obj.id,
-                    StockPrice.timestamp == row['Date']
-                ).first()
-
-                if existing:
-                    # Update existing record
-                    existing.open_price = float(row['Open'])
-                    existing.high_price = float(row['High'])
-                    existing.low_price = float(row['Low'])
-                    existing.close_price = float(row['Close'])
-                    existing.volume = int(row['Volume'])
+    def store_stock_data(self, symbol: str, stock_data: pd.DataFrame, symbol_id: Optional[int] = None,
+                         commit: bool = True) -> bool:
+        """Store stock price data in database
+
+        With commit=False the write goes into a savepoint and the caller
+        commits the surrounding transaction.
+        """
+        try:
+            with self._write_scope(commit) as db:
+                # Get symbol ID unless the caller already has it
+                if symbol_id is None:
+                    symbol_id = self.get_symbol_id(symbol)
+                    if symbol_id is None:
+                        logger.error(f"Symbol {symbol} not found in database")
+                        return False
+
+                records = pd.DataFrame({
+                    'symbol_id': symbol_id,
+                    'timestamp': stock_data['Date'],
+                    'open_price': stock_data['Open'].astype(float),
+                    'high_price': stock_data['High'].astype(float),
+                    'low_price': stock_data['Low'].astype(float),
+                    'close_price': stock_data['Close'].astype(float),
+                    'volume': stock_data['Volume'].astype(int)
+                }).to_dict('records')
+
+                # Single upsert against the unique (symbol_id, timestamp) index:
+                # new bars are inserted, existing ones get the latest values
+                dialect = db.get_bind().dialect.name
+                if dialect in UPSERT_INSERTS:
+                    stmt = UPSERT_INSERTS[dialect](StockPrice.__table__)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['symbol_id', 'timestamp'],
+                        set_={column: stmt.excluded[column] for column in STOCK_PRICE_VALUE_COLUMNS}
+                    )
+                    db.execute(stmt, records)
                 else:
-                    # Create new record
-                    stock_price = StockPrice(
-                        symbol_id=symbol_obj.id,
-                        timestamp=row['Date'],
-                        open_price=float(row['Open']),
-                        high_price=float(row['High']),
-                        low_price=float(row['Low']),
-                        close_price=float(row['Close']),
-                        volume=int(row['Volume'])
+                    update_or_insert_rows(
+                        db.connection(), StockPrice.__table__, records,
+                        ['symbol_id', 'timestamp'], STOCK_PRICE_VALUE_COLUMNS
                     )
-                    db.add(stock_price)
 
-            db.commit()
-            logger.info(f"Stored {len(stock_data)} stock price records for {symbol}")
-            return True
+                logger.info(f"Stored {len(stock_data)} stock price records for {symbol}")
+                return True
 
         except Exception as e:
             logger.error(f"Error storing stock data for {symbol}: {str(e)}")
-            db.rollback()
             return False
 
-    def store_options_data(self, symbol: str, options_data: Dict) -> bool:
-        """Store options data in database"""
-        try:
-            db = self.get_session()
+    def store_options_data(self, symbol: str, options_data: Dict, symbol_id: Optional[int] = None,
+                           commit: bool = True) -> bool:
+        """Store options data in database
 
-            # Get symbol ID
-            symbol_obj = db.query(Symbol).filter(Symbol.symbol == symbol.upper()).first()
-            if not symbol_obj:
-                logger.error(f"Symbol {symbol} not found in database")
-                return False
-
-            contracts_added = 0
-            prices_added = 0
-
-            for exp_date, chains in options_data.items():
-                for option_type_label, chain_data in chains.items():
-                    for _, row in chain_data.iterrows():
-                        try:
-                            # Create or get option contract
-                            contract_symbol = row['contractSymbol'].strip()
-
-                            contract = db.query(OptionContract).filter(
-                                OptionContract.contract_symbol == contract_symbol
-                            ).first()
-
-                            if not contract:
-                                contract = OptionContract(
-                                    symbol_id=symbol_obj.id,
-                                    contract_symbol=contract_symbol,
-                                    expiry_date=pd.to_datetime(exp_date),
-                                    strike_price=float(row['strike']),
-                                    option_type=row['option_type'],
-                                    is_active=True
-                                )
-                                db.add(contract)
-                                db.flush()  # Get the ID
-                                contracts_added += 1
-
-                            # Store option price data (even if zeros)
-                            def safe_float(val, default=0.0):
-                                try:
-                                    result = float(val)
-                                    return result if not pd.isna(result) else default
-                                except (ValueError, TypeError):
-                                    return default
-
-                            def safe_int(val, default=0):
-                                try:
-                                    result = float(val)
-                                    return int(result) if not pd.isna(result) else default
-                                except (ValueError, TypeError):
-                                    return default
-
-                            option_price = OptionPrice(
-                                contract_id=contract.id,
-                                timestamp=datetime.now(),
-                                bid=safe_float(row.get('bid', 0)),
-                                ask=safe_float(row.get('ask', 0)),
-                                last_price=safe_float(row.get('lastPrice', 0)),
-                                volume=safe_int(row.get('volume', 0)),
-                                open_interest=safe_int(row.get('openInterest', 0)),
-                                implied_volatility=safe_float(row.get('impliedVolatility', 0)),
-                                delta=safe_float(row.get('delta', 0)),
-                                gamma=safe_float(row.get('gamma', 0)),
-                                theta=safe_float(row.get('theta', 0)),
-                                vega=safe_float(row.get('vega', 0)),
-                                rho=safe_float(row.get('rho', 0))
-                            )
-
-                            # Calculate spreads if we have real data
-                            bid = safe_float(row.get('bid', 0))
-                            ask = safe_float(row.get('ask', 0))
-                            if bid > 0 and ask > 0:
-                                option_price.bid_ask_spread = ask - bid
-                                mid_price = (bid + ask) / 2
-                                if mid_price > 0:
-                                    option_price.spread_percentage = (ask - bid) / mid_price * 100
-
-                            db.add(option_price)
-                            prices_added += 1
-
-                        except Exception as e:
-                            logger.error(f"Error processing option row: {str(e)}")
-                            continue
+        With commit=False the writes go into a savepoint and the caller
+        commits the surrounding transaction.
+        """
+        try:
+            with self._write_scope(commit) as db:
+                # Get symbol ID unless the caller already has it
+                if symbol_id is None:
+                    symbol_id = self.get_symbol_id(symbol)
+                    if symbol_id is None:
+                        logger.error(f"Symbol {symbol} not found in database")
+                        return False
+
+                # Flatten every chain into one frame
+                frames = [
+                    chain_data
+                    for chains in options_data.values()
+                    for chain_data in chains.values()
+                    if not chain_data.empty
+                ]
+                if not frames:
+                    logger.info(f"Stored 0 new contracts and 0 price records for {symbol}")
+                    return True
+
+                df = pd.concat(frames, ignore_index=True)
+
+                # fetch_options_chain already parsed expirations into datetimes,
+                # so this is a no-op unless a caller passed strings
+                df['expiry'] = pd.to_datetime(df['expiry_date'])
+
+                # Drop rows that can't form a contract
+                df['strike'] = pd.to_numeric(df['strike'], errors='coerce')
+                valid = df['contractSymbol'].notna() & df['strike'].notna()
+                if not valid.all():
+                    logger.warning(f"Skipping {(~valid).sum()} option rows for {symbol} with missing contract data")
+                    df = df[valid]
+                df['contractSymbol'] = df['contractSymbol'].astype(str).str.strip()
+
+                # Hash each contract symbol once; lookups and conflict checks
+                # compare these integer keys
+                df['contract_key'] = df['contractSymbol'].map(
+                    {contract_symbol: contract_key(contract_symbol) for contract_symbol in df['contractSymbol'].unique()}
+                )
 
-            db.commit()
-            logger.info(f"Stored {contracts_added} new contracts and {prices_added} price records for {symbol}")
-            return True
+                # Resolve existing contracts with a single IN query
+                contract_ids = dict(db.query(OptionContract.contract_key, OptionContract.id).filter(
+                    OptionContract.contract_key.in_(df['contract_key'].unique().tolist())
+                ))
+
+                # Bulk insert the missing contracts, then fetch their new IDs
+                new_contracts = (
+                    df.loc[~df['contract_key'].isin(list(contract_ids)), ['contractSymbol', 'contract_key', 'expiry', 'strike', 'option_type']]
+                    .drop_duplicates('contract_key')
+                    .rename(columns={'contractSymbol': 'contract_symbol', 'expiry': 'expiry_date', 'strike': 'strike_price'})
+                    .assign(symbol_id=symbol_id, is_active=True)
+                    .to_dict('records')
+                )
+                contracts_added = len(new_contracts)
+                if new_contracts:
+                    # Contracts another writer inserted since the lookup above are
+                    # skipped rather than failing the whole batch
+                    contracts_table = OptionContract.__table__
+                    if db.get_bind().dialect.insert_executemany_returning:
+                        # One executemany that hands back the generated IDs
+                        contract_ids.update(db.execute(
+                            insert_statement(db, OptionContract, ignore_conflicts_on=['contract_key'])
+                            .returning(contracts_table.c.contract_key, contracts_table.c.id),
+                            new_contracts
+                        ).all())
+                    else:
+                        bulk_insert(db, OptionContract, new_contracts, ignore_conflicts_on=['contract_key'])
+
+                    unresolved = [c['contract_key'] for c in new_contracts if c['contract_key'] not in contract_ids]
+                    if unresolved:
+                        contract_ids.update(db.query(OptionContract.contract_key, OptionContract.id).filter(
+                            OptionContract.contract_key.in_(unresolved)
+                        ))
+
+                df['contract_id'] = df['contract_key'].map(contract_ids)
+
+                # Store option price data (even if zeros), coercing whole columns
+                # at once; missing or non-numeric values become 0
+                def numeric_column(name):
+                    if name not in df:
+                        return pd.Series(0.0, index=df.index)
+                    return pd.to_numeric(df[name], errors='coerce').fillna(0.0)
+
+                prices = pd.DataFrame({'contract_id': df['contract_id'], 'timestamp': datetime.now()})
+                for column, field in OPTION_PRICE_FLOAT_FIELDS.items():
+                    prices[field] = numeric_column(column)
+                for column, field in OPTION_PRICE_INT_FIELDS.items():
+                    prices[field] = numeric_column(column).astype(int)
+
+                # Spreads only when we have a real two-sided quote (NULL otherwise)
+                has_quote = (prices['bid'] > 0) & (prices['ask'] > 0)
+                spread = prices['ask'] - prices['bid']
+                mid_price = (prices['ask'] + prices['bid']) / 2
+                prices['bid_ask_spread'] = spread.astype(object).where(has_quote, None)
+                prices['spread_percentage'] = (spread / mid_price * 100).astype(object).where(has_quote, None)
+
+                price_rows = prices.to_dict('records')
+                bulk_insert(db, OptionPrice, price_rows)
+                prices_added = len(price_rows)
+
+                logger.info(f"Stored {contracts_added} new contracts and {prices_added} price records for {symbol}")
+                return True
 
         except Exception as e:
             logger.error(f"Error storing options data for {symbol}: {str(e)}")
-            db.rollback()
             return False
 
-    def calculate_and_store_iv_analysis(self, symbol: str) -> bool:
+    def calculate_and_store_iv_analysis(self, symbol: str, symbol_id: Optional[int] = None,
+                                        commit: bool = True) -> bool:
         """
         Calculate and store IV analysis (rank, percentile, HV) for a symbol
 
         Args:
             symbol: Stock symbol
+            symbol_id: Symbol's database ID, if already known
+            commit: Commit the record; if False it is written in a savepoint
+                and the caller commits
 
         Returns:
             True if successful, False otherwise
         """
         try:
-            from calculations import OptionsCalculator
-            import numpy as np
+            with self._write_scope(commit) as db:
+                from calculations import OptionsCalculator
+                calculator = OptionsCalculator()
+
+                # Get symbol ID unless the caller already has it
+                if symbol_id is None:
+                    symbol_id = self.get_symbol_id(symbol)
+                    if symbol_id is None:
+                        logger.error(f"Symbol {symbol} not found in database")
+                        return False
+
+                # Get recent stock prices for HV calculation
+                stock_prices = db.query(StockPrice.close_price).filter(
+                    StockPrice.symbol_id == symbol_id
+                ).order_by(StockPrice.timestamp.desc()).limit(60).all()
+
+                if len(stock_prices) < 20:
+                    logger.warning(f"Not enough stock price history for {symbol} to calculate HV")
+                    hv_20d = None
+                    hv_30d = None
+                else:
+                    # Calculate historical volatility
+                    closes = pd.Series(
+                        np.fromiter((row[0] for row in stock_prices), dtype=float, count=len(stock_prices))[::-1]
+                    )
 
-            db = self.get_session()
-            calculator = OptionsCalculator()
-
-            # Get symbol record
-            symbol_obj = db.query(Symbol).filter(Symbol.symbol == symbol.upper()).first()
-            if not symbol_obj:
-                logger.error(f"Symbol {symbol} not found in database")
-                return False
-
-            # Get recent stock prices for HV calculation
-            stock_prices = db.query(StockPrice).filter(
-                StockPrice.symbol_id == symbol_obj.id
-            ).order_by(StockPrice.timestamp.desc()).limit(60).all()
-
-            if len(stock_prices) < 20:
-                logger.warning(f"Not enough stock price history for {symbol} to calculate HV")
-                hv_20d = None
-                hv_30d = None
-            else:
-                # Calculate historical volatility
-                prices_df = pd.DataFrame([{
-                    'timestamp': sp.timestamp,
-                    'close': sp.close_price
-                } for sp in reversed(stock_prices)])
-
-                hv_20d = calculator.calculate_historical_volatility(
-                    prices_df['close'], period_days=20
-                )
-                hv_30d = calculator.calculate_historical_volatility(
-                    prices_df['close'], period_days=30
+                    hv_20d = calculator.calculate_historical_volatility(closes, period_days=20)
+                    hv_30d = calculator.calculate_historical_volatility(closes, period_days=30)
+
+                # Get all recent option prices to calculate average IV
+                recent_options = db.query(OptionPrice.implied_volatility).join(
+                    OptionContract, OptionPrice.contract_id == OptionContract.id
+                ).filter(
+                    OptionContract.symbol_id == symbol_id,
+                    OptionPrice.implied_volatility > 0
+                ).order_by(OptionPrice.timestamp.desc()).limit(500).all()
+
+                if not recent_options:
+                    logger.warning(f"No option data available for IV analysis for {symbol}")
+                    return False
+
+                # Calculate average current IV (the query already filters IV > 0)
+                current_iv = np.fromiter((row[0] for row in recent_options), dtype=float, count=len(recent_options)).mean()
+
+                # Get historical IV data for rank/percentile calculation
+                historical_iv_records = db.query(IVAnalysis.current_iv).filter(
+                    IVAnalysis.symbol_id == symbol_id
+                ).order_by(IVAnalysis.timestamp.desc()).limit(365).all()
+
+                if len(historical_iv_records) < 10:
+                    # Not enough history, use defaults
+                    iv_rank = 50.0
+                    iv_percentile = 50.0
+                else:
+                    historical_iv_series = pd.Series(
+                        [row[0] for row in historical_iv_records], dtype=float
+                    )
+                    iv_rank = calculator.calculate_iv_rank(current_iv, historical_iv_series)
+                    iv_percentile = calculator.calculate_iv_percentile(current_iv, historical_iv_series)
+
+                # Create IV analysis record
+                iv_analysis = IVAnalysis(
+                    symbol_id=symbol_id,
+                    timestamp=datetime.now(),
+                    current_iv=current_iv,
+                    iv_rank=iv_rank,
+                    iv_percentile=iv_percentile,
+                    hv_20d=hv_20d,
+                    hv_30d=hv_30d
                 )
 
-            # Get all recent option prices to calculate average IV
-            recent_options = db.query(OptionPrice).join(
-                OptionContract, OptionPrice.contract_id == OptionContract.id
-            ).filter(
-                OptionContract.symbol_id == symbol_obj.id,
-                OptionPrice.implied_volatility > 0
-            ).order_by(OptionPrice.timestamp.desc()).limit(500).all()
-
-            if not recent_options:
-                logger.warning(f"No option data available for IV analysis for {symbol}")
-                return False
-
-            # Calculate average current IV
-            current_ivs = [op.implied_volatility for op in recent_options if op.implied_volatility > 0]
-            if not current_ivs:
-                return False
-
-            current_iv = np.mean(current_ivs)
-
-            # Get historical IV data for rank/percentile calculation
-            historical_iv_records = db.query(IVAnalysis).filter(
-                IVAnalysis.symbol_id == symbol_obj.id
-            ).order_by(IVAnalysis.timestamp.desc()).limit(365).all()
-
-            if len(historical_iv_records) < 10:
-                # Not enough history, use defaults
-                iv_rank = 50.0
-                iv_percentile = 50.0
-            else:
-                historical_iv_series = pd.Series([
-                    record.current_iv for record in historical_iv_records
-                ])
-                iv_rank = calculator.calculate_iv_rank(current_iv, historical_iv_series)
-                iv_percentile = calculator.calculate_iv_percentile(current_iv, historical_iv_series)
-
-            # Create IV analysis record
-            iv_analysis = IVAnalysis(
-                symbol_id=symbol_obj.id,
-                timestamp=datetime.now(),
-                current_iv=current_iv,
-                iv_rank=iv_rank,
-                iv_percentile=iv_percentile,
-                hv_20d=hv_20d,
-                hv_30d=hv_30d
-            )
+                db.add(iv_analysis)
 
-            db.add(iv_analysis)
-            db.commit()
-
-            logger.info(f"Calculated IV analysis for {symbol}: IV={current_iv*100:.1f}%, Rank={iv_rank:.1f}%")
-            return True
+                logger.info(f"Calculated IV analysis for {symbol}: IV={current_iv*100:.1f}%, Rank={iv_rank:.1f}%")
+                return True
 
         except Exception as e:
             logger.error(f"Error calculating IV analysis for {symbol}: {str(e)}")
-            if db:
-                db.rollback()
             return False
 
     def update_all_symbols(self) -> Dict[str, bool]:
@@ -585,36 +737,53 @@ class IVolatilityDataFetcher:
             ).filter(UserWatchlist.is_active == True).all()
 
             results = {}
+            # Symbol IDs from the watchlist query, so the store calls don't
+            # each look them up again
+            symbol_ids = {symbol_obj.symbol: symbol_obj.id for symbol_obj in symbols}
+            self._symbol_ids.update(symbol_ids)
+            symbol_names = list(symbol_ids)
+
+            def fetch_symbol(symbol):
+                # Runs on a fetch thread: API calls only, no database access
+                return self.fetch_stock_data(symbol), self.fetch_options_data(symbol)
+
+            # Fetch symbols concurrently (the work is network-bound) and store
+            # each one as soon as its data arrives; the SQLAlchemy session
+            # stays on this thread. Each store writes into its own savepoint
+            # and the whole run is committed once at the end, in a write
+            # transaction taken before the first store.
+            begin_write_transaction(db)
+            with ThreadPoolExecutor(max_workers=IVOLATILITY_FETCH_WORKERS) as fetch_pool:
+                futures = {fetch_pool.submit(fetch_symbol, symbol): symbol for symbol in symbol_names}
+
+                for i, future in enumerate(as_completed(futures)):
+                    symbol = futures[future]
+                    logger.info(f"Updating data for {symbol} ({i+1}/{len(symbol_names)})")
+
+                    stock_data, options_data = future.result()
+
+                    # Store stock data
+                    if stock_data is not None:
+                        results[f"{symbol}_stock"] = self.store_stock_data(symbol, stock_data, symbol_ids[symbol], commit=False)
+                    else:
+                        results[f"{symbol}_stock"] = False
+
+                    # Store options data
+                    if options_data:
+                        results[f"{symbol}_options"] = self.store_options_data(symbol, options_data, symbol_ids[symbol], commit=False)
+                        # Calculate IV analysis after storing options
+                        self.calculate_and_store_iv_analysis(symbol, symbol_ids[symbol], commit=False)
+                    else:
+                        results[f"{symbol}_options"] = False
 
-            for i, symbol_obj in enumerate(symbols):
-                symbol = symbol_obj.symbol
-                logger.info(f"Updating data for {symbol} ({i+1}/{len(symbols)})")
-
-                # Fetch and store stock data
-                stock_data = self.fetch_stock_data(symbol)
-                if stock_data is not None:
-                    results[f"{symbol}_stock"] = self.store_stock_data(symbol, stock_data)
-                else:
-                    results[f"{symbol}_stock"] = False
-
-                # Fetch and store options data
-                options_data = self.fetch_options_data(symbol)
-                if options_data:
-                    results[f"{symbol}_options"] = self.store_options_data(symbol, options_data)
-                    # Calculate IV analysis after storing options
-                    self.calculate_and_store_iv_analysis(symbol)
-                else:
-                    results[f"{symbol}_options"] = False
-
-                # Small delay to be respectful to the API
-                if i < len(symbols) - 1:
-                    time.sleep(1)
-
+            db.commit()
+            analyze_tables(db, StockPrice, OptionContract, OptionPrice)
             logger.info(f"Completed update for all symbols. Success rate: {sum(results.values())}/{len(results)}")
             return results
 
         except Exception as e:
             logger.error(f"Error updating symbols: {str(e)}")
+            db.rollback()
             return {}
 
     def get_current_stock_price(self, symbol: str) -> Optional[float]:
@@ -645,9 +814,8 @@ def main():
     # Add some test symbols
     test_symbols = ['AAPL', 'MSFT', 'GOOGL']
 
-    for symbol in test_symbols:
-        print(f"Adding {symbol} to watchlist...")
-        fetcher.add_symbol_to_watchlist(symbol)
+    print(f"Adding {', '.join(test_symbols)} to watchlist...")
+    fetcher.add_symbols_to_watchlist(test_symbols)
 
     # Update data for all symbols
     print("Updating data for all symbols...")
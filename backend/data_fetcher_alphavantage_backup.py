@@ -1,18 +1,43 @@
-import requests
+import httpx
 import pandas as pd
 import numpy as np
 import time
 import os
+import json
+import random
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
 from sqlalchemy.orm import Session
-from models import Symbol, StockPrice, OptionContract, OptionPrice, get_db, create_tables
+from models import Symbol, StockPrice, OptionContract, OptionPrice, get_db, create_tables, UPSERT_INSERTS, bulk_insert, update_or_insert_rows, contract_key
+from rate_limiter import TokenBucket
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+try:
+    import ijson
+except ImportError:
+    logger.warning("ijson not available, options responses will be parsed in full")
+    ijson = None
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    logger.warning("orjson not available, falling back to the standard json parser")
+    json_loads = json.loads
+
+try:
+    import diskcache
+except ImportError:
+    logger.warning("diskcache not available, Alpha Vantage responses will not be cached")
+    diskcache = None
+
 # Load API key from environment
 from dotenv import load_dotenv
 load_dotenv()
@@ -23,11 +48,103 @@ if not ALPHA_VANTAGE_API_KEY:
 
 ALPHA_VANTAGE_BASE_URL = "https://www.alphavantage.co/query"
 
+# Free tier: 5 calls per minute
+ALPHA_VANTAGE_CALLS_PER_MINUTE = 5
+
+# Periods served by the compact (last ~100 bars) daily series, and the
+# trailing window in days each period is trimmed to after fetching
+COMPACT_PERIODS = frozenset({'1d', '5d', '1mo'})
+PERIOD_DAYS = {'5d': 5, '1mo': 30}
+
+# HTTP statuses worth retrying; any other error status fails immediately
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# End-of-day data only changes once a day, so responses are cached on disk
+ALPHA_VANTAGE_CACHE_DIR = os.getenv('ALPHA_VANTAGE_CACHE_DIR', './cache/av')
+ALPHA_VANTAGE_CACHE_TTL = 86400
+ALPHA_VANTAGE_QUOTE_CACHE_TTL = 10
+
+# Daily responses are keyed on the trading date in New York, the timezone
+# the scheduler runs on, so they roll over with the market date rather
+# than at midnight UTC (8pm ET)
+MARKET_TIMEZONE = ZoneInfo('America/New_York')
+
+# HISTORICAL_OPTIONS fields we actually store; the rest (mark, bid_size,
+# ask_size, ...) are dropped as rows arrive
+OPTION_FIELDS = [
+    'expiration', 'type', 'contractID', 'strike', 'last', 'bid', 'ask',
+    'volume', 'open_interest', 'implied_volatility',
+    'delta', 'gamma', 'theta', 'vega', 'rho'
+]
+
+
+def market_date() -> str:
+    """Today's date in the market's timezone, as YYYY-MM-DD"""
+    return datetime.now(MARKET_TIMEZONE).strftime('%Y-%m-%d')
+
+
+def upsert_stock_prices(table, conn, keys, data_iter):
+    """
+    DataFrame.to_sql insertion method: one multi-row INSERT per chunk that
+    updates bars already stored for the same (symbol_id, timestamp)
+
+    Args:
+        table: pandas SQLTable being written
+        conn: SQLAlchemy connection
+        keys: Column names
+        data_iter: Iterable of row tuples for this chunk
+
+    Returns:
+        Number of rows affected
+    """
+    rows = [dict(zip(keys, row)) for row in data_iter]
+    values = [key for key in keys if key not in ('symbol_id', 'timestamp')]
+    dialect = conn.dialect.name
+    if dialect not in UPSERT_INSERTS:
+        return update_or_insert_rows(conn, table.table, rows, ['symbol_id', 'timestamp'], values)
+
+    stmt = UPSERT_INSERTS[dialect](table.table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['symbol_id', 'timestamp'],
+        set_={key: stmt.excluded[key] for key in values}
+    )
+    return conn.execute(stmt).rowcount
+
+
 class DataFetcher:
     def __init__(self):
         self.session = None
         self.api_key = ALPHA_VANTAGE_API_KEY
 
+        # Shared HTTP/2 client: concurrent GETs from the worker threads are
+        # multiplexed over a single pooled TLS connection (thread-safe). The
+        # transport retries failed connects itself; HTTP status errors are
+        # handled in _get. Idle connections are kept for a full rate-limit
+        # window, since paced calls arrive ~12s apart and httpx's default 5s
+        # expiry would redo the TLS handshake on nearly every call
+        self.http = httpx.Client(
+            timeout=30.0,
+            headers={'Accept-Encoding': 'gzip, deflate'},
+            transport=httpx.HTTPTransport(
+                http2=True,
+                retries=3,
+                limits=httpx.Limits(max_connections=ALPHA_VANTAGE_CALLS_PER_MINUTE,
+                                    max_keepalive_connections=ALPHA_VANTAGE_CALLS_PER_MINUTE,
+                                    keepalive_expiry=60.0)
+            )
+        )
+        self.token_bucket = TokenBucket(ALPHA_VANTAGE_CALLS_PER_MINUTE)
+        self.cache = diskcache.Cache(ALPHA_VANTAGE_CACHE_DIR, size_limit=500_000_000) if diskcache else None
+
+        # Pre-built URL templates for the Alpha Vantage functions we call, so
+        # each request only formats in the symbol instead of building and
+        # urlencoding a params dict
+        base = f"{ALPHA_VANTAGE_BASE_URL}?apikey={self.api_key}"
+        self._url_daily = f"{base}&function=TIME_SERIES_DAILY&outputsize={{size}}&symbol={{sym}}"
+        self._url_options = f"{base}&function=HISTORICAL_OPTIONS&symbol={{sym}}"
+        self._url_quote = f"{base}&function=GLOBAL_QUOTE&symbol={{sym}}"
+        self._url_overview = f"{base}&function=OVERVIEW&symbol={{sym}}"
+
     def get_session(self) -> Session:
         """Get database session"""
         if not self.session:
@@ -41,15 +158,51 @@ class DataFetcher:
             self.session.close()
             self.session = None
 
-    def _make_api_request(self, params: dict, retries: int = 3) -> Optional[dict]:
-        """Make a request to Alpha Vantage API with retry logic"""
-        params['apikey'] = self.api_key
+    def _cache_get(self, key: Tuple):
+        """Return a cached response for key, or None on a miss"""
+        if self.cache is None:
+            return None
+        return self.cache.get(key)
+
+    def _cache_set(self, key: Tuple, value, expire: Optional[float] = ALPHA_VANTAGE_CACHE_TTL):
+        """Cache a response under key (expire=None keeps it indefinitely)"""
+        if self.cache is not None:
+            self.cache.set(key, value, expire=expire)
+
+    @staticmethod
+    def _retry_delay(attempt: int, response: Optional[httpx.Response] = None) -> float:
+        """Seconds to wait before a retry: the server's Retry-After if it sent one,
+        otherwise jittered exponential backoff so concurrent workers don't retry in step"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return float(retry_after)
+        return 2 ** attempt * random.uniform(0.5, 1.5)
+
+    def _get(self, url: str, retries: int = 3, cache_key: Optional[Tuple] = None,
+             expire: Optional[float] = ALPHA_VANTAGE_CACHE_TTL) -> Optional[dict]:
+        """Make a request to a pre-built Alpha Vantage URL with retry logic
+
+        Args:
+            url: Fully built request URL
+            retries: Number of attempts before giving up
+            cache_key: If given, serve/store the response from the disk cache
+            expire: Seconds to keep a cached response (None = forever)
+
+        Returns:
+            Parsed JSON response or None on failure
+        """
+        if cache_key is not None:
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
 
         for attempt in range(retries):
             try:
-                response = requests.get(ALPHA_VANTAGE_BASE_URL, params=params, timeout=30)
+                self.token_bucket.acquire()
+                response = self.http.get(url)
                 response.raise_for_status()
-                data = response.json()
+                data = json_loads(response.content)
 
                 # Check for API error messages
                 if "Error Message" in data:
@@ -59,21 +212,115 @@ class DataFetcher:
                 if "Note" in data:
                     logger.warning(f"Alpha Vantage rate limit: {data['Note']}")
                     if attempt < retries - 1:
-                        time.sleep(12)  # Wait 12 seconds before retry (free tier: 5 calls/min)
+                        # Throttled by calls we didn't count (e.g. another process);
+                        # saturate() holds every acquire(), including the retry's,
+                        # off for a full window
+                        self.token_bucket.saturate()
                         continue
                     return None
 
+                if cache_key is not None:
+                    self._cache_set(cache_key, data, expire=expire)
+
                 return data
 
-            except requests.exceptions.RequestException as e:
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if status not in RETRY_STATUS_CODES:
+                    logger.error(f"API request failed with HTTP {status}: {str(e)}")
+                    return None
+                logger.error(f"API request failed (attempt {attempt + 1}/{retries}): {str(e)}")
+                if attempt < retries - 1:
+                    time.sleep(self._retry_delay(attempt, e.response))
+                    continue
+                return None
+
+            except (httpx.HTTPError, ValueError) as e:
                 logger.error(f"API request failed (attempt {attempt + 1}/{retries}): {str(e)}")
                 if attempt < retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
+                    time.sleep(self._retry_delay(attempt))
                     continue
                 return None
 
         return None
 
+    def _iter_options_rows(self, url: str, retries: int = 3):
+        """Yield HISTORICAL_OPTIONS contract rows, streaming the response when ijson is available
+
+        The stream follows the same rules as _get: API error messages end it,
+        throttle notes and retryable HTTP statuses are retried with backoff.
+        Once rows have been yielded a failure is raised rather than retried,
+        so no row is ever yielded twice.
+        """
+        if ijson is None:
+            data = self._get(url, retries=retries)
+            yield from (data or {}).get('data') or []
+            return
+
+        for attempt in range(retries):
+            # Push decoded chunks into ijson and hand back items as they complete
+            rows = ijson.sendable_list()
+            parser = ijson.items_coro(rows, 'data.item', use_float=True)
+
+            # The body is kept until the first row arrives; a response with no
+            # rows (a throttle note or an API error) is small and checked whole
+            head = bytearray()
+            yielded = 0
+
+            try:
+                self.token_bucket.acquire()
+                with self.http.stream('GET', url) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_bytes():
+                        if not yielded:
+                            head += chunk
+                        parser.send(chunk)
+                        yielded += len(rows)
+                        yield from rows
+                        del rows[:]
+
+                parser.close()
+                yielded += len(rows)
+                yield from rows
+                if yielded:
+                    return
+
+                data = json_loads(bytes(head)) if head else {}
+
+                # Check for API error messages
+                if "Error Message" in data:
+                    logger.error(f"Alpha Vantage API error: {data['Error Message']}")
+                    return
+
+                if "Note" in data:
+                    logger.warning(f"Alpha Vantage rate limit: {data['Note']}")
+                    if attempt < retries - 1:
+                        # saturate() holds every acquire(), including the
+                        # retry's, off for a full window
+                        self.token_bucket.saturate()
+                        continue
+                return
+
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if status not in RETRY_STATUS_CODES:
+                    logger.error(f"API request failed with HTTP {status}: {str(e)}")
+                    return
+                logger.error(f"API request failed (attempt {attempt + 1}/{retries}): {str(e)}")
+                if attempt < retries - 1:
+                    time.sleep(self._retry_delay(attempt, e.response))
+                    continue
+                return
+
+            except (httpx.HTTPError, ijson.JSONError, ValueError) as e:
+                if yielded:
+                    raise
+                logger.error(f"API request failed (attempt {attempt + 1}/{retries}): {str(e)}")
+                if attempt < retries - 1:
+                    time.sleep(self._retry_delay(attempt))
+                    continue
+                return
+
     def add_symbol_to_watchlist(self, symbol: str, company_name: str = None) -> bool:
         """Add a symbol to the database and watchlist"""
         try:
@@ -88,11 +335,7 @@ class DataFetcher:
             # Get company info if not provided
             if not company_name:
                 try:
-                    params = {
-                        'function': 'OVERVIEW',
-                        'symbol': symbol
-                    }
-                    data = self._make_api_request(params)
+                    data = self._get(self._url_overview.format(sym=symbol), cache_key=('OVERVIEW', symbol.upper()))
                     if data:
                         company_name = data.get('Name', symbol.upper())
                     else:
@@ -124,46 +367,39 @@ class DataFetcher:
         """Fetch stock price data from Alpha Vantage"""
         try:
             # Map period to outputsize
-            outputsize = "compact" if period in ["1mo", "1d", "5d"] else "full"
+            outputsize = "compact" if period in COMPACT_PERIODS else "full"
 
-            params = {
-                'function': 'TIME_SERIES_DAILY',
-                'symbol': symbol,
-                'outputsize': outputsize
-            }
-
-            data = self._make_api_request(params)
+            data = self._get(
+                self._url_daily.format(size=outputsize, sym=symbol),
+                cache_key=('TIME_SERIES_DAILY', symbol.upper(), outputsize, market_date())
+            )
 
             if not data or 'Time Series (Daily)' not in data:
                 logger.warning(f"No data returned for {symbol}")
                 return None
 
-            # Convert to DataFrame
+            # Build the final frame in one pass over the daily bars
             time_series = data['Time Series (Daily)']
-            df = pd.DataFrame.from_dict(time_series, orient='index')
-
-            # Rename columns to match expected format
-            df.columns = ['Open', 'High', 'Low', 'Close', 'Volume']
-
-            # Convert data types
-            df['Open'] = df['Open'].astype(float)
-            df['High'] = df['High'].astype(float)
-            df['Low'] = df['Low'].astype(float)
-            df['Close'] = df['Close'].astype(float)
-            df['Volume'] = df['Volume'].astype(int)
-
-            # Reset index and convert to datetime
-            df.reset_index(inplace=True)
-            df.rename(columns={'index': 'Date'}, inplace=True)
-            df['Date'] = pd.to_datetime(df['Date'])
-            df['Symbol'] = symbol.upper()
+            bars = list(time_series.values())
+            count = len(bars)
+
+            def column(key, dtype):
+                return np.fromiter((bar[key] for bar in bars), dtype=dtype, count=count)
+
+            df = pd.DataFrame({
+                'Date': pd.to_datetime(list(time_series), format='%Y-%m-%d', cache=True),
+                'Open': column('1. open', np.float64),
+                'High': column('2. high', np.float64),
+                'Low': column('3. low', np.float64),
+                'Close': column('4. close', np.float64),
+                'Volume': column('5. volume', np.int64),
+                'Symbol': symbol.upper()
+            })
 
             # Filter by period if needed
-            if period == "1mo":
-                cutoff_date = datetime.now() - timedelta(days=30)
-                df = df[df['Date'] >= cutoff_date]
-            elif period == "5d":
-                cutoff_date = datetime.now() - timedelta(days=5)
+            period_days = PERIOD_DAYS.get(period)
+            if period_days is not None:
+                cutoff_date = datetime.now() - timedelta(days=period_days)
                 df = df[df['Date'] >= cutoff_date]
 
             # Sort by date
@@ -182,40 +418,41 @@ class DataFetcher:
         This provides complete historical options chains with Greeks and IV
         """
         try:
-            params = {
-                'function': 'HISTORICAL_OPTIONS',
-                'symbol': symbol
-            }
+            url = self._url_options.format(sym=symbol)
 
             # If no date specified, use most recent data (API defaults to latest)
             if date:
-                params['date'] = date
-
-            data = self._make_api_request(params)
-
-            if not data or 'data' not in data:
+                url = f"{url}&date={date}"
+
+            # A past trading day's chain never changes, so it is cached for good;
+            # the latest chain is cached until the next day
+            cache_key = ('HISTORICAL_OPTIONS_CHAINS', symbol.upper(), date or market_date())
+            buckets = self._cache_get(cache_key)
+            if buckets is None:
+                # Bucket contracts by expiration and type straight off the
+                # stream, so no full row list or whole-chain DataFrame is built
+                streamed = defaultdict(lambda: {'call': [], 'put': []})
+                for row in self._iter_options_rows(url):
+                    streamed[row['expiration']][row['type']].append({field: row.get(field) for field in OPTION_FIELDS})
+
+                # Keep only the first 6 expiration dates (all we ever store)
+                buckets = {exp_date: streamed[exp_date] for exp_date in sorted(streamed)[:6]}
+                del streamed
+
+                if buckets:
+                    self._cache_set(cache_key, buckets, expire=None if date else ALPHA_VANTAGE_CACHE_TTL)
+
+            if not buckets:
                 logger.warning(f"No options data available for {symbol}")
                 return {}
 
-            options_list = data['data']
-            if not options_list:
-                logger.warning(f"Empty options data for {symbol}")
-                return {}
-
-            # Convert to DataFrame
-            df = pd.DataFrame(options_list)
-
             # Group by expiration date
             options_data = {}
-            unique_expirations = df['expiration'].unique()
-
-            # Limit to first 6 expiration dates to match previous behavior
-            for exp_date in sorted(unique_expirations)[:6]:
-                exp_df = df[df['expiration'] == exp_date].copy()
 
+            for exp_date in sorted(buckets):
                 # Split into calls and puts
-                calls = exp_df[exp_df['type'] == 'call'].copy()
-                puts = exp_df[exp_df['type'] == 'put'].copy()
+                calls = pd.DataFrame(buckets[exp_date]['call'], columns=OPTION_FIELDS)
+                puts = pd.DataFrame(buckets[exp_date]['put'], columns=OPTION_FIELDS)
 
                 # Rename columns to match expected format
                 def format_options_df(opt_df):
@@ -228,8 +465,8 @@ class DataFetcher:
                     opt_df['lastPrice'] = pd.to_numeric(opt_df.get('last', 0), errors='coerce')
                     opt_df['bid'] = pd.to_numeric(opt_df.get('bid', 0), errors='coerce')
                     opt_df['ask'] = pd.to_numeric(opt_df.get('ask', 0), errors='coerce')
-                    opt_df['volume'] = pd.to_numeric(opt_df.get('volume', 0), errors='coerce').fillna(0).astype(int)
-                    opt_df['openInterest'] = pd.to_numeric(opt_df.get('open_interest', 0), errors='coerce').fillna(0).astype(int)
+                    opt_df['volume'] = pd.to_numeric(opt_df.get('volume', 0), errors='coerce').fillna(0).astype(np.int64)
+                    opt_df['openInterest'] = pd.to_numeric(opt_df.get('open_interest', 0), errors='coerce').fillna(0).astype(np.int64)
                     opt_df['impliedVolatility'] = pd.to_numeric(opt_df.get('implied_volatility', 0), errors='coerce')
 
                     # Alpha Vantage provides Greeks - store them for later use
@@ -269,44 +506,38 @@ class DataFetcher:
             logger.error(f"Error fetching options data for {symbol}: {str(e)}")
             return {}
 
-    def store_stock_data(self, symbol: str, stock_data: pd.DataFrame) -> bool:
+    def store_stock_data(self, symbol: str, stock_data: pd.DataFrame, symbol_id: Optional[int] = None) -> bool:
         """Store stock price data in database"""
         try:
             db = self.get_session()
 
-            # Get symbol ID
-            symbol_obj = db.query(Symbol).filter(Symbol.symbol == symbol.upper()).first()
-            if not symbol_obj:
-                logger.error(f"Symbol {symbol} not found in database")
-                return False
-
-            # Process each row
-            for _, row in stock_data.iterrows():
-                # Check if this timestamp already exists
-                existing = db.query(StockPrice).filter(
-                    StockPrice.symbol_id == symbol_obj.id,
-                    StockPrice.timestamp == row['Date']
-                ).first()
-
-                if existing:
-                    # Update existing record
-                    existing.open_price = float(row['Open'])
-                    existing.high_price = float(row['High'])
-                    existing.low_price = float(row['Low'])
-                    existing.close_price = float(row['Close'])
-                    existing.volume = int(row['Volume'])
-                else:
-                    # Create new record
-                    stock_price = StockPrice(
-                        symbol_id=symbol_obj.id,
-                        timestamp=row['Date'],
-                        open_price=float(row['Open']),
-                        high_price=float(row['High']),
-                        low_price=float(row['Low']),
-                        close_price=float(row['Close']),
-                        volume=int(row['Volume'])
-                    )
-                    db.add(stock_price)
+            # Get symbol ID unless the caller already has it
+            if symbol_id is None:
+                symbol_id = db.query(Symbol.id).filter(Symbol.symbol == symbol.upper()).scalar()
+                if symbol_id is None:
+                    logger.error(f"Symbol {symbol} not found in database")
+                    return False
+
+            rows = pd.DataFrame({
+                'symbol_id': symbol_id,
+                'timestamp': stock_data['Date'],
+                'open_price': stock_data['Open'].astype(float),
+                'high_price': stock_data['High'].astype(float),
+                'low_price': stock_data['Low'].astype(float),
+                'close_price': stock_data['Close'].astype(float),
+                'volume': stock_data['Volume'].astype(int)
+            })
+
+            # Multi-row upserts on the session's connection, so they share its
+            # transaction and rollback
+            rows.to_sql(
+                StockPrice.__tablename__,
+                con=db.connection(),
+                if_exists='append',
+                index=False,
+                method=upsert_stock_prices,
+                chunksize=1000
+            )
 
             db.commit()
             logger.info(f"Stored {len(stock_data)} stock price records for {symbol}")
@@ -317,97 +548,89 @@ class DataFetcher:
             db.rollback()
             return False
 
-    def store_options_data(self, symbol: str, options_data: Dict) -> bool:
+    def store_options_data(self, symbol: str, options_data: Dict, symbol_id: Optional[int] = None) -> bool:
         """Store options data in database"""
         try:
             db = self.get_session()
 
-            # Get symbol ID
-            symbol_obj = db.query(Symbol).filter(Symbol.symbol == symbol.upper()).first()
-            if not symbol_obj:
-                logger.error(f"Symbol {symbol} not found in database")
-                return False
-
-            contracts_added = 0
-            prices_added = 0
-
-            for exp_date, chains in options_data.items():
-                for option_type, chain_data in chains.items():
-                    for _, row in chain_data.iterrows():
-                        try:
-                            # Create or get option contract
-                            contract_symbol = row['contractSymbol']
-
-                            contract = db.query(OptionContract).filter(
-                                OptionContract.contract_symbol == contract_symbol
-                            ).first()
-
-                            if not contract:
-                                contract = OptionContract(
-                                    symbol_id=symbol_obj.id,
-                                    contract_symbol=contract_symbol,
-                                    expiry_date=datetime.strptime(exp_date, '%Y-%m-%d'),
-                                    strike_price=float(row['strike']),
-                                    option_type=row['option_type'],
-                                    is_active=True
-                                )
-                                db.add(contract)
-                                db.flush()  # Get the ID
-                                contracts_added += 1
-
-                            # Store option price data - handle NaN values
-                            def safe_float(val, default=0.0):
-                                try:
-                                    result = float(val)
-                                    return result if not pd.isna(result) else default
-                                except (ValueError, TypeError):
-                                    return default
-
-                            def safe_int(val, default=0):
-                                try:
-                                    result = float(val)  # Convert to float first to handle NaN
-                                    return int(result) if not pd.isna(result) else default
-                                except (ValueError, TypeError):
-                                    return default
-
-                            option_price = OptionPrice(
-                                contract_id=contract.id,
-                                timestamp=datetime.now(),
-                                bid=safe_float(row.get('bid', 0)),
-                                ask=safe_float(row.get('ask', 0)),
-                                last_price=safe_float(row.get('lastPrice', 0)),
-                                volume=safe_int(row.get('volume', 0)),
-                                open_interest=safe_int(row.get('openInterest', 0)),
-                                implied_volatility=safe_float(row.get('impliedVolatility', 0))
-                            )
-
-                            # Add Greeks from Alpha Vantage if available
-                            if 'delta' in row and not pd.isna(row.get('delta')):
-                                option_price.delta = safe_float(row.get('delta'))
-                            if 'gamma' in row and not pd.isna(row.get('gamma')):
-                                option_price.gamma = safe_float(row.get('gamma'))
-                            if 'theta' in row and not pd.isna(row.get('theta')):
-                                option_price.theta = safe_float(row.get('theta'))
-                            if 'vega' in row and not pd.isna(row.get('vega')):
-                                option_price.vega = safe_float(row.get('vega'))
-                            if 'rho' in row and not pd.isna(row.get('rho')):
-                                option_price.rho = safe_float(row.get('rho'))
-
-                            # Calculate additional metrics
-                            bid = safe_float(row.get('bid', 0))
-                            ask = safe_float(row.get('ask', 0))
-                            if bid > 0 and ask > 0:
-                                option_price.bid_ask_spread = ask - bid
-                                mid_price = (bid + ask) / 2
-                                if mid_price > 0:
-                                    option_price.spread_percentage = (ask - bid) / mid_price * 100
-
-                            db.add(option_price)
-                            prices_added += 1
-
-                        except Exception as e:
-                            logger.error(f"Error processing option row: {str(e)}")
-                            continue
+            # Get symbol ID unless the caller already has it
+            if symbol_id is None:
+                symbol_id = db.query(Symbol.id).filter(Symbol.symbol == symbol.upper()).scalar()
+                if symbol_id is None:
+                    logger.error(f"Symbol {symbol} not found in database")
+                    return False
+
+            # Parse each expiration key once (Alpha Vantage always sends YYYY-MM-DD)
+            expiry_dates = dict(zip(options_data, pd.to_datetime(list(options_data), format='%Y-%m-%d')))
+
+            # Flatten every chain into one frame tagged with its expiry
+            frames = [
+                chain_data.assign(expiry=expiry_dates[exp_date])
+                for exp_date, chains in options_data.items()
+                for chain_data in chains.values()
+                if not chain_data.empty
+            ]
+            if not frames:
+                logger.info(f"Stored 0 new contracts and 0 price records for {symbol}")
+                return True
+
+            df = pd.concat(frames, ignore_index=True)
+            df = df[df['contractSymbol'].notna() & df['strike'].notna()]
+            df = df.assign(contract_key=df['contractSymbol'].map(
+                {contract_symbol: contract_key(contract_symbol) for contract_symbol in df['contractSymbol'].unique()}
+            ))
+
+            # Resolve existing contracts with a single IN query on their
+            # integer keys, then bulk insert the missing ones and fetch their IDs
+            contract_ids = dict(db.query(OptionContract.contract_key, OptionContract.id).filter(
+                OptionContract.contract_key.in_(df['contract_key'].unique().tolist())
+            ))
+            new_contracts = (
+                df.loc[~df['contract_key'].isin(list(contract_ids)), ['contractSymbol', 'contract_key', 'expiry', 'strike', 'option_type']]
+                .drop_duplicates('contract_key')
+                .rename(columns={'contractSymbol': 'contract_symbol', 'expiry': 'expiry_date', 'strike': 'strike_price'})
+                .assign(symbol_id=symbol_id, is_active=True)
+                .to_dict('records')
+            )
+            contracts_added = len(new_contracts)
+            if new_contracts:
+                bulk_insert(db, OptionContract, new_contracts, ignore_conflicts_on=['contract_key'])
+                contract_ids.update(db.query(OptionContract.contract_key, OptionContract.id).filter(
+                    OptionContract.contract_key.in_([c['contract_key'] for c in new_contracts])
+                ))
+
+            # Store option price data - NaN handling is done per column
+            def numeric_column(name):
+                if name not in df:
+                    return pd.Series(np.nan, index=df.index)
+                return pd.to_numeric(df[name], errors='coerce')
+
+            prices = pd.DataFrame({
+                'contract_id': df['contract_key'].map(contract_ids),
+                'timestamp': datetime.now(),
+                'bid': numeric_column('bid').fillna(0.0),
+                'ask': numeric_column('ask').fillna(0.0),
+                'last_price': numeric_column('lastPrice').fillna(0.0),
+                'volume': numeric_column('volume').fillna(0).astype(int),
+                'open_interest': numeric_column('openInterest').fillna(0).astype(int),
+                'implied_volatility': numeric_column('impliedVolatility').fillna(0.0)
+            })
+
+            # Add Greeks from Alpha Vantage where available (NULL otherwise)
+            for greek in ('delta', 'gamma', 'theta', 'vega', 'rho'):
+                values = numeric_column(greek)
+                prices[greek] = values.astype(object).where(values.notna(), None)
+
+            # Calculate additional metrics when there is a two-sided quote
+            has_quote = (prices['bid'] > 0) & (prices['ask'] > 0)
+            spread = prices['ask'] - prices['bid']
+            mid_price = (prices['ask'] + prices['bid']) / 2
+            prices['bid_ask_spread'] = spread.astype(object).where(has_quote, None)
+            prices['spread_percentage'] = (spread / mid_price * 100).astype(object).where(has_quote, None)
+
+            price_rows = prices.to_dict('records')
+            bulk_insert(db, OptionPrice, price_rows)
+            prices_added = len(price_rows)
 
             db.commit()
             logger.info(f"Stored {contracts_added} new contracts and {prices_added} price records for {symbol}")
@@ -425,28 +648,33 @@ class DataFetcher:
             symbols = db.query(Symbol).filter(Symbol.is_active == True).all()
 
             results = {}
-
-            for i, symbol_obj in enumerate(symbols):
-                symbol = symbol_obj.symbol
-                logger.info(f"Updating data for {symbol} ({i+1}/{len(symbols)})")
-
-                # Fetch and store stock data
-                stock_data = self.fetch_stock_data(symbol)
-                if stock_data is not None:
-                    results[f"{symbol}_stock"] = self.store_stock_data(symbol, stock_data)
-                else:
-                    results[f"{symbol}_stock"] = False
-
-                # Fetch and store options data
-                options_data = self.fetch_options_data(symbol)
-                if options_data:
-                    results[f"{symbol}_options"] = self.store_options_data(symbol, options_data)
-                else:
-                    results[f"{symbol}_options"] = False
-
-                # Add delay between symbols to respect rate limits (5 calls/min for free tier)
-                if i < len(symbols) - 1:  # Don't sleep after the last symbol
-                    time.sleep(13)  # 13 seconds ensures we stay under 5 calls/min
+            symbol_ids = {symbol_obj.symbol: symbol_obj.id for symbol_obj in symbols}
+
+            # Issue all HTTP fetches concurrently; the token bucket keeps us
+            # under the free-tier rate limit. Storing stays on this thread so
+            # the SQLAlchemy session is never shared across threads.
+            with ThreadPoolExecutor(max_workers=ALPHA_VANTAGE_CALLS_PER_MINUTE) as executor:
+                futures = {}
+                for symbol_obj in symbols:
+                    symbol = symbol_obj.symbol
+                    futures[executor.submit(self.fetch_stock_data, symbol)] = (symbol, 'stock')
+                    futures[executor.submit(self.fetch_options_data, symbol)] = (symbol, 'options')
+
+                for future in as_completed(futures):
+                    symbol, kind = futures[future]
+                    data = future.result()
+                    logger.info(f"Fetched {kind} data for {symbol}")
+
+                    if kind == 'stock':
+                        if data is not None:
+                            results[f"{symbol}_stock"] = self.store_stock_data(symbol, data, symbol_ids[symbol])
+                        else:
+                            results[f"{symbol}_stock"] = False
+                    else:
+                        if data:
+                            results[f"{symbol}_options"] = self.store_options_data(symbol, data, symbol_ids[symbol])
+                        else:
+                            results[f"{symbol}_options"] = False
 
             logger.info(f"Completed update for all symbols. Success rate: {sum(results.values())}/{len(results)}")
             return results
@@ -458,12 +686,11 @@ class DataFetcher:
     def get_current_stock_price(self, symbol: str) -> Optional[float]:
         """Get the most recent stock price for a symbol"""
         try:
-            params = {
-                'function': 'GLOBAL_QUOTE',
-                'symbol': symbol
-            }
-
-            data = self._make_api_request(params)
+            data = self._get(
+                self._url_quote.format(sym=symbol),
+                cache_key=('GLOBAL_QUOTE', symbol.upper()),
+                expire=ALPHA_VANTAGE_QUOTE_CACHE_TTL
+            )
 
             if data and 'Global Quote' in data:
                 quote = data['Global Quote']
@@ -0,0 +1,464 @@
+"""
+Startup schema migrations for Options Tracker
+
+create_tables() only creates missing tables, so databases created by an
+older release are brought up to the current schema here. Both the API and
+the worker run these before serving, since either may start first after a
+deploy. Every migration checks what is already in place and is safe to run
+on each boot.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, text
+from sqlalchemy.types import REAL
+
+from models import SessionLocal, engine, contract_key, OptionType, OpportunityType
+
+logger = logging.getLogger(__name__)
+
+# Parent-id columns sampled beyond PostgreSQL's default statistics target
+STATISTICS_TARGET = 1000
+STATISTICS_TARGET_COLUMNS = [('option_prices', 'contract_id'), ('stock_prices', 'symbol_id')]
+
+def migrate_existing_symbols_to_watchlist():
+    """
+    One-time migration: Create UserWatchlist entries for existing Symbol records.
+
+    This ensures backward compatibility when upgrading from the old architecture
+    where only Symbol.is_active was used to determine what to track.
+    """
+    logger.info("Running watchlist migration check...")
+    db = None
+    try:
+        db = SessionLocal()
+
+        # Create watchlist entries for active symbols that don't have one,
+        # in a single INSERT ... SELECT run by the database
+        created = db.execute(text(
+            "INSERT INTO user_watchlists (symbol_id, is_active, added_at) "
+            "SELECT s.id, :active, COALESCE(s.created_at, :now) FROM symbols s "
+            "WHERE s.is_active = :active "
+            "AND NOT EXISTS (SELECT 1 FROM user_watchlists w WHERE w.symbol_id = s.id)"
+        ), {'active': True, 'now': datetime.now(timezone.utc).replace(tzinfo=None)}).rowcount
+        db.commit()
+
+        if not created:
+            logger.info("✓ All symbols have watchlist entries")
+            return
+
+        logger.info(f"✓ Migration complete: {created} watchlist entries created")
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {e}")
+        if db:
+            db.rollback()
+    finally:
+        if db:
+            db.close()
+
+def index_exists(table, name):
+    """Check whether the named index exists on a table."""
+    return any(index['name'] == name for index in inspect(engine).get_indexes(table))
+
+def migrate_stock_prices_unique_index():
+    """
+    One-time migration: Add the unique (symbol_id, timestamp) index to stock_prices.
+
+    Tables created before the index existed may hold duplicate bars, so the
+    older duplicates are removed first. Stock price upserts rely on this index.
+    """
+    logger.info("Running stock price index migration check...")
+    db = None
+    try:
+        if index_exists('stock_prices', 'uq_stock_prices_symbol_timestamp'):
+            logger.info("✓ Stock price unique index in place")
+            return
+
+        db = SessionLocal()
+
+        # Keep the newest row of each (symbol_id, timestamp); EXISTS probes
+        # rather than materializing a NOT IN list over the whole table
+        removed = db.execute(text(
+            "DELETE FROM stock_prices WHERE EXISTS "
+            "(SELECT 1 FROM stock_prices newer "
+            "WHERE newer.symbol_id = stock_prices.symbol_id "
+            "AND newer.timestamp = stock_prices.timestamp "
+            "AND newer.id > stock_prices.id)"
+        )).rowcount
+        db.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_stock_prices_symbol_timestamp "
+            "ON stock_prices (symbol_id, timestamp)"
+        ))
+        db.commit()
+
+        if removed:
+            logger.info(f"  ✓ Removed {removed} duplicate stock price rows")
+        logger.info("✓ Stock price unique index in place")
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {e}")
+        if db:
+            db.rollback()
+    finally:
+        if db:
+            db.close()
+
+def migrate_time_series_indexes():
+    """
+    One-time migration: Add the composite (parent, timestamp) indexes to
+    option_prices and iv_analysis, covering latest-quote columns on PostgreSQL.
+
+    create_tables() only builds indexes for new tables, so databases created
+    before these indexes existed get them here.
+    """
+    logger.info("Running time-series index migration check...")
+    db = None
+    try:
+        db = SessionLocal()
+
+        if engine.dialect.name == 'postgresql':
+            # Rebuild the option price index if it predates its INCLUDE columns
+            option_price_indexes = {
+                index['name']: index.get('dialect_options', {}).get('postgresql_include')
+                for index in inspect(engine).get_indexes('option_prices')
+            }
+            if 'ix_option_prices_contract_timestamp' in option_price_indexes \
+                    and not option_price_indexes['ix_option_prices_contract_timestamp']:
+                db.execute(text("DROP INDEX ix_option_prices_contract_timestamp"))
+            db.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_option_prices_contract_timestamp "
+                "ON option_prices (contract_id, timestamp) INCLUDE (bid, ask, last_price)"
+            ))
+            db.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_stock_prices_latest_close "
+                "ON stock_prices (symbol_id, timestamp) INCLUDE (close_price)"
+            ))
+        else:
+            db.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_option_prices_contract_timestamp "
+                "ON option_prices (contract_id, timestamp)"
+            ))
+        db.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_iv_analysis_symbol_timestamp "
+            "ON iv_analysis (symbol_id, timestamp)"
+        ))
+        db.commit()
+
+        logger.info("✓ Time-series indexes in place")
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {e}")
+        if db:
+            db.rollback()
+    finally:
+        if db:
+            db.close()
+
+def migrate_option_contract_keys():
+    """
+    One-time migration: Add and backfill option_contracts.contract_key.
+
+    Stores look contracts up by this integer key, so every existing row
+    needs one before the fetchers run.
+    """
+    logger.info("Running option contract key migration check...")
+    db = None
+    try:
+        db = SessionLocal()
+
+        columns = {column['name'] for column in inspect(engine).get_columns('option_contracts')}
+        if 'contract_key' not in columns:
+            db.execute(text("ALTER TABLE option_contracts ADD COLUMN contract_key BIGINT"))
+            logger.info("  ✓ Added contract_key column")
+
+        missing = db.execute(text(
+            "SELECT id, contract_symbol FROM option_contracts "
+            "WHERE contract_key IS NULL AND contract_symbol IS NOT NULL"
+        )).all()
+        if missing:
+            db.execute(
+                text("UPDATE option_contracts SET contract_key = :key WHERE id = :id"),
+                [{'id': contract_id, 'key': contract_key(symbol)} for contract_id, symbol in missing]
+            )
+            logger.info(f"  ✓ Backfilled contract_key for {len(missing)} contracts")
+
+        db.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_option_contracts_contract_key "
+            "ON option_contracts (contract_key)"
+        ))
+        db.commit()
+
+        logger.info("✓ Option contract keys in place")
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {e}")
+        if db:
+            db.rollback()
+    finally:
+        if db:
+            db.close()
+
+def log_unmapped_names(db, table, column, coded_type):
+    """Log the legacy values of a name column that have no code."""
+    # Already converted rows hold the codes themselves
+    known = ", ".join(f"'{value}'" for value in [*coded_type.CODES, *map(str, coded_type.NAMES)])
+    unmapped = db.execute(text(
+        f"SELECT {column}, COUNT(*) FROM {table} "
+        f"WHERE {column} IS NOT NULL AND lower(CAST({column} AS TEXT)) NOT IN ({known}) "
+        f"GROUP BY {column}"
+    )).all()
+    for value, count in unmapped:
+        logger.warning(f"  ⚠ {count} {table} rows have {column} {value!r} with no code")
+
+def convert_column_to_codes(db, table, column, coded_type):
+    """
+    Convert a name column to the SMALLINT codes of a CodedString type.
+
+    PostgreSQL converts the column type in place. SQLite cannot alter column
+    types, so there the values are rewritten as codes (its type affinity
+    makes them compare equal to the integers the model binds).
+
+    Returns:
+        Description of the conversion done, or None if already converted
+    """
+    current = next(
+        info for info in inspect(engine).get_columns(table)
+        if info['name'] == column
+    )
+    if current['type'].python_type is int:
+        # Created as SMALLINT (or already altered); nothing to convert
+        return None
+
+    whens = " ".join(f"WHEN '{name}' THEN {code}" for name, code in coded_type.CODES.items())
+    to_code = f"CASE lower({column}) {whens} END"
+    if engine.dialect.name == 'postgresql':
+        # The CASE maps names outside CODES to NULL, so report what is lost
+        log_unmapped_names(db, table, column, coded_type)
+        db.execute(text(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE SMALLINT USING {to_code}"
+        ))
+        return f"Converted {column} to SMALLINT"
+
+    # The column keeps its text type here, so probe for names still to
+    # convert before scanning and rewriting the table
+    names = ", ".join(f"'{name}'" for name in coded_type.CODES)
+    pending = db.execute(text(
+        f"SELECT 1 FROM {table} WHERE lower({column}) IN ({names}) LIMIT 1"
+    )).first()
+    if pending is None:
+        return None
+
+    # These stay as text and are read back unchanged
+    log_unmapped_names(db, table, column, coded_type)
+    converted = db.execute(text(
+        f"UPDATE {table} SET {column} = {to_code} WHERE lower({column}) IN ({names})"
+    )).rowcount
+    return f"Converted {column} for {converted} rows"
+
+def migrate_option_type_codes():
+    """
+    One-time migration: Store option_contracts.option_type as a SMALLINT code.
+    """
+    logger.info("Running option type migration check...")
+    db = None
+    try:
+        db = SessionLocal()
+
+        converted = convert_column_to_codes(db, 'option_contracts', 'option_type', OptionType)
+        if converted:
+            logger.info(f"  ✓ {converted}")
+        db.commit()
+
+        logger.info("✓ Option type codes in place")
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {e}")
+        if db:
+            db.rollback()
+    finally:
+        if db:
+            db.close()
+
+def migrate_opportunity_type_codes():
+    """
+    One-time migration: Store trading_opportunities.opportunity_type as a
+    SMALLINT code.
+    """
+    logger.info("Running opportunity type migration check...")
+    db = None
+    try:
+        db = SessionLocal()
+
+        converted = convert_column_to_codes(db, 'trading_opportunities', 'opportunity_type', OpportunityType)
+        if converted:
+            logger.info(f"  ✓ {converted}")
+        db.commit()
+
+        logger.info("✓ Opportunity type codes in place")
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {e}")
+        if db:
+            db.rollback()
+    finally:
+        if db:
+            db.close()
+
+def migrate_active_opportunity_index():
+    """
+    One-time migration: Add the partial unique index on active
+    (contract_id, opportunity_type) to trading_opportunities.
+
+    The opportunity upsert uses it as its conflict target. Tables created
+    before it existed may hold duplicate active rows, so all but the newest
+    of each are deactivated first.
+    """
+    logger.info("Running opportunity index migration check...")
+    db = None
+    try:
+        if index_exists('trading_opportunities', 'uq_trading_opportunities_active'):
+            logger.info("✓ Active opportunity index in place")
+            return
+
+        db = SessionLocal()
+
+        deactivated = db.execute(text(
+            "UPDATE trading_opportunities SET is_active = :inactive "
+            "WHERE is_active = :active AND EXISTS "
+            "(SELECT 1 FROM trading_opportunities newer "
+            "WHERE newer.contract_id = trading_opportunities.contract_id "
+            "AND newer.opportunity_type = trading_opportunities.opportunity_type "
+            "AND newer.is_active = :active "
+            "AND newer.id > trading_opportunities.id)"
+        ), {'active': True, 'inactive': False}).rowcount
+
+        # Same predicate text the model's index renders on each dialect
+        active = "is_active = true" if engine.dialect.name == 'postgresql' else "is_active = 1"
+        db.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_trading_opportunities_active "
+            f"ON trading_opportunities (contract_id, opportunity_type) WHERE {active}"
+        ))
+        db.commit()
+
+        if deactivated:
+            logger.info(f"  ✓ Deactivated {deactivated} duplicate active opportunities")
+        logger.info("✓ Active opportunity index in place")
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {e}")
+        if db:
+            db.rollback()
+    finally:
+        if db:
+            db.close()
+
+def migrate_statistics_targets():
+    """
+    One-time migration: Raise PostgreSQL's statistics target on the skewed
+    parent-id columns of the price tables.
+
+    A few heavily traded symbols own most contracts and prices, which the
+    default target of 100 under-samples; the planner then misjudges
+    contract_id/symbol_id IN (...) lookups. SQLite has no equivalent.
+    """
+    if engine.dialect.name != 'postgresql':
+        return
+
+    logger.info("Running statistics target migration check...")
+    db = None
+    try:
+        db = SessionLocal()
+
+        stale = [
+            (table, column) for table, column in STATISTICS_TARGET_COLUMNS
+            if db.execute(text(
+                "SELECT attstattarget FROM pg_attribute "
+                "WHERE attrelid = CAST(:table AS regclass) AND attname = :column"
+            ), {'table': table, 'column': column}).scalar() != STATISTICS_TARGET
+        ]
+        if not stale:
+            logger.info("✓ Statistics targets in place")
+            return
+
+        for table, column in stale:
+            db.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN {column} SET STATISTICS {STATISTICS_TARGET}"
+            ))
+        # The new target only takes effect once the tables are re-sampled
+        db.execute(text(f"ANALYZE {', '.join(sorted({table for table, _ in stale}))}"))
+        db.commit()
+
+        logger.info("✓ Statistics targets in place")
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {e}")
+        if db:
+            db.rollback()
+    finally:
+        if db:
+            db.close()
+
+def migrate_price_column_precision():
+    """
+    One-time migration: Widen single-precision price, IV and Greek columns
+    back to double precision on PostgreSQL.
+
+    Tables created while the models declared these columns as 4-byte REAL
+    round quotes of 1000 and up; later rows are stored exactly again.
+    SQLite stores every float as a double already.
+    """
+    if engine.dialect.name != 'postgresql':
+        return
+
+    logger.info("Running price column precision migration check...")
+    db = None
+    try:
+        narrow = [
+            (table, info['name'])
+            for table in ('stock_prices', 'option_prices')
+            for info in inspect(engine).get_columns(table)
+            if isinstance(info['type'], REAL)
+        ]
+        if not narrow:
+            logger.info("✓ Price columns are double precision")
+            return
+
+        db = SessionLocal()
+        for table, column in narrow:
+            db.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE DOUBLE PRECISION"))
+        db.commit()
+
+        logger.info(f"✓ Widened {len(narrow)} price columns to double precision")
+
+    except Exception as e:
+        logger.error(f"✗ Migration failed: {e}")
+        if db:
+            db.rollback()
+    finally:
+        if db:
+            db.close()
+
+MIGRATIONS = [
+    migrate_existing_symbols_to_watchlist,
+    migrate_stock_prices_unique_index,
+    migrate_time_series_indexes,
+    migrate_option_contract_keys,
+    migrate_option_type_codes,
+    migrate_opportunity_type_codes,
+    migrate_active_opportunity_index,
+    migrate_statistics_targets,
+    migrate_price_column_precision,
+]
+
+def run_migrations():
+    """
+    Run every migration in order; a failing migration is logged and does
+    not stop the others or the service.
+    """
+    for migration in MIGRATIONS:
+        try:
+            migration()
+        except Exception as e:
+            logger.warning(f"Migration check failed (non-fatal): {e}")
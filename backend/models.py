@@ -1,11 +1,88 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean, ForeignKey
+from sqlalchemy import create_engine, event, inspect, insert, select, update, bindparam, and_, text, Column, Integer, BigInteger, SmallInteger, String, Float, DateTime, Boolean, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.types import TypeDecorator
+from contextlib import contextmanager
 from datetime import datetime
+import csv
+import hashlib
+import io
 import os
 
 Base = declarative_base()
 
+class CodedString(TypeDecorator):
+    """
+    Small fixed vocabulary of names stored as 2-byte codes
+
+    Python code keeps seeing the names; binding a name outside CODES raises
+    ValueError rather than storing NULL.
+    Subclasses set CODES (name -> code); codes must never be renumbered.
+    """
+    impl = SmallInteger
+    cache_ok = True
+
+    CODES = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.NAMES = {code: name for name, code in cls.CODES.items()}
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        code = self.CODES.get(str(value).lower())
+        if code is None:
+            raise ValueError(f"Unknown {type(self).__name__} name: {value!r}")
+        return code
+
+    def process_result_value(self, value, dialect):
+        if value is None or (isinstance(value, str) and not value.isdigit()):
+            # Rows written before the migration still hold the name
+            return value
+        return self.NAMES.get(int(value))
+
+class OptionType(CodedString):
+    """Option type stored as a 2-byte code (0 = call, 1 = put)"""
+    cache_ok = True
+
+    CODES = {'call': 0, 'put': 1}
+
+class OpportunityType(CodedString):
+    """
+    Opportunity type stored as a 2-byte code instead of repeating the name
+    on every opportunity row
+    """
+    cache_ok = True
+
+    CODES = {
+        'premium_sell': 0,
+        'premium_buy': 1,
+        'gamma_scalp': 2,
+        'overpriced': 3,
+        'underpriced': 4,
+        'high_delta': 5,
+        # Offered by the frontend's type filter; not emitted by the current detectors
+        'high_iv': 6,
+        'low_iv': 7,
+        'unusual_volume': 8,
+        'high_time_value': 9
+    }
+
+def contract_key(contract_symbol: str) -> int:
+    """
+    Stable 63-bit integer key for an option contract symbol
+
+    Lookups and conflict checks compare this 8-byte integer instead of the
+    ~20-character OCC symbol string. blake2b (not hash()) keeps the value
+    identical across processes and restarts.
+    """
+    digest = hashlib.blake2b(contract_symbol.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') & ((1 << 63) - 1)
+
 class Symbol(Base):
     __tablename__ = "symbols"
 
@@ -16,17 +93,18 @@ class Symbol(Base):
     is_active = Column(Boolean, default=True)  # Whether symbol is still tradeable (not delisted)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    # Relationships
-    stock_prices = relationship("StockPrice", back_populates="symbol_rel")
-    option_contracts = relationship("OptionContract", back_populates="symbol_rel")
-    watchlist_entries = relationship("UserWatchlist", back_populates="symbol_rel")
+    # Relationships. Like OptionContract's, these raise instead of lazy
+    # loading; use selectinload() on queries that need them.
+    stock_prices = relationship("StockPrice", back_populates="symbol_rel", lazy="raise_on_sql")
+    option_contracts = relationship("OptionContract", back_populates="symbol_rel", lazy="raise_on_sql")
+    watchlist_entries = relationship("UserWatchlist", back_populates="symbol_rel", lazy="raise_on_sql")
 
 class StockPrice(Base):
     __tablename__ = "stock_prices"
     
     id = Column(Integer, primary_key=True, index=True)
     symbol_id = Column(Integer, ForeignKey("symbols.id"))
-    timestamp = Column(DateTime, index=True)
+    timestamp = Column(DateTime)  # covered by the (symbol_id, timestamp) index
     open_price = Column(Float)
     high_price = Column(Float)
     low_price = Column(Float)
@@ -34,7 +112,18 @@ class StockPrice(Base):
     volume = Column(Integer)
     
     # Relationship
-    symbol_rel = relationship("Symbol", back_populates="stock_prices")
+    symbol_rel = relationship("Symbol", back_populates="stock_prices", lazy="raise_on_sql")
+
+    # One bar per symbol per timestamp; also the ON CONFLICT target for upserts.
+    # On PostgreSQL a second, covering index answers latest-close lookups
+    # from the index alone.
+    __table_args__ = (
+        Index("uq_stock_prices_symbol_timestamp", "symbol_id", "timestamp", unique=True),
+        Index(
+            "ix_stock_prices_latest_close", "symbol_id", "timestamp",
+            postgresql_include=["close_price"]
+        ).ddl_if(dialect="postgresql"),
+    )
 
 class OptionContract(Base):
     __tablename__ = "option_contracts"
@@ -42,14 +131,18 @@ class OptionContract(Base):
     id = Column(Integer, primary_key=True, index=True)
     symbol_id = Column(Integer, ForeignKey("symbols.id"))
     contract_symbol = Column(String, unique=True, index=True)
+    contract_key = Column(BigInteger, unique=True, index=True)  # contract_key(contract_symbol)
     expiry_date = Column(DateTime)
     strike_price = Column(Float)
-    option_type = Column(String)  # 'call' or 'put'
+    option_type = Column(OptionType)  # 'call' or 'put'
     is_active = Column(Boolean, default=True)
     
-    # Relationships
-    symbol_rel = relationship("Symbol", back_populates="option_contracts")
-    option_prices = relationship("OptionPrice", back_populates="contract")
+    # Relationships. Hot paths query by ID instead of navigating these, so
+    # an accidental lazy load (N+1, or a contract's whole price history)
+    # raises instead of silently running SQL; eager-load where needed.
+    symbol_rel = relationship("Symbol", back_populates="option_contracts", lazy="raise_on_sql")
+    option_prices = relationship("OptionPrice", back_populates="contract", lazy="raise_on_sql")
+    opportunities = relationship("TradingOpportunity", back_populates="contract", lazy="raise_on_sql")
 
 class OptionPrice(Base):
     __tablename__ = "option_prices"
@@ -78,19 +171,34 @@ class OptionPrice(Base):
     intrinsic_value = Column(Float)
     
     # Relationship
-    contract = relationship("OptionContract", back_populates="option_prices")
+    contract = relationship("OptionContract", back_populates="option_prices", lazy="raise_on_sql")
+
+    # Per-contract history and latest-price lookups seek on both columns
+    # (on PostgreSQL the latest quote is read from the index alone); the
+    # standalone timestamp index serves the global MAX(timestamp)
+    __table_args__ = (
+        Index(
+            "ix_option_prices_contract_timestamp", "contract_id", "timestamp",
+            postgresql_include=["bid", "ask", "last_price"]
+        ),
+    )
 
 class IVAnalysis(Base):
     __tablename__ = "iv_analysis"
     
     id = Column(Integer, primary_key=True, index=True)
     symbol_id = Column(Integer, ForeignKey("symbols.id"))
-    timestamp = Column(DateTime, index=True)
+    timestamp = Column(DateTime)  # covered by the (symbol_id, timestamp) index
     current_iv = Column(Float)
     iv_rank = Column(Float)  # 0-100 percentile vs 1 year range
     iv_percentile = Column(Float)  # 0-100 percentile vs historical distribution
     hv_20d = Column(Float)  # 20-day historical volatility
     hv_30d = Column(Float)  # 30-day historical volatility
+
+    # Latest/history lookups are always per symbol, newest first
+    __table_args__ = (
+        Index("ix_iv_analysis_symbol_timestamp", "symbol_id", "timestamp"),
+    )
     
 class TradingOpportunity(Base):
     __tablename__ = "trading_opportunities"
@@ -98,13 +206,22 @@ class TradingOpportunity(Base):
     id = Column(Integer, primary_key=True, index=True)
     contract_id = Column(Integer, ForeignKey("option_contracts.id"))
     timestamp = Column(DateTime, default=datetime.utcnow)
-    opportunity_type = Column(String)  # 'overpriced', 'underpriced', 'high_iv', etc.
+    opportunity_type = Column(OpportunityType)  # 'overpriced', 'underpriced', 'high_iv', etc.
     score = Column(Float)  # 0-100 confidence score
     description = Column(String)
     is_active = Column(Boolean, default=True)
 
-    # Relationships
-    contract = relationship("OptionContract", backref="opportunities")
+    # Relationships (eager-load with joinedload/contains_eager)
+    contract = relationship("OptionContract", back_populates="opportunities", lazy="raise_on_sql")
+
+    # At most one active opportunity per contract and type; also the
+    # ON CONFLICT target for the opportunity upsert
+    __table_args__ = (
+        Index(
+            "uq_trading_opportunities_active", "contract_id", "opportunity_type", unique=True,
+            postgresql_where=(is_active == True), sqlite_where=(is_active == True)
+        ),
+    )
     
 class UserWatchlist(Base):
     __tablename__ = "user_watchlists"
@@ -115,15 +232,57 @@ class UserWatchlist(Base):
     is_active = Column(Boolean, default=True, index=True)  # Whether this watchlist entry is active
 
     # Relationship
-    symbol_rel = relationship("Symbol", back_populates="watchlist_entries")
+    symbol_rel = relationship("Symbol", back_populates="watchlist_entries", lazy="raise_on_sql")
 
 # Database setup
 # Use PostgreSQL in production (Render), SQLite for local development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./options_tracker.db")
 
+# Compiled-SQL cache entries per engine, raised from SQLAlchemy's default of
+# 500 so the API's, scheduler's and stores' statements (including one insert
+# shape per executemany batch size) stay compiled instead of evicting each other
+QUERY_CACHE_SIZE = int(os.getenv("SQLALCHEMY_QUERY_CACHE_SIZE", "1200"))
+
+# How long a SQLite connection waits for another connection's write lock
+# before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+
 # SQLite-specific connection args
 if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={"check_same_thread": False},
+        query_cache_size=QUERY_CACHE_SIZE
+    )
+
+    @event.listens_for(engine, "connect")
+    def _configure_sqlite_connection(dbapi_connection, connection_record):
+        # WAL + synchronous=NORMAL only fsyncs on checkpoints rather than on
+        # every commit. Disabling pysqlite's own transaction handling (and
+        # emitting BEGIN below) keeps SAVEPOINTs nested in the outer transaction.
+        # The page cache (64 MB), memory-mapped reads (256 MB) and in-memory
+        # temp tables keep the API's history queries off disk I/O while the
+        # scheduler writes. The busy timeout makes concurrent writers (the
+        # scheduler's jobs, the scanner) wait for the write lock.
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin_sqlite_transaction(conn):
+        # Write scopes (see begin_write_transaction) take the write lock up
+        # front; a deferred transaction that reads first can't always upgrade
+        # to a writer under WAL, and then fails without waiting
+        if conn.get_execution_options().get('sqlite_begin_immediate'):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        else:
+            conn.exec_driver_sql("BEGIN")
 else:
     # PostgreSQL - configured for concurrent scheduled jobs
     # Handle Render's postgres:// vs postgresql:// prefix
@@ -133,16 +292,242 @@ else:
     engine = create_engine(
         DATABASE_URL,
         pool_pre_ping=True,      # Verify connections before using
-        pool_size=20,            # Increased from default 5 to handle concurrent jobs
-        max_overflow=30,         # Increased from default 10 for peak loads
+        pool_size=int(os.getenv("DB_POOL_SIZE", "20")),        # Sized for concurrent jobs
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "30")),  # Headroom for peak loads
+        pool_use_lifo=True,      # Reuse the most recent (warm) connections; idle extras age out
         pool_recycle=3600,       # Recycle connections after 1 hour
-        pool_timeout=60          # Wait up to 60s for connection (increased from 30s)
+        pool_timeout=60,         # Wait up to 60s for connection (increased from 30s)
+        query_cache_size=QUERY_CACHE_SIZE
     )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sessions are short-lived (one request or one job), so objects keep their
+# loaded state across commits instead of re-SELECTing every row touched after
+# each commit in the stores' and scheduler's loops
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+def begin_write_transaction(session):
+    """
+    Start the session's next transaction as a write transaction
+
+    On SQLite the transaction begins with BEGIN IMMEDIATE, waiting for the
+    write lock instead of failing when its first write comes after a read
+    that another writer has since overtaken. Any transaction the session
+    already has open is committed first. Other dialects begin as usual.
+
+    Args:
+        session: SQLAlchemy session about to write
+    """
+    if session.in_transaction():
+        session.commit()
+    session.connection(execution_options={'sqlite_begin_immediate': True})
+
+# Dialect-specific INSERT constructs that support ON CONFLICT upserts
+UPSERT_INSERTS = {
+    'postgresql': postgresql_insert,
+    'sqlite': sqlite_insert
+}
+
+# Rows per executemany call in bulk_insert; bounds the parameter buffers
+# built for a single statement
+BULK_INSERT_BATCH_SIZE = 1000
+
+def update_or_insert_rows(connection, table, rows, index_elements, update_columns):
+    """
+    Upsert fallback for dialects without INSERT ... ON CONFLICT
+
+    Looks up which rows already exist, updates those with one executemany
+    UPDATE and inserts the rest. Later rows win when a key repeats.
+
+    Args:
+        connection: Connection to run on (joins its transaction)
+        table: Table to write
+        rows: List of column -> value dicts
+        index_elements: Columns of the unique key rows are matched on
+        update_columns: Columns overwritten on rows that already exist
+
+    Returns:
+        Number of rows written
+    """
+    rows_by_key = {tuple(row[column] for column in index_elements): row for row in rows}
+    if not rows_by_key:
+        return 0
+
+    # Narrow the lookup on the leading key column, then match full keys here
+    lead = index_elements[0]
+    lead_values = list({key[0] for key in rows_by_key})
+    existing = set()
+    for start in range(0, len(lead_values), BULK_INSERT_BATCH_SIZE):
+        existing.update(
+            tuple(found) for found in connection.execute(
+                select(*(table.c[column] for column in index_elements))
+                .where(table.c[lead].in_(lead_values[start:start + BULK_INSERT_BATCH_SIZE]))
+            )
+        )
+
+    updates = [
+        {**{f'key_{column}': row[column] for column in index_elements},
+         **{f'new_{column}': row[column] for column in update_columns}}
+        for key, row in rows_by_key.items() if key in existing
+    ]
+    if updates:
+        connection.execute(
+            update(table)
+            .where(and_(*(table.c[column] == bindparam(f'key_{column}') for column in index_elements)))
+            .values({column: bindparam(f'new_{column}') for column in update_columns}),
+            updates
+        )
+
+    inserts = [row for key, row in rows_by_key.items() if key not in existing]
+    if inserts:
+        connection.execute(insert(table), inserts)
+    return len(rows_by_key)
+
+def insert_statement(session, model, ignore_conflicts_on=None):
+    """
+    Core INSERT for a mapped class, optionally skipping conflicting rows
+
+    Args:
+        session: Session the statement will run on (selects the dialect)
+        model: Mapped class to insert into
+        ignore_conflicts_on: Unique columns; rows colliding on them are
+            skipped with ON CONFLICT DO NOTHING where the dialect supports it
+
+    Returns:
+        Insert statement
+    """
+    dialect = session.get_bind().dialect.name
+    if ignore_conflicts_on and dialect in UPSERT_INSERTS:
+        return UPSERT_INSERTS[dialect](model.__table__).on_conflict_do_nothing(
+            index_elements=ignore_conflicts_on
+        )
+    return insert(model.__table__)
+
+def bulk_insert(session, model, rows, batch_size=BULK_INSERT_BATCH_SIZE, ignore_conflicts_on=None):
+    """
+    Insert plain row dicts with Core executemany, bypassing the ORM unit of work
+
+    Runs on the session's connection, so the rows join its transaction.
+
+    Args:
+        session: Session whose transaction the insert joins
+        model: Mapped class to insert into
+        rows: List of column -> value dicts
+        batch_size: Rows per executemany call
+        ignore_conflicts_on: Unique columns to skip conflicting rows on
+    """
+    if not rows:
+        return
+    if not ignore_conflicts_on and session.get_bind().dialect.name == 'postgresql':
+        # COPY has no per-row statement overhead at all
+        copy_rows(session, model, rows)
+        return
+
+    stmt = insert_statement(session, model, ignore_conflicts_on)
+    for start in range(0, len(rows), batch_size):
+        session.execute(stmt, rows[start:start + batch_size])
+
+def copy_rows(session, model, rows):
+    """
+    Load row dicts with PostgreSQL COPY FROM STDIN (CSV format)
+
+    Uses the session's DBAPI connection (psycopg2), so the load joins its
+    transaction. None (and empty strings) load as NULL.
+
+    Args:
+        session: Session on a PostgreSQL engine
+        model: Mapped class to load into
+        rows: List of column -> value dicts, all with the same keys
+    """
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows([row[column] for column in columns] for row in rows)
+    buffer.seek(0)
+
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f'COPY "{model.__tablename__}" ({column_list}) FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
+    finally:
+        cursor.close()
+
+def analyze_tables(session, *models):
+    """
+    Refresh PostgreSQL planner statistics for tables that just took a bulk load
+
+    Autovacuum only re-analyzes once enough rows change, so right after an
+    ingestion run the planner may still be costing the contract_id/symbol_id
+    lookups from stale row counts. A no-op on other dialects.
+
+    Args:
+        session: Session to run on; commits its transaction
+        *models: Mapped classes whose tables to analyze
+    """
+    if session.get_bind().dialect.name != 'postgresql':
+        return
+    session.execute(text(f"ANALYZE {', '.join(model.__tablename__ for model in models)}"))
+    session.commit()
+
+def load_symbol_tree(session, symbol_ids, contract_criteria=(), prices_since=None):
+    """
+    Load symbols with their contracts (and optionally prices) using one
+    IN-list query per level, then stitch the relationships in Python
+
+    Avoids both per-symbol queries and a wide JOIN that repeats every symbol
+    and contract column on each price row. The stitched relationships are
+    set as already loaded, so walking them issues no further SQL.
+
+    Args:
+        session: Session to load into
+        symbol_ids: Symbol ids to load
+        contract_criteria: Extra filter expressions for the contracts
+        prices_since: When given, also load option prices at or after this
+            time; otherwise option_prices is left unloaded
+
+    Returns:
+        List of Symbol with option_contracts (and their option_prices) set
+    """
+    symbol_ids = list(symbol_ids)
+    if not symbol_ids:
+        return []
+
+    symbols = session.query(Symbol).filter(Symbol.id.in_(symbol_ids)).all()
+    contracts = session.query(OptionContract).filter(
+        OptionContract.symbol_id.in_(symbol_ids), *contract_criteria
+    ).all()
+
+    symbols_by_id = {symbol.id: symbol for symbol in symbols}
+    contracts_by_symbol = {symbol.id: [] for symbol in symbols}
+    for contract in contracts:
+        contracts_by_symbol[contract.symbol_id].append(contract)
+        set_committed_value(contract, 'symbol_rel', symbols_by_id[contract.symbol_id])
+    for symbol in symbols:
+        set_committed_value(symbol, 'option_contracts', contracts_by_symbol[symbol.id])
+
+    if prices_since is not None and contracts:
+        prices_by_contract = {contract.id: [] for contract in contracts}
+        contracts_by_id = {contract.id: contract for contract in contracts}
+        prices = session.query(OptionPrice).filter(
+            OptionPrice.contract_id.in_(list(contracts_by_id)),
+            OptionPrice.timestamp >= prices_since
+        ).order_by(OptionPrice.contract_id, OptionPrice.timestamp).all()
+        for price in prices:
+            prices_by_contract[price.contract_id].append(price)
+            set_committed_value(price, 'contract', contracts_by_id[price.contract_id])
+        for contract in contracts:
+            set_committed_value(contract, 'option_prices', prices_by_contract[contract.id])
+
+    return symbols
 
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    # One catalog query for the existing table names instead of a has-table
+    # probe per table on every boot; create_all only runs for missing tables
+    existing = set(inspect(engine).get_table_names())
+    missing = [table for table in Base.metadata.sorted_tables if table.name not in existing]
+    if missing:
+        Base.metadata.create_all(bind=engine, tables=missing)
 
 def get_db():
     db = SessionLocal()
@@ -150,3 +535,21 @@ def get_db():
         yield db
     finally:
         db.close()
+
+@contextmanager
+def session_scope():
+    """
+    Session for one unit of work outside a request, e.g. a scheduled job
+
+    Commits when the block completes, rolls back if it raises, and always
+    closes the session so its connection goes back to the pool.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -8,22 +8,39 @@ Based on established options trading principles:
 - Gamma Scalping: High gamma + low theta near ATM
 - Delta Opportunities: Directional plays with favorable risk/reward
 """
+import copy
+import os
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, or_, update
+from sqlalchemy.engine import Row
 import logging
 
 from models import (
     Symbol, StockPrice, OptionContract, OptionPrice,
-    IVAnalysis, TradingOpportunity, UserWatchlist
+    IVAnalysis, TradingOpportunity, UserWatchlist, UPSERT_INSERTS, begin_write_transaction, load_symbol_tree
 )
 from calculations import OptionsCalculator
 
 logger = logging.getLogger(__name__)
 
+# Number of symbols scanned concurrently by scan_all_opportunities
+OPPORTUNITY_SCAN_WORKERS = int(os.getenv('OPPORTUNITY_SCAN_WORKERS', '4'))
+
+# Watchlist symbols loaded, scanned and saved together by scan_all_opportunities;
+# bounds how many symbols' contracts are in memory at once
+OPPORTUNITY_SCAN_BATCH_SIZE = 25
+
+# OptionPrice columns the detectors read; scans fetch only these
+SCAN_PRICE_COLUMNS = (
+    'contract_id', 'bid', 'ask', 'last_price', 'volume', 'open_interest',
+    'implied_volatility', 'delta', 'gamma', 'theta', 'vega', 'spread_percentage'
+)
+
 
 class EnhancedOpportunityDetector:
     """
@@ -58,59 +75,200 @@ class EnhancedOpportunityDetector:
     def get_current_stock_price(self, symbol_id: int) -> Optional[float]:
         """Get most recent stock price for a symbol"""
         try:
-            latest = self.db.query(StockPrice).filter(
+            # Only the close is read, so PostgreSQL can answer from the
+            # covering (symbol_id, timestamp) INCLUDE (close_price) index
+            return self.db.query(StockPrice.close_price).filter(
                 StockPrice.symbol_id == symbol_id
-            ).order_by(StockPrice.timestamp.desc()).first()
-
-            return latest.close_price if latest else None
+            ).order_by(StockPrice.timestamp.desc()).limit(1).scalar()
 
         except Exception as e:
             logger.error(f"Error getting stock price: {str(e)}")
             return None
 
-    def calculate_liquidity_score(self, latest_price: OptionPrice) -> float:
+    def get_latest_option_prices(self, contract_ids: List[int]) -> Dict[int, Row]:
+        """
+        Get the most recent price row of each contract in a single query
+
+        Ranks every contract's prices newest first with ROW_NUMBER() and keeps
+        rank 1, instead of an ORDER BY ... LIMIT 1 query per contract. Only
+        the SCAN_PRICE_COLUMNS are selected, as plain rows rather than
+        session-tracked OptionPrice objects.
+
+        Args:
+            contract_ids: Contracts to look up
+
+        Returns:
+            Dictionary mapping contract_id to its latest price row (contracts
+            without a usable latest price are absent)
+        """
+        if not contract_ids:
+            return {}
+
+        ranked = self.db.query(
+            *(getattr(OptionPrice, column) for column in SCAN_PRICE_COLUMNS),
+            func.row_number().over(
+                partition_by=OptionPrice.contract_id,
+                order_by=(OptionPrice.timestamp.desc(), OptionPrice.id.desc())
+            ).label('rn')
+        ).filter(OptionPrice.contract_id.in_(contract_ids)).subquery()
+
+        # Latest quotes no detector can use (no volume, or no readable
+        # bid/ask) are dropped here rather than shipped and masked out. This
+        # runs after the ranking, so an older quote never stands in for them.
+        prices = self.db.query(
+            *(ranked.c[column] for column in SCAN_PRICE_COLUMNS)
+        ).filter(
+            ranked.c.rn == 1,
+            ranked.c.volume.isnot(None),
+            ranked.c.bid.isnot(None),
+            or_(ranked.c.bid <= 0, ranked.c.ask.isnot(None))
+        ).all()
+        return {price.contract_id: price for price in prices}
+
+    def get_latest_iv_analyses(self, symbol_ids: List[int]) -> Dict[int, IVAnalysis]:
+        """
+        Get the most recent IVAnalysis of each symbol in a single query
+
+        Args:
+            symbol_ids: Symbols to look up
+
+        Returns:
+            Dictionary mapping symbol_id to its latest analysis (symbols
+            without one are absent)
+        """
+        if not symbol_ids:
+            return {}
+
+        ranked = self.db.query(
+            IVAnalysis,
+            func.row_number().over(
+                partition_by=IVAnalysis.symbol_id,
+                order_by=(IVAnalysis.timestamp.desc(), IVAnalysis.id.desc())
+            ).label('rn')
+        ).filter(IVAnalysis.symbol_id.in_(symbol_ids)).subquery()
+        latest = aliased(IVAnalysis, ranked)
+
+        analyses = self.db.query(latest).filter(ranked.c.rn == 1).all()
+        return {analysis.symbol_id: analysis for analysis in analyses}
+
+    def build_contract_frame(
+        self,
+        contracts: List[OptionContract],
+        latest_prices: Dict[int, Row],
+        stock_price: float,
+        now: datetime
+    ) -> pd.DataFrame:
+        """
+        Build the column table the vectorized detectors run on
+
+        One row per contract that has a latest price, in contract order.
+        Missing quote fields become NaN. The shared derived columns (days to
+        expiry, mid price, liquidity score) are computed here once for every
+        detector.
+
+        Args:
+            contracts: Contracts being scanned
+            latest_prices: Latest price row per contract_id
+            stock_price: Current underlying price
+            now: Scan reference time
+
+        Returns:
+            DataFrame with a 'contract' object column plus numeric columns
+        """
+        priced = [(contract, latest_prices[contract.id]) for contract in contracts if contract.id in latest_prices]
+        prices = [price for _, price in priced]
+
+        def column(attribute):
+            return np.array([getattr(price, attribute) for price in prices], dtype=float)
+
+        frame = pd.DataFrame({
+            'contract': [contract for contract, _ in priced],
+            'option_type': [contract.option_type for contract, _ in priced],
+            'is_call': np.array([(contract.option_type or '').lower() == 'call' for contract, _ in priced], dtype=bool),
+            'strike': np.array([contract.strike_price for contract, _ in priced], dtype=float),
+            'bid': column('bid'),
+            'ask': column('ask'),
+            'last_price': column('last_price'),
+            'volume': column('volume'),
+            'open_interest': column('open_interest'),
+            'implied_volatility': column('implied_volatility'),
+            'delta': column('delta'),
+            'gamma': column('gamma'),
+            'theta': column('theta'),
+            'vega': column('vega'),
+            'spread_percentage': column('spread_percentage'),
+        })
+
+        # Same arithmetic as calculate_time_to_expiry, on microsecond offsets
+        expiry = np.array([contract.expiry_date for contract, _ in priced], dtype='datetime64[us]')
+        seconds = (expiry - np.datetime64(now, 'us')) / np.timedelta64(1, 'us') / 10**6
+        frame['time_to_expiry'] = np.maximum(seconds / 86400 / 365.0, 0.0001)
+        frame['days_to_expiry'] = frame['time_to_expiry'] * 365
+
+        # Branchless mid price on the raw arrays (no pandas alignment)
+        bid, ask = frame['bid'].to_numpy(), frame['ask'].to_numpy()
+        frame['mid_price'] = np.where((bid > 0) & (ask > 0), (bid + ask) * 0.5, frame['last_price'].to_numpy())
+        frame['liquidity_score'] = self.calculate_liquidity_scores(frame)
+
+        # Rows every detector can use: a volume, a readable bid/ask (a
+        # missing ask only matters when the bid is positive), a type and a
+        # strike. Gamma scalping never reads the mid price; the other
+        # detectors also need it.
+        frame['quoted'] = (
+            frame['volume'].notna() & ~np.isnan(bid) & ~((bid > 0) & np.isnan(ask))
+            & frame['option_type'].notna() & frame['strike'].notna()
+        )
+        frame['has_mid'] = frame['quoted'] & frame['mid_price'].notna()
+
+        # Greek magnitudes and presence (set and non-zero), shared by the
+        # detectors' gates and scores
+        for greek in ('delta', 'gamma', 'theta', 'vega'):
+            values = frame[greek]
+            frame[f'has_{greek}'] = values.notna() & (values != 0)
+            frame[f'{greek}_magnitude'] = values.abs()
+        frame['moneyness'] = stock_price / frame['strike']
+        is_put = (frame['option_type'] == 'put').to_numpy()
+        frame.loc[is_put, 'moneyness'] = frame['strike'][is_put] / stock_price
+        return frame
+
+    def calculate_liquidity_scores(self, frame: pd.DataFrame) -> np.ndarray:
         """
-        Calculate liquidity score (0-100) based on spread, volume, OI
+        Calculate liquidity scores (0-100) based on spread, volume, OI
 
-        Higher scores = better liquidity
+        Higher scores = better liquidity. A missing or zero spread or open
+        interest contributes nothing.
         """
-        score = 0.0
+        spread = frame['spread_percentage'].fillna(0).to_numpy()
+        volume = frame['volume'].to_numpy()
+        open_interest = frame['open_interest'].fillna(0).to_numpy()
 
         # Spread component (40 points max)
-        if latest_price.spread_percentage:
-            if latest_price.spread_percentage < self.TIGHT_SPREAD:
-                score += 40
-            elif latest_price.spread_percentage < self.ACCEPTABLE_SPREAD:
-                score += 30 * (1 - (latest_price.spread_percentage - self.TIGHT_SPREAD) /
-                              (self.ACCEPTABLE_SPREAD - self.TIGHT_SPREAD))
+        has_spread = spread != 0
+        spread_score = np.where(
+            has_spread & (spread < self.TIGHT_SPREAD), 40.0,
+            np.where(
+                has_spread & (spread < self.ACCEPTABLE_SPREAD),
+                30 * (1 - (spread - self.TIGHT_SPREAD) / (self.ACCEPTABLE_SPREAD - self.TIGHT_SPREAD)),
+                0.0
+            )
+        )
 
         # Volume component (30 points max)
-        if latest_price.volume > 0:
-            if latest_price.volume >= 100:
-                score += 30
-            elif latest_price.volume >= 50:
-                score += 20
-            elif latest_price.volume >= 10:
-                score += 10
+        volume_score = np.select([volume >= 100, volume >= 50, volume >= 10], [30.0, 20.0, 10.0], 0.0)
 
         # Open interest component (30 points max)
-        if latest_price.open_interest:
-            if latest_price.open_interest >= 1000:
-                score += 30
-            elif latest_price.open_interest >= 500:
-                score += 20
-            elif latest_price.open_interest >= 100:
-                score += 10
+        open_interest_score = np.select(
+            [open_interest >= 1000, open_interest >= 500, open_interest >= 100], [30.0, 20.0, 10.0], 0.0
+        )
 
-        return min(score, 100)
+        return np.minimum(spread_score + volume_score + open_interest_score, 100)
 
-    def detect_premium_selling_opportunity(
+    def detect_premium_selling_opportunities(
         self,
         symbol: Symbol,
-        contract: OptionContract,
-        latest_price: OptionPrice,
-        stock_price: float
-    ) -> Optional[Dict]:
+        frame: pd.DataFrame,
+        recent_iv: Optional[IVAnalysis]
+    ) -> List[Tuple[int, Dict]]:
         """
         Detect premium selling opportunities (credit strategies)
 
@@ -122,99 +280,80 @@ class EnhancedOpportunityDetector:
         - Not too far OTM (delta > 0.15 for reasonable premium)
 
         Best for: Covered calls, cash-secured puts, credit spreads
-        """
-        try:
-            # Get IV analysis
-            recent_iv = self.db.query(IVAnalysis).filter(
-                IVAnalysis.symbol_id == symbol.id
-            ).order_by(IVAnalysis.timestamp.desc()).first()
-
-            if not recent_iv or recent_iv.iv_rank < self.IV_RANK_MID_HIGH:
-                return None
-
-            # Check Greeks
-            if not latest_price.theta or not latest_price.vega or not latest_price.delta:
-                return None
-
-            # High theta is negative and large in magnitude (good for sellers)
-            theta_magnitude = abs(latest_price.theta)
-            if theta_magnitude < 0.02:  # Too little time decay
-                return None
-
-            # Check delta for reasonable premium collection
-            delta_magnitude = abs(latest_price.delta)
-            if delta_magnitude < 0.10:  # Too far OTM, minimal premium
-                return None
-
-            # Calculate time to expiry
-            time_to_expiry = self.calculator.calculate_time_to_expiry(contract.expiry_date)
-            days_to_expiry = time_to_expiry * 365
 
+        recent_iv is the symbol's latest IVAnalysis, looked up once per scan.
+        Returns (row, opportunity) pairs for the rows scoring >= MIN_SCORE.
+        """
+        if not recent_iv or recent_iv.iv_rank is None or recent_iv.iv_rank < self.IV_RANK_MID_HIGH:
+            return []
+
+        # High theta is negative and large in magnitude (good for sellers);
+        # too little time decay or too far OTM (minimal premium) is out
+        theta_magnitude = frame['theta_magnitude'].to_numpy()
+        delta_magnitude = frame['delta_magnitude'].to_numpy()
+        days_to_expiry = frame['days_to_expiry'].to_numpy()
+        candidates = (
+            frame['has_mid'].to_numpy()
+            & frame['has_theta'].to_numpy() & frame['has_vega'].to_numpy() & frame['has_delta'].to_numpy()
+            & (theta_magnitude >= 0.02) & (delta_magnitude >= 0.10)
             # Best for 20-60 days out
-            if days_to_expiry < 7 or days_to_expiry > 90:
-                return None
-
-            # Calculate score
-            base_score = 40
-
-            # IV rank contribution (0-25 points)
-            if recent_iv.iv_rank >= self.IV_RANK_HIGH:
-                base_score += 25
-            else:
-                base_score += 15 * (recent_iv.iv_rank - self.IV_RANK_MID_HIGH) / (self.IV_RANK_HIGH - self.IV_RANK_MID_HIGH)
-
-            # Theta contribution (0-15 points)
-            # Higher theta magnitude = better for selling
-            theta_score = min(theta_magnitude / 0.10 * 15, 15)
-            base_score += theta_score
-
-            # Vega contribution (0-10 points)
-            # Higher vega = more to gain from IV contraction
-            if latest_price.vega > 0.20:
-                base_score += 10
-            elif latest_price.vega > 0.10:
-                base_score += 5
-
-            # Liquidity bonus (0-10 points)
-            liquidity_score = self.calculate_liquidity_score(latest_price)
-            base_score += min(liquidity_score / 10, 10)
-
-            # Get mid price
-            mid_price = (latest_price.bid + latest_price.ask) / 2 if (latest_price.bid > 0 and latest_price.ask > 0) else latest_price.last_price
-
+            & (days_to_expiry >= 7) & (days_to_expiry <= 90)
+        )
+
+        # Calculate score
+        base_score = 40
+
+        # IV rank contribution (0-25 points)
+        if recent_iv.iv_rank >= self.IV_RANK_HIGH:
+            base_score += 25
+        else:
+            base_score += 15 * (recent_iv.iv_rank - self.IV_RANK_MID_HIGH) / (self.IV_RANK_HIGH - self.IV_RANK_MID_HIGH)
+
+        # Theta contribution (0-15 points)
+        # Higher theta magnitude = better for selling
+        score = base_score + np.minimum(theta_magnitude / 0.10 * 15, 15)
+
+        # Vega contribution (0-10 points)
+        # Higher vega = more to gain from IV contraction
+        vega = frame['vega'].to_numpy()
+        score = score + np.select([vega > 0.20, vega > 0.10], [10.0, 5.0], 0.0)
+
+        # Liquidity bonus (0-10 points)
+        score = np.minimum(score + np.minimum(frame['liquidity_score'].to_numpy() / 10, 10), 100)
+
+        found = []
+        for row in np.flatnonzero(candidates & (score >= self.MIN_SCORE)):
+            contract = frame['contract'].iat[row]
+            mid_price = float(frame['mid_price'].iat[row])
             description = (
                 f"PREMIUM SELL: {symbol.symbol} {contract.option_type.upper()} "
                 f"${contract.strike_price:.0f} exp {contract.expiry_date.strftime('%m/%d')} "
-                f"(IV Rank: {recent_iv.iv_rank:.0f}%, Theta: ${theta_magnitude:.3f}/day, "
-                f"Premium: ${mid_price:.2f}, Delta: {delta_magnitude:.2f})"
+                f"(IV Rank: {recent_iv.iv_rank:.0f}%, Theta: ${theta_magnitude[row]:.3f}/day, "
+                f"Premium: ${mid_price:.2f}, Delta: {delta_magnitude[row]:.2f})"
             )
 
-            return {
+            found.append((row, {
                 'contract_id': contract.id,
                 'opportunity_type': 'premium_sell',
-                'score': min(base_score, 100),
+                'score': float(score[row]),
                 'description': description,
                 'metadata': {
                     'iv_rank': recent_iv.iv_rank,
-                    'theta': latest_price.theta,
-                    'vega': latest_price.vega,
-                    'delta': latest_price.delta,
+                    'theta': float(frame['theta'].iat[row]),
+                    'vega': float(vega[row]),
+                    'delta': float(frame['delta'].iat[row]),
                     'premium': mid_price,
-                    'days_to_expiry': days_to_expiry
+                    'days_to_expiry': float(days_to_expiry[row])
                 }
-            }
-
-        except Exception as e:
-            logger.error(f"Error detecting premium sell opportunity: {str(e)}")
-            return None
+            }))
+        return found
 
-    def detect_premium_buying_opportunity(
+    def detect_premium_buying_opportunities(
         self,
         symbol: Symbol,
-        contract: OptionContract,
-        latest_price: OptionPrice,
-        stock_price: float
-    ) -> Optional[Dict]:
+        frame: pd.DataFrame,
+        recent_iv: Optional[IVAnalysis]
+    ) -> List[Tuple[int, Dict]]:
         """
         Detect premium buying opportunities (debit strategies)
 
@@ -226,98 +365,80 @@ class EnhancedOpportunityDetector:
         - Reasonable delta (directional exposure)
 
         Best for: Long calls/puts, debit spreads, calendar spreads
-        """
-        try:
-            # Get IV analysis
-            recent_iv = self.db.query(IVAnalysis).filter(
-                IVAnalysis.symbol_id == symbol.id
-            ).order_by(IVAnalysis.timestamp.desc()).first()
-
-            if not recent_iv or recent_iv.iv_rank > self.IV_RANK_MID_LOW:
-                return None
-
-            # Check Greeks
-            if not latest_price.theta or not latest_price.vega or not latest_price.delta:
-                return None
-
-            # Lower theta magnitude is better for buyers
-            theta_magnitude = abs(latest_price.theta)
-
-            # High vega for IV expansion potential
-            if latest_price.vega < 0.05:
-                return None
-
-            # Calculate time to expiry
-            time_to_expiry = self.calculator.calculate_time_to_expiry(contract.expiry_date)
-            days_to_expiry = time_to_expiry * 365
 
+        recent_iv is the symbol's latest IVAnalysis, looked up once per scan.
+        Returns (row, opportunity) pairs for the rows scoring >= MIN_SCORE.
+        """
+        if not recent_iv or recent_iv.iv_rank is None or recent_iv.iv_rank > self.IV_RANK_MID_LOW:
+            return []
+
+        # Lower theta magnitude is better for buyers; high vega for IV
+        # expansion potential
+        theta_magnitude = frame['theta_magnitude'].to_numpy()
+        vega = frame['vega'].to_numpy()
+        days_to_expiry = frame['days_to_expiry'].to_numpy()
+        candidates = (
+            frame['has_mid'].to_numpy()
+            & frame['has_theta'].to_numpy() & frame['has_vega'].to_numpy() & frame['has_delta'].to_numpy()
+            & (vega >= 0.05)
             # Prefer longer duration for low IV plays (30-90 days)
-            if days_to_expiry < 20 or days_to_expiry > 120:
-                return None
-
-            # Calculate score
-            base_score = 40
-
-            # IV rank contribution (0-25 points)
-            # Lower IV rank = better for buying
-            if recent_iv.iv_rank <= self.IV_RANK_LOW:
-                base_score += 25
-            else:
-                base_score += 15 * (self.IV_RANK_MID_LOW - recent_iv.iv_rank) / (self.IV_RANK_MID_LOW - self.IV_RANK_LOW)
-
-            # Vega contribution (0-15 points)
-            # Higher vega = more to gain from IV expansion
-            vega_score = min(latest_price.vega / 0.30 * 15, 15)
-            base_score += vega_score
-
-            # Theta contribution (0-10 points)
-            # Lower theta magnitude = less decay cost
-            if theta_magnitude < 0.02:
-                base_score += 10
-            elif theta_magnitude < 0.05:
-                base_score += 5
-
-            # Liquidity bonus (0-10 points)
-            liquidity_score = self.calculate_liquidity_score(latest_price)
-            base_score += min(liquidity_score / 10, 10)
-
-            # Get mid price
-            mid_price = (latest_price.bid + latest_price.ask) / 2 if (latest_price.bid > 0 and latest_price.ask > 0) else latest_price.last_price
-
-            delta_magnitude = abs(latest_price.delta)
-
+            & (days_to_expiry >= 20) & (days_to_expiry <= 120)
+        )
+
+        # Calculate score
+        base_score = 40
+
+        # IV rank contribution (0-25 points)
+        # Lower IV rank = better for buying
+        if recent_iv.iv_rank <= self.IV_RANK_LOW:
+            base_score += 25
+        else:
+            base_score += 15 * (self.IV_RANK_MID_LOW - recent_iv.iv_rank) / (self.IV_RANK_MID_LOW - self.IV_RANK_LOW)
+
+        # Vega contribution (0-15 points)
+        # Higher vega = more to gain from IV expansion
+        score = base_score + np.minimum(vega / 0.30 * 15, 15)
+
+        # Theta contribution (0-10 points)
+        # Lower theta magnitude = less decay cost
+        score = score + np.select([theta_magnitude < 0.02, theta_magnitude < 0.05], [10.0, 5.0], 0.0)
+
+        # Liquidity bonus (0-10 points)
+        score = np.minimum(score + np.minimum(frame['liquidity_score'].to_numpy() / 10, 10), 100)
+
+        found = []
+        for row in np.flatnonzero(candidates & (score >= self.MIN_SCORE)):
+            contract = frame['contract'].iat[row]
+            mid_price = float(frame['mid_price'].iat[row])
+            delta_magnitude = frame['delta_magnitude'].iat[row]
             description = (
                 f"PREMIUM BUY: {symbol.symbol} {contract.option_type.upper()} "
                 f"${contract.strike_price:.0f} exp {contract.expiry_date.strftime('%m/%d')} "
-                f"(IV Rank: {recent_iv.iv_rank:.0f}%, Vega: {latest_price.vega:.2f}, "
+                f"(IV Rank: {recent_iv.iv_rank:.0f}%, Vega: {vega[row]:.2f}, "
                 f"Cost: ${mid_price:.2f}, Delta: {delta_magnitude:.2f})"
             )
 
-            return {
+            found.append((row, {
                 'contract_id': contract.id,
                 'opportunity_type': 'premium_buy',
-                'score': min(base_score, 100),
+                'score': float(score[row]),
                 'description': description,
                 'metadata': {
                     'iv_rank': recent_iv.iv_rank,
-                    'theta': latest_price.theta,
-                    'vega': latest_price.vega,
-                    'delta': latest_price.delta,
+                    'theta': float(frame['theta'].iat[row]),
+                    'vega': float(vega[row]),
+                    'delta': float(frame['delta'].iat[row]),
                     'cost': mid_price,
-                    'days_to_expiry': days_to_expiry
+                    'days_to_expiry': float(days_to_expiry[row])
                 }
-            }
-
-        except Exception as e:
-            logger.error(f"Error detecting premium buy opportunity: {str(e)}")
-            return None
+            }))
+        return found
 
-    def detect_gamma_scalping_opportunity(
+    def detect_gamma_scalping_opportunities(
         self,
-        contract: OptionContract,
-        latest_price: OptionPrice,
+        frame: pd.DataFrame,
         stock_price: float
-    ) -> Optional[Dict]:
+    ) -> List[Tuple[int, Dict]]:
         """
         Detect gamma scalping opportunities
 
@@ -329,189 +450,165 @@ class EnhancedOpportunityDetector:
         - Good liquidity for frequent trading
 
         Best for: Active traders in volatile markets
-        """
-        try:
-            if not latest_price.gamma or not latest_price.theta or not latest_price.delta:
-                return None
-
-            # Check gamma magnitude
-            gamma_magnitude = abs(latest_price.gamma)
-            if gamma_magnitude < 0.01:  # Too low for effective scalping
-                return None
-
-            # Calculate moneyness (how close to ATM)
-            moneyness = stock_price / contract.strike_price
-            if contract.option_type == 'put':
-                moneyness = contract.strike_price / stock_price
-
-            # Prefer near ATM (0.95 to 1.05)
-            if moneyness < 0.90 or moneyness > 1.10:
-                return None
-
-            # Time to expiry - gamma peaks near expiration
-            time_to_expiry = self.calculator.calculate_time_to_expiry(contract.expiry_date)
-            days_to_expiry = time_to_expiry * 365
-
-            if days_to_expiry < 7 or days_to_expiry > 45:
-                return None
-
-            # Gamma/Theta ratio - want high gamma, low theta cost
-            theta_magnitude = abs(latest_price.theta)
-            if theta_magnitude == 0:
-                return None
 
+        Returns (row, opportunity) pairs for the rows scoring >= MIN_SCORE.
+        """
+        gamma_magnitude = frame['gamma_magnitude'].to_numpy()
+        theta_magnitude = frame['theta_magnitude'].to_numpy()
+        moneyness = frame['moneyness'].to_numpy()
+        days_to_expiry = frame['days_to_expiry'].to_numpy()
+        liquidity_score = frame['liquidity_score'].to_numpy()
+
+        # Time to expiry - gamma peaks near expiration; a chain with nothing
+        # in the window has no candidates at all
+        near_expiry = (days_to_expiry >= 7) & (days_to_expiry <= 45)
+        if not near_expiry.any():
+            return []
+
+        # Gamma/Theta ratio - want high gamma, low theta cost
+        with np.errstate(divide='ignore', invalid='ignore'):
             gamma_theta_ratio = gamma_magnitude / theta_magnitude
 
-            if gamma_theta_ratio < 0.5:  # Theta cost too high relative to gamma
-                return None
-
+        candidates = (
+            frame['quoted'].to_numpy()
+            & frame['has_gamma'].to_numpy() & frame['has_theta'].to_numpy() & frame['has_delta'].to_numpy()
+            # Too low gamma for effective scalping
+            & (gamma_magnitude >= 0.01)
+            # Prefer near ATM (0.95 to 1.05)
+            & (moneyness >= 0.90) & (moneyness <= 1.10)
+            & near_expiry
+            # Theta cost too high relative to gamma
+            & (gamma_theta_ratio >= 0.5)
             # Check liquidity - critical for scalping
-            liquidity_score = self.calculate_liquidity_score(latest_price)
-            if liquidity_score < 50:  # Need good liquidity
-                return None
+            & (liquidity_score >= 50)
+        )
 
-            # Calculate score
-            base_score = 45
+        # Calculate score
+        base_score = 45
 
-            # Gamma contribution (0-20 points)
-            gamma_score = min(gamma_magnitude / 0.05 * 20, 20)
-            base_score += gamma_score
+        # Gamma contribution (0-20 points)
+        score = base_score + np.minimum(gamma_magnitude / 0.05 * 20, 20)
 
-            # Moneyness contribution (0-15 points)
-            # Closer to ATM = better
-            atm_distance = abs(1.0 - moneyness)
-            moneyness_score = 15 * (1 - atm_distance / 0.10)
-            base_score += max(moneyness_score, 0)
+        # Moneyness contribution (0-15 points)
+        # Closer to ATM = better
+        atm_distance = np.abs(1.0 - moneyness)
+        score = score + np.maximum(15 * (1 - atm_distance / 0.10), 0)
 
-            # Gamma/Theta ratio (0-10 points)
-            ratio_score = min(gamma_theta_ratio / 2.0 * 10, 10)
-            base_score += ratio_score
+        # Gamma/Theta ratio (0-10 points)
+        score = score + np.minimum(gamma_theta_ratio / 2.0 * 10, 10)
 
-            # Liquidity contribution (0-10 points)
-            base_score += min(liquidity_score / 10, 10)
-
-            mid_price = (latest_price.bid + latest_price.ask) / 2 if (latest_price.bid > 0 and latest_price.ask > 0) else latest_price.last_price
+        # Liquidity contribution (0-10 points)
+        score = np.minimum(score + np.minimum(liquidity_score / 10, 10), 100)
 
+        found = []
+        for row in np.flatnonzero(candidates & (score >= self.MIN_SCORE)):
+            contract = frame['contract'].iat[row]
             description = (
                 f"GAMMA SCALP: {contract.option_type.upper()} ${contract.strike_price:.0f} "
                 f"exp {contract.expiry_date.strftime('%m/%d')} "
-                f"(Gamma: {gamma_magnitude:.3f}, G/T Ratio: {gamma_theta_ratio:.1f}, "
-                f"Stock: ${stock_price:.2f}, Moneyness: {moneyness:.2%})"
+                f"(Gamma: {gamma_magnitude[row]:.3f}, G/T Ratio: {gamma_theta_ratio[row]:.1f}, "
+                f"Stock: ${stock_price:.2f}, Moneyness: {moneyness[row]:.2%})"
             )
 
-            return {
+            found.append((row, {
                 'contract_id': contract.id,
                 'opportunity_type': 'gamma_scalp',
-                'score': min(base_score, 100),
+                'score': float(score[row]),
                 'description': description,
                 'metadata': {
-                    'gamma': latest_price.gamma,
-                    'theta': latest_price.theta,
-                    'gamma_theta_ratio': gamma_theta_ratio,
-                    'moneyness': moneyness,
-                    'days_to_expiry': days_to_expiry,
-                    'liquidity_score': liquidity_score
+                    'gamma': float(frame['gamma'].iat[row]),
+                    'theta': float(frame['theta'].iat[row]),
+                    'gamma_theta_ratio': float(gamma_theta_ratio[row]),
+                    'moneyness': float(moneyness[row]),
+                    'days_to_expiry': float(days_to_expiry[row]),
+                    'liquidity_score': float(liquidity_score[row])
                 }
-            }
-
-        except Exception as e:
-            logger.error(f"Error detecting gamma scalping opportunity: {str(e)}")
-            return None
+            }))
+        return found
 
-    def detect_mispricing_opportunity(
+    def detect_mispricing_opportunities(
         self,
-        contract: OptionContract,
-        latest_price: OptionPrice,
+        frame: pd.DataFrame,
         stock_price: float
-    ) -> Optional[Dict]:
+    ) -> List[Tuple[int, Dict]]:
         """
         Enhanced mispricing detection with Greek validation
 
         Compares market price to Black-Scholes theoretical value
         Validates with Greek alignment
-        """
-        try:
-            if not latest_price.implied_volatility or latest_price.implied_volatility <= 0:
-                return None
 
-            # Calculate theoretical price
-            time_to_expiry = self.calculator.calculate_time_to_expiry(contract.expiry_date)
-            if time_to_expiry <= 0:
-                return None
-
-            theoretical_price = self.calculator.calculate_theoretical_price(
+        Returns (row, opportunity) pairs for the rows scoring >= MIN_SCORE.
+        """
+        implied_volatility = frame['implied_volatility'].to_numpy()
+        mid_price = frame['mid_price'].to_numpy()
+        liquidity_score = frame['liquidity_score'].to_numpy()
+
+        # Only price contracts that could still qualify: a usable IV, a
+        # positive market price and reasonable liquidity (critical for
+        # mispricing arbitrage)
+        priceable = np.flatnonzero(
+            frame['has_mid'].to_numpy() & (implied_volatility > 0)
+            & (mid_price > 0) & (liquidity_score >= 40)
+        )
+
+        # Calculate theoretical prices for the whole chain in one batch
+        theoretical_price = np.full(len(frame), np.nan)
+        if len(priceable):
+            theoretical_price[priceable] = self.calculator.calculate_theoretical_prices(
                 stock_price=stock_price,
-                strike_price=contract.strike_price,
-                time_to_expiry=time_to_expiry,
-                volatility=latest_price.implied_volatility,
-                option_type=contract.option_type
+                strike_price=frame['strike'].to_numpy()[priceable],
+                time_to_expiry=frame['time_to_expiry'].to_numpy()[priceable],
+                volatility=implied_volatility[priceable],
+                is_call=frame['is_call'].to_numpy()[priceable]
             )
 
-            if theoretical_price <= 0:
-                return None
-
-            # Get market price
-            mid_price = (latest_price.bid + latest_price.ask) / 2 if (latest_price.bid > 0 and latest_price.ask > 0) else latest_price.last_price
-
-            if mid_price <= 0:
-                return None
-
-            # Calculate mispricing
+        # Calculate mispricing; need significant mispricing
+        with np.errstate(divide='ignore', invalid='ignore'):
             mispricing_pct = (mid_price - theoretical_price) / theoretical_price
+        candidates = (theoretical_price > 0) & (np.abs(mispricing_pct) >= self.MISPRICING_THRESHOLD)
 
-            # Need significant mispricing
-            if abs(mispricing_pct) < self.MISPRICING_THRESHOLD:
-                return None
-
-            # Check liquidity - critical for mispricing arbitrage
-            liquidity_score = self.calculate_liquidity_score(latest_price)
-            if liquidity_score < 40:  # Need reasonable liquidity
-                return None
+        # Calculate score
+        base_score = 50
 
-            # Calculate score
-            base_score = 50
+        # Mispricing magnitude (0-30 points)
+        score = base_score + np.minimum(np.abs(mispricing_pct) / 0.30 * 30, 30)
 
-            # Mispricing magnitude (0-30 points)
-            mispricing_score = min(abs(mispricing_pct) / 0.30 * 30, 30)
-            base_score += mispricing_score
+        # Liquidity contribution (0-20 points)
+        score = np.minimum(score + np.minimum(liquidity_score / 5, 20), 100)
 
-            # Liquidity contribution (0-20 points)
-            base_score += min(liquidity_score / 5, 20)
-
-            opportunity_type = 'overpriced' if mispricing_pct > 0 else 'underpriced'
-            action = 'SELL' if mispricing_pct > 0 else 'BUY'
+        found = []
+        for row in np.flatnonzero(candidates & (score >= self.MIN_SCORE)):
+            contract = frame['contract'].iat[row]
+            opportunity_type = 'overpriced' if mispricing_pct[row] > 0 else 'underpriced'
+            action = 'SELL' if mispricing_pct[row] > 0 else 'BUY'
 
             description = (
                 f"MISPRICING ({action}): {contract.option_type.upper()} "
                 f"${contract.strike_price:.0f} exp {contract.expiry_date.strftime('%m/%d')} "
-                f"is {abs(mispricing_pct)*100:.1f}% {opportunity_type}. "
-                f"Market: ${mid_price:.2f}, Fair: ${theoretical_price:.2f}"
+                f"is {abs(mispricing_pct[row])*100:.1f}% {opportunity_type}. "
+                f"Market: ${mid_price[row]:.2f}, Fair: ${theoretical_price[row]:.2f}"
             )
 
-            return {
+            found.append((row, {
                 'contract_id': contract.id,
                 'opportunity_type': opportunity_type,
-                'score': min(base_score, 100),
+                'score': float(score[row]),
                 'description': description,
                 'metadata': {
-                    'market_price': mid_price,
-                    'theoretical_price': theoretical_price,
-                    'mispricing_pct': mispricing_pct * 100,
-                    'liquidity_score': liquidity_score
+                    'market_price': float(mid_price[row]),
+                    'theoretical_price': float(theoretical_price[row]),
+                    'mispricing_pct': float(mispricing_pct[row] * 100),
+                    'liquidity_score': float(liquidity_score[row])
                 }
-            }
-
-        except Exception as e:
-            logger.error(f"Error detecting mispricing: {str(e)}")
-            return None
+            }))
+        return found
 
-    def detect_high_delta_opportunity(
+    def detect_high_delta_opportunities(
         self,
         symbol: Symbol,
-        contract: OptionContract,
-        latest_price: OptionPrice,
+        frame: pd.DataFrame,
         stock_price: float
-    ) -> Optional[Dict]:
+    ) -> List[Tuple[int, Dict]]:
         """
         Detect directional opportunities with favorable delta
 
@@ -520,96 +617,97 @@ class EnhancedOpportunityDetector:
         - Low theta cost relative to delta
         - Good liquidity
         - Reasonable time to expiration
-        """
-        try:
-            if not latest_price.delta or not latest_price.theta:
-                return None
-
-            delta_magnitude = abs(latest_price.delta)
 
+        Returns (row, opportunity) pairs for the rows scoring >= MIN_SCORE.
+        """
+        delta_magnitude = frame['delta_magnitude'].to_numpy()
+        theta_magnitude = frame['theta_magnitude'].to_numpy()
+        days_to_expiry = frame['days_to_expiry'].to_numpy()
+        liquidity_score = frame['liquidity_score'].to_numpy()
+        mid_price = frame['mid_price'].to_numpy()
+
+        candidates = (
+            frame['has_mid'].to_numpy()
+            & frame['has_delta'].to_numpy() & frame['has_theta'].to_numpy()
             # Need high delta for stock replacement
-            if delta_magnitude < 0.65:
-                return None
-
-            # Calculate time to expiry
-            time_to_expiry = self.calculator.calculate_time_to_expiry(contract.expiry_date)
-            days_to_expiry = time_to_expiry * 365
-
+            & (delta_magnitude >= 0.65)
             # Prefer 30-120 days
-            if days_to_expiry < 20 or days_to_expiry > 180:
-                return None
-
-            # Check liquidity
-            liquidity_score = self.calculate_liquidity_score(latest_price)
-            if liquidity_score < 30:
-                return None
-
-            # Delta/Theta ratio
-            theta_magnitude = abs(latest_price.theta)
-            if theta_magnitude > 0:
-                delta_theta_ratio = delta_magnitude / theta_magnitude
-            else:
-                delta_theta_ratio = 0
-
-            # Calculate score
-            base_score = 45
-
-            # Delta contribution (0-20 points)
-            delta_score = (delta_magnitude - 0.65) / 0.35 * 20
-            base_score += min(delta_score, 20)
-
-            # Delta/Theta ratio (0-15 points)
-            if delta_theta_ratio > 15:
-                base_score += 15
-            elif delta_theta_ratio > 10:
-                base_score += 10
-            elif delta_theta_ratio > 5:
-                base_score += 5
-
-            # Liquidity (0-10 points)
-            base_score += min(liquidity_score / 10, 10)
-
-            # ITM/OTM status (0-10 points)
-            intrinsic = self.calculator.calculate_intrinsic_value(
-                stock_price, contract.strike_price, contract.option_type
-            )
-            mid_price = (latest_price.bid + latest_price.ask) / 2 if (latest_price.bid > 0 and latest_price.ask > 0) else latest_price.last_price
-
-            if mid_price > 0:
-                itm_pct = intrinsic / mid_price if intrinsic > 0 else 0
-                if itm_pct > 0.7:  # Deeply ITM
-                    base_score += 10
-                elif itm_pct > 0.5:
-                    base_score += 5
-
+            & (days_to_expiry >= 20) & (days_to_expiry <= 180)
+            & (liquidity_score >= 30)
+        )
+
+        # Delta/Theta ratio
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta_theta_ratio = np.where(theta_magnitude > 0, delta_magnitude / theta_magnitude, 0)
+
+        # Calculate score
+        base_score = 45
+
+        # Delta contribution (0-20 points)
+        score = base_score + np.minimum((delta_magnitude - 0.65) / 0.35 * 20, 20)
+
+        # Delta/Theta ratio (0-15 points)
+        score = score + np.select(
+            [delta_theta_ratio > 15, delta_theta_ratio > 10, delta_theta_ratio > 5], [15.0, 10.0, 5.0], 0.0
+        )
+
+        # Liquidity (0-10 points)
+        score = score + np.minimum(liquidity_score / 10, 10)
+
+        # ITM/OTM status (0-10 points)
+        strike = frame['strike'].to_numpy()
+        is_call = frame['is_call'].to_numpy()
+        intrinsic = np.maximum(np.where(is_call, stock_price - strike, strike - stock_price), 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            itm_pct = np.where((mid_price > 0) & (intrinsic > 0), intrinsic / mid_price, 0)
+        # Deeply ITM
+        score = np.minimum(score + np.select([itm_pct > 0.7, itm_pct > 0.5], [10.0, 5.0], 0.0), 100)
+
+        found = []
+        for row in np.flatnonzero(candidates & (score >= self.MIN_SCORE)):
+            contract = frame['contract'].iat[row]
             description = (
                 f"HIGH DELTA: {symbol.symbol} {contract.option_type.upper()} "
                 f"${contract.strike_price:.0f} exp {contract.expiry_date.strftime('%m/%d')} "
-                f"(Delta: {delta_magnitude:.2f}, D/T: {delta_theta_ratio:.1f}, "
+                f"(Delta: {delta_magnitude[row]:.2f}, D/T: {delta_theta_ratio[row]:.1f}, "
                 f"Stock: ${stock_price:.2f})"
             )
 
-            return {
+            found.append((row, {
                 'contract_id': contract.id,
                 'opportunity_type': 'high_delta',
-                'score': min(base_score, 100),
+                'score': float(score[row]),
                 'description': description,
                 'metadata': {
-                    'delta': latest_price.delta,
-                    'theta': latest_price.theta,
-                    'delta_theta_ratio': delta_theta_ratio,
-                    'days_to_expiry': days_to_expiry
+                    'delta': float(frame['delta'].iat[row]),
+                    'theta': float(frame['theta'].iat[row]),
+                    'delta_theta_ratio': float(delta_theta_ratio[row]),
+                    'days_to_expiry': float(days_to_expiry[row])
                 }
-            }
+            }))
+        return found
 
-        except Exception as e:
-            logger.error(f"Error detecting high delta opportunity: {str(e)}")
-            return None
+    @staticmethod
+    def _scannable_contract_criteria(now: datetime) -> Tuple:
+        """
+        Filters selecting the active, unexpired contracts a scan covers
+
+        Contracts without a type or strike are excluded too; every detector
+        needs both.
+        """
+        return (
+            OptionContract.is_active == True,
+            OptionContract.expiry_date > now,
+            OptionContract.option_type.isnot(None),
+            OptionContract.strike_price.isnot(None)
+        )
 
     def scan_symbol_opportunities(
         self,
         symbol: Symbol,
-        save_to_db: bool = True
+        save_to_db: bool = True,
+        contracts: Optional[List[OptionContract]] = None,
+        recent_iv: Optional[IVAnalysis] = None
     ) -> List[Dict]:
         """
         Scan all opportunities for a specific symbol using enhanced detection
@@ -617,6 +715,8 @@ class EnhancedOpportunityDetector:
         Args:
             symbol: Symbol to scan
             save_to_db: Whether to save opportunities to database
+            contracts: Preloaded active, unexpired contracts; queried when omitted
+            recent_iv: Preloaded latest IVAnalysis; queried when omitted
 
         Returns:
             List of detected opportunities
@@ -630,43 +730,38 @@ class EnhancedOpportunityDetector:
                 logger.warning(f"No stock price available for {symbol.symbol}")
                 return opportunities
 
+            # One reference time for the whole scan, shared by every detector
+            now = datetime.now()
+
             # Get active option contracts
-            contracts = self.db.query(OptionContract).filter(
-                and_(
+            if contracts is None:
+                contracts = self.db.query(OptionContract).filter(
                     OptionContract.symbol_id == symbol.id,
-                    OptionContract.is_active == True,
-                    OptionContract.expiry_date > datetime.now()
-                )
-            ).all()
+                    *self._scannable_contract_criteria(now)
+                ).all()
 
             logger.info(f"Scanning {len(contracts)} contracts for {symbol.symbol}")
 
-            for contract in contracts:
-                # Get latest price data
-                latest_price = self.db.query(OptionPrice).filter(
-                    OptionPrice.contract_id == contract.id
-                ).order_by(OptionPrice.timestamp.desc()).first()
-
-                if not latest_price:
-                    continue
-
-                # Run all enhanced detection algorithms
-                detectors = [
-                    lambda: self.detect_premium_selling_opportunity(symbol, contract, latest_price, stock_price),
-                    lambda: self.detect_premium_buying_opportunity(symbol, contract, latest_price, stock_price),
-                    lambda: self.detect_gamma_scalping_opportunity(contract, latest_price, stock_price),
-                    lambda: self.detect_mispricing_opportunity(contract, latest_price, stock_price),
-                    lambda: self.detect_high_delta_opportunity(symbol, contract, latest_price, stock_price),
-                ]
-
-                for detector in detectors:
-                    try:
-                        opp = detector()
-                        if opp and opp['score'] >= self.MIN_SCORE:
-                            opportunities.append(opp)
-                    except Exception as e:
-                        logger.error(f"Detector error: {str(e)}")
-                        continue
+            # Latest IV analysis, shared by every contract's detectors
+            if recent_iv is None:
+                recent_iv = self.get_latest_iv_analyses([symbol.id]).get(symbol.id)
+
+            # Latest price data for every contract at once
+            latest_prices = self.get_latest_option_prices([contract.id for contract in contracts])
+            frame = self.build_contract_frame(contracts, latest_prices, stock_price, now)
+
+            # Run all enhanced detection algorithms over the whole chain;
+            # each returns (row, opportunity) pairs, merged back into
+            # contract order
+            found = (
+                self.detect_premium_selling_opportunities(symbol, frame, recent_iv)
+                + self.detect_premium_buying_opportunities(symbol, frame, recent_iv)
+                + self.detect_gamma_scalping_opportunities(frame, stock_price)
+                + self.detect_mispricing_opportunities(frame, stock_price)
+                + self.detect_high_delta_opportunities(symbol, frame, stock_price)
+            )
+            found.sort(key=lambda item: item[0])
+            opportunities = [opp for _, opp in found]
 
             # Save to database if requested
             if save_to_db and opportunities:
@@ -692,26 +787,66 @@ class EnhancedOpportunityDetector:
         all_opportunities = {}
 
         try:
-            # Deactivate old opportunities
+            # Every opportunity saved by this scan is stamped with the scan
+            # time, so the ones it did not touch can be retired at the end
+            scan_time = datetime.now()
+
+            symbol_ids = [symbol_id for (symbol_id,) in self.db.query(UserWatchlist.symbol_id).filter(
+                UserWatchlist.is_active == True
+            ).distinct()]
+            contract_criteria = self._scannable_contract_criteria(datetime.now())
+
+            def scan_symbol(symbol, recent_iv):
+                # Runs on a scan thread with its own session; the symbol,
+                # contracts and IV analysis handed in are already loaded
+                session = Session(bind=self.db.get_bind())
+                try:
+                    detector = copy.copy(self)
+                    detector.db = session
+                    return detector.scan_symbol_opportunities(
+                        symbol, save_to_db=False, contracts=symbol.option_contracts,
+                        recent_iv=recent_iv
+                    )
+                finally:
+                    session.close()
+
+            # Symbols are independent until the save, so their price queries
+            # and detector passes overlap across threads
+            with ThreadPoolExecutor(max_workers=OPPORTUNITY_SCAN_WORKERS) as scan_pool:
+                # Load, scan and save the watchlist a batch of symbols at a
+                # time, so only one batch's contracts are held in memory
+                for start in range(0, len(symbol_ids), OPPORTUNITY_SCAN_BATCH_SIZE):
+                    batch_ids = symbol_ids[start:start + OPPORTUNITY_SCAN_BATCH_SIZE]
+
+                    # One IN-list query per level instead of queries per symbol
+                    symbols = load_symbol_tree(self.db, batch_ids, contract_criteria=contract_criteria)
+                    recent_ivs = self.get_latest_iv_analyses(batch_ids)
+
+                    batch_opportunities = []
+                    scans = scan_pool.map(scan_symbol, symbols, [recent_ivs.get(symbol.id) for symbol in symbols])
+                    for symbol, opportunities in zip(symbols, scans):
+                        if opportunities:
+                            all_opportunities[symbol.symbol] = opportunities
+                            batch_opportunities.extend(opportunities)
+
+                    # Save this batch's opportunities
+                    if save_to_db:
+                        self._save_opportunities(batch_opportunities, timestamp=scan_time)
+
+            # Deactivate old opportunities this scan did not find again, in
+            # one statement instead of clearing the table up front
             if save_to_db:
-                self.db.query(TradingOpportunity).update({TradingOpportunity.is_active: False})
+                self.db.execute(
+                    update(TradingOpportunity)
+                    .where(
+                        TradingOpportunity.is_active == True,
+                        or_(TradingOpportunity.timestamp.is_(None), TradingOpportunity.timestamp != scan_time)
+                    )
+                    .values(is_active=False)
+                    .execution_options(synchronize_session=False)
+                )
                 self.db.commit()
 
-            # Get all symbols from active watchlist entries
-            symbols = self.db.query(Symbol).join(
-                UserWatchlist, Symbol.id == UserWatchlist.symbol_id
-            ).filter(UserWatchlist.is_active == True).all()
-
-            for symbol in symbols:
-                opportunities = self.scan_symbol_opportunities(symbol, save_to_db=False)
-                if opportunities:
-                    all_opportunities[symbol.symbol] = opportunities
-
-            # Save all opportunities
-            if save_to_db:
-                all_opps = [opp for opps in all_opportunities.values() for opp in opps]
-                self._save_opportunities(all_opps)
-
             total_count = sum(len(opps) for opps in all_opportunities.values())
             logger.info(f"Total opportunities found: {total_count}")
 
@@ -720,34 +855,66 @@ class EnhancedOpportunityDetector:
 
         return all_opportunities
 
-    def _save_opportunities(self, opportunities: List[Dict]) -> None:
-        """Save opportunities to database"""
+    def _save_opportunities(self, opportunities: List[Dict], timestamp: Optional[datetime] = None) -> None:
+        """
+        Save opportunities to database
+
+        A single multi-row upsert against the unique index on active
+        (contract_id, opportunity_type): an opportunity that already has an
+        active row updates its score, description and timestamp, the rest
+        are inserted as new active rows. Dialects without ON CONFLICT do the
+        same one row at a time.
+
+        Args:
+            opportunities: Detected opportunities
+            timestamp: Time stamped on every saved row; defaults to now
+        """
+        if timestamp is None:
+            timestamp = datetime.now()
+
         try:
-            for opp in opportunities:
-                # Check if similar opportunity already exists
-                existing = self.db.query(TradingOpportunity).filter(
-                    and_(
-                        TradingOpportunity.contract_id == opp['contract_id'],
-                        TradingOpportunity.opportunity_type == opp['opportunity_type'],
-                        TradingOpportunity.is_active == True
-                    )
-                ).first()
+            # One row per conflict key; a statement may not update a row twice
+            rows = {
+                (opp['contract_id'], opp['opportunity_type']): {
+                    'contract_id': opp['contract_id'],
+                    'opportunity_type': opp['opportunity_type'],
+                    'score': opp['score'],
+                    'description': opp['description'],
+                    'timestamp': timestamp,
+                    'is_active': True
+                }
+                for opp in opportunities
+            }
 
-                if existing:
-                    # Update existing
-                    existing.score = opp['score']
-                    existing.description = opp['description']
-                    existing.timestamp = datetime.now()
-                else:
-                    # Create new
-                    new_opp = TradingOpportunity(
-                        contract_id=opp['contract_id'],
-                        opportunity_type=opp['opportunity_type'],
-                        score=opp['score'],
-                        description=opp['description'],
-                        is_active=True
+            if rows:
+                begin_write_transaction(self.db)
+                dialect = self.db.get_bind().dialect.name
+                if dialect in UPSERT_INSERTS:
+                    stmt = UPSERT_INSERTS[dialect](TradingOpportunity.__table__)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=['contract_id', 'opportunity_type'],
+                        index_where=TradingOpportunity.is_active == True,
+                        set_={
+                            'score': stmt.excluded.score,
+                            'description': stmt.excluded.description,
+                            'timestamp': stmt.excluded.timestamp
+                        }
                     )
-                    self.db.add(new_opp)
+                    self.db.execute(stmt, list(rows.values()))
+                else:
+                    # No ON CONFLICT on this dialect: update or add each row
+                    for row in rows.values():
+                        existing = self.db.query(TradingOpportunity).filter(
+                            TradingOpportunity.contract_id == row['contract_id'],
+                            TradingOpportunity.opportunity_type == row['opportunity_type'],
+                            TradingOpportunity.is_active == True
+                        ).first()
+                        if existing:
+                            existing.score = row['score']
+                            existing.description = row['description']
+                            existing.timestamp = row['timestamp']
+                        else:
+                            self.db.add(TradingOpportunity(**row))
 
             self.db.commit()
             logger.info(f"Saved {len(opportunities)} opportunities to database")
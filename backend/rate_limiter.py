@@ -0,0 +1,42 @@
+"""
+Thread-safe client-side rate limiting for external data APIs
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """Blocks callers so that at most max_calls happen in any period-second window"""
+
+    def __init__(self, max_calls: int, period: float = 60.0):
+        self.max_calls = max_calls
+        self.period = period
+        self._calls = deque()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until a call slot is free, then claim it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                else:
+                    while self._calls and now - self._calls[0] >= self.period:
+                        self._calls.popleft()
+
+                    if len(self._calls) < self.max_calls:
+                        self._calls.append(now)
+                        return
+
+                    wait = self.period - (now - self._calls[0])
+
+            time.sleep(wait)
+
+    def saturate(self):
+        """Hold every caller off for a full period (the API told us we're throttled)"""
+        with self._lock:
+            self._blocked_until = time.monotonic() + self.period
@@ -2,24 +2,66 @@
 Background task scheduler for periodic data updates
 Uses APScheduler to fetch data during market hours and analyze opportunities
 """
+from apscheduler.executors.pool import ThreadPoolExecutor as JobExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
-from datetime import datetime, time as dt_time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, time as dt_time
+from functools import lru_cache
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar, Holiday, GoodFriday, USMartinLutherKingJr, USPresidentsDay,
+    USMemorialDay, USLaborDay, USThanksgivingDay, nearest_workday, sunday_to_monday
+)
 from threading import Event
 import logging
-import pytz
-import time
+import os
+from zoneinfo import ZoneInfo
 
-from models import SessionLocal, create_tables, Symbol, OptionContract, OptionPrice, UserWatchlist, TradingOpportunity
-from data_fetcher import DataFetcher
+from models import session_scope, create_tables, analyze_tables, Symbol, OptionContract, OptionPrice, UserWatchlist, TradingOpportunity
+from data_fetcher import DataFetcher, IVOLATILITY_FETCH_WORKERS
 from opportunities import OpportunityDetector
 from sqlalchemy import func
 
 logger = logging.getLogger(__name__)
 
 # US Eastern Time (for market hours)
-ET = pytz.timezone('US/Eastern')
+ET = ZoneInfo('America/New_York')
+
+# Threads APScheduler runs jobs on; each job allows a single running instance
+SCHEDULER_JOB_WORKERS = int(os.getenv('SCHEDULER_JOB_WORKERS', '4'))
+
+# Seconds a job may start late (e.g. after a restart or a long previous run)
+# before that run is skipped
+SCHEDULER_MISFIRE_GRACE_TIME = 60
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    """
+    Full-day NYSE market holidays
+
+    A New Year's Day falling on a Saturday is not observed on the Friday
+    before; the other fixed-date holidays move to the nearest weekday.
+    """
+    rules = [
+        Holiday('New Years Day', month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-06-19', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday)
+    ]
+
+
+@lru_cache(maxsize=None)
+def market_holidays(year: int) -> frozenset:
+    """NYSE holiday dates for a year, computed once per year"""
+    holidays = NYSEHolidayCalendar().holidays(date(year, 1, 1), date(year, 12, 31))
+    return frozenset(holiday.date() for holiday in holidays)
+
 
 class DataUpdateScheduler:
     """
@@ -32,11 +74,25 @@ class DataUpdateScheduler:
         Args:
             shutdown_event: Optional Event to signal graceful shutdown
         """
-        self.scheduler = BackgroundScheduler()
+        # Missed runs are coalesced into one, and a job never overlaps itself
+        self.scheduler = BackgroundScheduler(
+            executors={'default': JobExecutor(SCHEDULER_JOB_WORKERS)},
+            job_defaults={
+                'coalesce': True,
+                'max_instances': 1,
+                'misfire_grace_time': SCHEDULER_MISFIRE_GRACE_TIME
+            }
+        )
         self.scheduler.timezone = ET
         self.is_running = False
         self.shutdown_event = shutdown_event or Event()
 
+        # Option chain and symbol ID caches and the API rate limiter carry
+        # over from tick to tick and are shared by concurrent jobs; each job
+        # stores through a fork with its own database session, closed when
+        # the job ends
+        self.fetcher = DataFetcher()
+
         # Market hours (9:30 AM - 4:00 PM ET)
         self.market_open = dt_time(9, 30)
         self.market_close = dt_time(16, 0)
@@ -54,57 +110,96 @@ class DataUpdateScheduler:
         if now.weekday() >= 5:  # Saturday = 5, Sunday = 6
             return False
 
+        # Check if market holiday
+        if now.date() in market_holidays(now.year):
+            return False
+
         # Check if within market hours
         current_time = now.time()
         return self.market_open <= current_time <= self.market_close
 
-    def update_stock_data(self):
-        """Update stock price data for all watchlist symbols"""
-        if self.shutdown_event.is_set():
-            logger.warning("Skipping stock data update - shutdown in progress")
-            return
+    def _watchlist_symbols(self):
+        """
+        (id, symbol) rows for the active watchlist entries
 
-        logger.info("Starting scheduled stock data update")
+        Only the two columns the update jobs use are loaded, as plain rows
+        rather than Symbol instances. The session closes before returning, so
+        no connection is held while the caller waits on the API.
+        """
+        with session_scope() as db:
+            return db.query(Symbol.id, Symbol.symbol).join(
+                UserWatchlist, Symbol.id == UserWatchlist.symbol_id
+            ).filter(UserWatchlist.is_active == True).all()
 
-        db = None
-        fetcher = None
+    def _fetch_and_store(self, fetcher, symbols, fetch, store, data_name: str):
+        """
+        Fetch data for symbols concurrently and store each result as it arrives
 
-        try:
-            db = SessionLocal()
-            fetcher = DataFetcher()
+        Fetches run on a thread pool (the work is network-bound and the
+        fetcher's rate limiter paces API calls across threads). Stores stay on
+        this thread, each in its own savepoint, and the run is committed once.
 
-            # Query symbols from active watchlist entries
-            symbols = db.query(Symbol).join(
-                UserWatchlist, Symbol.id == UserWatchlist.symbol_id
-            ).filter(UserWatchlist.is_active == True).all()
+        Args:
+            fetcher: DataFetcher whose session the data is stored through
+            symbols: Symbols to update
+            fetch: Callable(symbol name) returning the data, or None if unavailable
+            store: Callable(symbol, data) storing the data with commit=False;
+                returns True on success
+            data_name: Data kind for log messages, e.g. 'stock data'
+        """
+        def fetch_symbol(symbol):
+            # Runs on a fetch thread: API calls only, no database access
+            if self.shutdown_event.is_set():
+                return None
+            return fetch(symbol.symbol)
 
-            for i, symbol in enumerate(symbols):
+        processed = 0
+        with ThreadPoolExecutor(max_workers=IVOLATILITY_FETCH_WORKERS) as fetch_pool:
+            futures = {fetch_pool.submit(fetch_symbol, symbol): symbol for symbol in symbols}
+
+            for future in as_completed(futures):
                 # Check shutdown before each symbol
                 if self.shutdown_event.is_set():
-                    logger.warning(f"Stopping stock data update - shutdown in progress (processed {i}/{len(symbols)} symbols)")
+                    logger.warning(f"Stopping {data_name} update - shutdown in progress (processed {processed}/{len(symbols)} symbols)")
+                    for pending in futures:
+                        pending.cancel()
                     break
 
+                symbol = futures[future]
+                processed += 1
                 try:
-                    logger.info(f"Updating stock data for {symbol.symbol}")
-
-                    # Fetch recent stock data
-                    stock_data = fetcher.fetch_stock_data(symbol.symbol, days=1)
+                    data = future.result()
 
-                    if stock_data is not None:
-                        fetcher.store_stock_data(symbol.symbol, stock_data)
-                        logger.info(f"Updated stock data for {symbol.symbol}")
-                    else:
-                        logger.warning(f"No stock data available for {symbol.symbol}")
+                    if data is None:
+                        logger.warning(f"No {data_name} available for {symbol.symbol}")
+                    elif store(symbol, data):
+                        logger.info(f"Updated {data_name} for {symbol.symbol}")
 
                 except Exception as e:
-                    logger.error(f"Error updating {symbol.symbol}: {str(e)}")
-                    continue
+                    logger.error(f"Error updating {data_name} for {symbol.symbol}: {str(e)}")
 
-                # Add delay between symbols to avoid API rate limits
-                # Skip delay for last symbol
-                if i < len(symbols) - 1 and not self.shutdown_event.is_set():
-                    logger.debug(f"Waiting 5 seconds before next symbol to avoid rate limits...")
-                    time.sleep(5)
+        fetcher.get_session().commit()
+
+    def update_stock_data(self):
+        """Update stock price data for all watchlist symbols"""
+        if self.shutdown_event.is_set():
+            logger.warning("Skipping stock data update - shutdown in progress")
+            return
+
+        logger.info("Starting scheduled stock data update")
+
+        fetcher = self.fetcher.fork()
+
+        try:
+            symbols = self._watchlist_symbols()
+
+            logger.info(f"Updating stock data for {len(symbols)} symbols")
+            self._fetch_and_store(
+                fetcher, symbols,
+                fetch=lambda name: fetcher.fetch_stock_data(name, days=1),
+                store=lambda symbol, data: fetcher.store_stock_data(symbol.symbol, data, symbol.id, commit=False),
+                data_name='stock data'
+            )
 
             if not self.shutdown_event.is_set():
                 logger.info("Completed scheduled stock data update")
@@ -113,17 +208,11 @@ class DataUpdateScheduler:
             logger.error(f"Error in stock data update task: {str(e)}")
 
         finally:
-            # Ensure connections are always closed
-            if fetcher:
-                try:
-                    fetcher.close_session()
-                except Exception as e:
-                    logger.error(f"Error closing fetcher session: {str(e)}")
-            if db:
-                try:
-                    db.close()
-                except Exception as e:
-                    logger.error(f"Error closing database session: {str(e)}")
+            # Ensure the fetcher's database connection is always closed
+            try:
+                fetcher.close_session()
+            except Exception as e:
+                logger.error(f"Error closing fetcher session: {str(e)}")
 
     def update_options_data(self):
         """Update options chain data for all watchlist symbols"""
@@ -133,64 +222,89 @@ class DataUpdateScheduler:
 
         logger.info("Starting scheduled options data update")
 
-        db = None
-        fetcher = None
+        fetcher = self.fetcher.fork()
 
         try:
-            db = SessionLocal()
-            fetcher = DataFetcher()
+            symbols = self._watchlist_symbols()
 
-            # Query symbols from active watchlist entries
-            symbols = db.query(Symbol).join(
-                UserWatchlist, Symbol.id == UserWatchlist.symbol_id
-            ).filter(UserWatchlist.is_active == True).all()
+            logger.info(f"Updating options data for {len(symbols)} symbols")
+            self._fetch_and_store(
+                fetcher, symbols,
+                fetch=lambda name: fetcher.fetch_options_data(name) or None,
+                store=lambda symbol, data: fetcher.store_options_data(symbol.symbol, data, symbol.id, commit=False),
+                data_name='options data'
+            )
 
-            for i, symbol in enumerate(symbols):
-                # Check shutdown before each symbol
-                if self.shutdown_event.is_set():
-                    logger.warning(f"Stopping options data update - shutdown in progress (processed {i}/{len(symbols)} symbols)")
-                    break
+            if not self.shutdown_event.is_set():
+                analyze_tables(fetcher.get_session(), OptionContract, OptionPrice)
+                logger.info("Completed scheduled options data update")
 
-                try:
-                    logger.info(f"Updating options data for {symbol.symbol}")
+        except Exception as e:
+            logger.error(f"Error in options data update task: {str(e)}")
 
-                    # Fetch options data
-                    options_data = fetcher.fetch_options_data(symbol.symbol)
+        finally:
+            # Ensure the fetcher's database connection is always closed
+            try:
+                fetcher.close_session()
+            except Exception as e:
+                logger.error(f"Error closing fetcher session: {str(e)}")
 
-                    if options_data:
-                        fetcher.store_options_data(symbol.symbol, options_data)
-                        logger.info(f"Updated options data for {symbol.symbol}")
-                    else:
-                        logger.warning(f"No options data available for {symbol.symbol}")
+    def update_market_data(self):
+        """
+        Update stock and options data for all watchlist symbols in one pass
 
-                except Exception as e:
-                    logger.error(f"Error updating options for {symbol.symbol}: {str(e)}")
-                    continue
+        Each symbol's stock and options data are fetched together on the same
+        fetch thread, so the watchlist is walked once instead of once per
+        data kind.
+        """
+        if self.shutdown_event.is_set():
+            logger.warning("Skipping market data update - shutdown in progress")
+            return
 
-                # Add delay between symbols to avoid API rate limits
-                # Skip delay for last symbol
-                if i < len(symbols) - 1 and not self.shutdown_event.is_set():
-                    logger.debug(f"Waiting 5 seconds before next symbol to avoid rate limits...")
-                    time.sleep(5)
+        logger.info("Starting scheduled market data update")
+
+        fetcher = self.fetcher.fork()
+
+        def fetch(name):
+            stock_data = fetcher.fetch_stock_data(name, days=1)
+            options_data = fetcher.fetch_options_data(name) or None
+            if stock_data is None and options_data is None:
+                return None
+            return stock_data, options_data
+
+        def store(symbol, data):
+            stock_data, options_data = data
+            stored = True
+            for data_name, value, store_data in (
+                ('stock data', stock_data, fetcher.store_stock_data),
+                ('options data', options_data, fetcher.store_options_data)
+            ):
+                if value is None:
+                    logger.warning(f"No {data_name} available for {symbol.symbol}")
+                    stored = False
+                elif not store_data(symbol.symbol, value, symbol.id, commit=False):
+                    stored = False
+            return stored
+
+        try:
+            symbols = self._watchlist_symbols()
+
+            logger.info(f"Updating market data for {len(symbols)} symbols")
+            self._fetch_and_store(fetcher, symbols, fetch=fetch, store=store, data_name='market data')
 
             if not self.shutdown_event.is_set():
-                logger.info("Completed scheduled options data update")
+                analyze_tables(fetcher.get_session(), OptionContract, OptionPrice)
+                logger.info("Completed scheduled market data update")
 
         except Exception as e:
-            logger.error(f"Error in options data update task: {str(e)}")
+            logger.error(f"Error in market data update task: {str(e)}")
 
         finally:
-            # Ensure connections are always closed
-            if fetcher:
-                try:
-                    fetcher.close_session()
-                except Exception as e:
-                    logger.error(f"Error closing fetcher session: {str(e)}")
-            if db:
-                try:
-                    db.close()
-                except Exception as e:
-                    logger.error(f"Error closing database session: {str(e)}")
+            # Ensure the fetcher's database connection is always closed
+            try:
+                fetcher.close_session()
+            except Exception as e:
+                logger.error(f"Error closing fetcher session: {str(e)}")
 
     def calculate_greeks(self):
         """
@@ -242,20 +356,17 @@ class DataUpdateScheduler:
             logger.warning("Skipping opportunity scan - shutdown in progress")
             return
 
-        db = None
-
         try:
-            db = SessionLocal()
+            with session_scope() as db:
+                # Check if there's new option data to analyze
+                if not self.has_new_option_data(db):
+                    logger.info("Skipping opportunity scan - no new option data")
+                    return
 
-            # Check if there's new option data to analyze
-            if not self.has_new_option_data(db):
-                logger.info("Skipping opportunity scan - no new option data")
-                return
+                logger.info("Starting opportunity scan")
+                detector = OpportunityDetector(db)
 
-            logger.info("Starting opportunity scan")
-            detector = OpportunityDetector(db)
-
-            opportunities = detector.scan_all_opportunities(save_to_db=True)
+                opportunities = detector.scan_all_opportunities(save_to_db=True)
 
             total_count = sum(len(opps) for opps in opportunities.values())
 
@@ -270,19 +381,10 @@ class DataUpdateScheduler:
         except Exception as e:
             logger.error(f"Error in opportunity scan task: {str(e)}")
 
-        finally:
-            # Ensure database connection is always closed
-            if db:
-                try:
-                    db.close()
-                except Exception as e:
-                    logger.error(f"Error closing database session: {str(e)}")
-
     def comprehensive_update(self):
         """
         Comprehensive end-of-day update:
-        - Update all stock data
-        - Update all options data
+        - Update all stock and options data
         - Calculate Greeks
         - Scan opportunities
         """
@@ -290,14 +392,7 @@ class DataUpdateScheduler:
         logger.info("Starting comprehensive end-of-day update")
         logger.info("=" * 60)
 
-        self.update_stock_data()
-
-        # Add delay between update phases to avoid rate limits
-        if not self.shutdown_event.is_set():
-            logger.debug("Waiting 5 seconds between update phases...")
-            time.sleep(5)
-
-        self.update_options_data()
+        self.update_market_data()
         self.calculate_greeks()
         self.scan_opportunities()
 
@@ -308,8 +403,7 @@ class DataUpdateScheduler:
     def market_hours_update(self):
         """
         Market hours update (runs every 15 minutes during trading hours):
-        - Update stock prices
-        - Update options data
+        - Update stock prices and options data
         - Scan opportunities (only if new data exists)
 
         This is the primary update schedule that keeps all data fresh during active trading.
@@ -322,14 +416,7 @@ class DataUpdateScheduler:
         logger.info("Starting market hours update (15-min refresh)")
         logger.info("=" * 60)
 
-        self.update_stock_data()
-
-        # Add delay between update phases to avoid rate limits
-        if not self.shutdown_event.is_set():
-            logger.debug("Waiting 5 seconds between update phases...")
-            time.sleep(5)
-
-        self.update_options_data()
+        self.update_market_data()
         self.scan_opportunities()
 
         logger.info("=" * 60)
@@ -339,8 +426,7 @@ class DataUpdateScheduler:
     def continuous_update(self):
         """
         Continuous update (runs 24/7 every 20 minutes):
-        - Update stock prices
-        - Update options data
+        - Update stock prices and options data
         - Scan opportunities
 
         This runs regardless of market hours to keep data fresh
@@ -348,14 +434,7 @@ class DataUpdateScheduler:
         """
         logger.info("Starting continuous 20-minute update")
 
-        self.update_stock_data()
-
-        # Add delay between update phases to avoid rate limits
-        if not self.shutdown_event.is_set():
-            logger.debug("Waiting 5 seconds between update phases...")
-            time.sleep(5)
-
-        self.update_options_data()
+        self.update_market_data()
         self.scan_opportunities()
 
         logger.info("Completed continuous update")
@@ -387,7 +466,7 @@ class DataUpdateScheduler:
         logger.info("  - Updates stock prices")
         logger.info("  - Updates options contracts and prices")
         logger.info("  - Scans for opportunities (only if new data)")
-        logger.info("  - 5-second delays between API calls")
+        logger.info("  - API calls rate limited across concurrent symbol fetches")
 
         # Start the scheduler
         self.scheduler.start()
@@ -474,8 +553,6 @@ def get_scheduler() -> DataUpdateScheduler:
 
 def main():
     """Test the scheduler"""
-    import time
-
     # Initialize database
     create_tables()
 
@@ -510,8 +587,7 @@ def main():
     print("\nScheduler is running. Press Ctrl+C to stop...")
 
     try:
-        while True:
-            time.sleep(1)
+        Event().wait()
     except (KeyboardInterrupt, SystemExit):
         print("\nStopping scheduler...")
         scheduler.stop()
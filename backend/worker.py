@@ -13,6 +13,7 @@ This runs as a separate service from the API to ensure:
 - Independent scaling of worker and API services
 """
 
+import atexit
 import logging
 import signal
 import time
@@ -22,7 +23,11 @@ import sys
 import os
 
 from scheduler import DataUpdateScheduler
-from models import create_tables, SessionLocal, Symbol, UserWatchlist
+from migrations import run_migrations
+from models import create_tables, engine
+
+# How often the main loop logs connection pool usage, for sizing DB_POOL_SIZE
+POOL_STATUS_LOG_INTERVAL = 600  # seconds
 
 # Configure logging
 logging.basicConfig(
@@ -35,53 +40,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def migrate_existing_symbols_to_watchlist():
-    """
-    One-time migration: Create UserWatchlist entries for existing Symbol records.
-
-    This ensures backward compatibility when upgrading from the old architecture
-    where only Symbol.is_active was used to determine what to track.
-    """
-    logger.info("Running watchlist migration check...")
-    db = None
-    try:
-        db = SessionLocal()
-
-        # Find symbols that don't have a watchlist entry
-        symbols_without_watchlist = db.query(Symbol).outerjoin(
-            UserWatchlist, Symbol.id == UserWatchlist.symbol_id
-        ).filter(
-            Symbol.is_active == True,
-            UserWatchlist.id == None  # No watchlist entry exists
-        ).all()
-
-        if not symbols_without_watchlist:
-            logger.info("✓ All symbols have watchlist entries")
-            return
-
-        logger.info(f"Found {len(symbols_without_watchlist)} symbols without watchlist entries")
-
-        # Create watchlist entries for these symbols
-        for symbol in symbols_without_watchlist:
-            watchlist_entry = UserWatchlist(
-                symbol_id=symbol.id,
-                is_active=True,
-                added_at=symbol.created_at or datetime.utcnow()
-            )
-            db.add(watchlist_entry)
-            logger.info(f"  ✓ Created watchlist entry for {symbol.symbol}")
-
-        db.commit()
-        logger.info(f"✓ Migration complete: {len(symbols_without_watchlist)} watchlist entries created")
-
-    except Exception as e:
-        logger.error(f"✗ Migration failed: {e}")
-        if db:
-            db.rollback()
-    finally:
-        if db:
-            db.close()
-
 # Graceful shutdown event
 shutdown_event = Event()
 
@@ -112,11 +70,8 @@ def main():
         logger.error("Exiting...")
         sys.exit(1)
 
-    # Run migration to ensure existing symbols have watchlist entries
-    try:
-        migrate_existing_symbols_to_watchlist()
-    except Exception as e:
-        logger.warning(f"Migration check failed (non-fatal): {e}")
+    # Bring existing databases up to the current schema
+    run_migrations()
 
     # Initialize scheduler
     logger.info("Initializing data update scheduler...")
@@ -127,6 +82,9 @@ def main():
     signal.signal(signal.SIGINT, handle_signal)
     logger.info("✓ Signal handlers registered (SIGTERM, SIGINT)")
 
+    # Close pooled database connections on exit, including error exits
+    atexit.register(engine.dispose)
+
     # Start scheduler
     try:
         scheduler.start()
@@ -147,8 +105,10 @@ def main():
 
     # Main loop - keep worker alive until shutdown signal
     try:
-        while not shutdown_event.is_set():
-            time.sleep(1)
+        # Block on the event instead of polling it; the wait only times out
+        # to log pool usage
+        while not shutdown_event.wait(timeout=POOL_STATUS_LOG_INTERVAL):
+            logger.info(f"Connection pool: {engine.pool.status()}")
 
     except KeyboardInterrupt:
         logger.info("Keyboard interrupt received")
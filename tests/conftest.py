@@ -0,0 +1,33 @@
+"""
+Shared pytest setup for the backend tests
+
+The backend modules read their configuration at import time, so the
+environment is pointed at a throwaway SQLite database before any of them
+are imported.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix="options_tracker_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DB_DIR}/test.db"
+os.environ.setdefault("IVOLATILITY_API_KEY", "test")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from models import Base, SessionLocal, engine  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """Session on freshly created tables, dropped again after the test"""
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
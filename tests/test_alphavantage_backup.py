@@ -0,0 +1,130 @@
+"""Tests for the Alpha Vantage fetcher's requests and parsing"""
+import json
+from datetime import timezone
+
+import httpx
+import pandas as pd
+import pytest
+
+pytest.importorskip("ijson")
+
+import data_fetcher_alphavantage_backup as alphavantage  # noqa: E402
+from models import StockPrice, Symbol  # noqa: E402
+from rate_limiter import TokenBucket  # noqa: E402
+
+ROWS = [
+    {'contractID': 'AAA240119C00100000', 'expiration': '2024-01-19', 'type': 'call', 'strike': '100.00'},
+    {'contractID': 'AAA240119P00100000', 'expiration': '2024-01-19', 'type': 'put', 'strike': '100.00'}
+]
+
+
+def _fetcher(monkeypatch, responses):
+    """Fetcher whose HTTP client replays responses in order; no real waits"""
+    replies = iter(responses)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return next(replies)
+
+    fetcher = alphavantage.DataFetcher.__new__(alphavantage.DataFetcher)
+    fetcher.http = httpx.Client(transport=httpx.MockTransport(handler))
+    fetcher.token_bucket = TokenBucket(100, period=0.01)
+    monkeypatch.setattr(alphavantage.time, 'sleep', lambda seconds: None)
+    return fetcher, requests
+
+
+def _json(status, payload):
+    return httpx.Response(status, content=json.dumps(payload).encode())
+
+
+def test_rows_are_streamed(monkeypatch):
+    fetcher, requests = _fetcher(monkeypatch, [_json(200, {'endpoint': 'x', 'data': ROWS})])
+    assert [row['contractID'] for row in fetcher._iter_options_rows('https://av.test/q')] == \
+        [row['contractID'] for row in ROWS]
+    assert len(requests) == 1
+
+
+def test_throttle_note_is_retried(monkeypatch):
+    fetcher, requests = _fetcher(monkeypatch, [
+        _json(200, {'Note': 'Thank you for using Alpha Vantage!'}),
+        _json(200, {'data': ROWS})
+    ])
+    saturated = []
+    monkeypatch.setattr(fetcher.token_bucket, 'saturate', lambda: saturated.append(True))
+    assert len(list(fetcher._iter_options_rows('https://av.test/q'))) == 2
+    assert len(requests) == 2
+    assert saturated == [True]
+
+
+def test_retryable_status_is_retried(monkeypatch):
+    fetcher, requests = _fetcher(monkeypatch, [
+        httpx.Response(503),
+        httpx.Response(429, headers={'Retry-After': '1'}),
+        _json(200, {'data': ROWS})
+    ])
+    assert len(list(fetcher._iter_options_rows('https://av.test/q'))) == 2
+    assert len(requests) == 3
+
+
+def test_error_message_and_client_errors_end_the_stream(monkeypatch):
+    fetcher, requests = _fetcher(monkeypatch, [_json(200, {'Error Message': 'Invalid API call'})])
+    assert list(fetcher._iter_options_rows('https://av.test/q')) == []
+    assert len(requests) == 1
+
+    fetcher, requests = _fetcher(monkeypatch, [httpx.Response(401)])
+    assert list(fetcher._iter_options_rows('https://av.test/q')) == []
+    assert len(requests) == 1
+
+
+def test_daily_bars_keep_full_precision(monkeypatch):
+    fetcher, _ = _fetcher(monkeypatch, [])
+    fetcher._url_daily = 'https://av.test/daily?size={size}&symbol={sym}'
+    bar = {'1. open': '1234.5678', '2. high': '4321.1234', '3. low': '1200.0001',
+           '4. close': '4300.9999', '5. volume': '3000000000'}
+    monkeypatch.setattr(fetcher, '_get', lambda url, cache_key=None: {'Time Series (Daily)': {'2024-01-02': bar}})
+
+    df = fetcher.fetch_stock_data('AAA', period='max')
+
+    assert df[['Open', 'High', 'Low', 'Close']].iloc[0].tolist() == [1234.5678, 4321.1234, 1200.0001, 4300.9999]
+    # Above the int32 range, as index aggregates can be
+    assert df['Volume'].iloc[0] == 3_000_000_000
+
+
+@pytest.mark.parametrize('native_upsert', [True, False])
+def test_stock_store_updates_existing_bars(db, monkeypatch, native_upsert):
+    if not native_upsert:
+        # Dialects without ON CONFLICT take the select-then-update path
+        monkeypatch.setattr(alphavantage, 'UPSERT_INSERTS', {})
+    symbol = Symbol(symbol='AAA', is_active=True)
+    db.add(symbol)
+    db.commit()
+    fetcher, _ = _fetcher(monkeypatch, [])
+    fetcher.session = None
+
+    def bars(closes, volumes):
+        return pd.DataFrame({
+            'Date': pd.to_datetime(['2024-01-02', '2024-01-03']),
+            'Open': 100.0, 'High': 110.0, 'Low': 90.0, 'Close': closes, 'Volume': volumes
+        })
+
+    try:
+        assert fetcher.store_stock_data('AAA', bars([101.0, 102.0], [1000, 2000]), symbol.id)
+        assert fetcher.store_stock_data('AAA', bars([111.0, 112.0], [1500, 2500]), symbol.id)
+    finally:
+        fetcher.close_session()
+
+    stored = db.query(StockPrice).order_by(StockPrice.timestamp).all()
+    assert [(bar.close_price, bar.volume) for bar in stored] == [(111.0, 1500), (112.0, 2500)]
+
+
+def test_daily_cache_keys_use_the_market_date(monkeypatch):
+    class FrozenDatetime(alphavantage.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            # 9pm ET on Jan 2 is already Jan 3 in UTC
+            return alphavantage.datetime(2024, 1, 3, 2, 0, tzinfo=timezone.utc).astimezone(tz)
+
+    monkeypatch.setattr(alphavantage, 'datetime', FrozenDatetime)
+
+    assert alphavantage.market_date() == '2024-01-02'
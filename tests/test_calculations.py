@@ -0,0 +1,49 @@
+"""Tests for the Black-Scholes pricing helpers"""
+import numpy as np
+import pytest
+from scipy.stats import norm
+
+from calculations import OptionsCalculator
+
+
+def _reference_price(S, K, t, sigma, r, is_call):
+    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * t) / (sigma * np.sqrt(t))
+    d2 = d1 - sigma * np.sqrt(t)
+    if is_call:
+        return S * norm.cdf(d1) - K * np.exp(-r * t) * norm.cdf(d2)
+    return K * np.exp(-r * t) * norm.cdf(-d2) - S * norm.cdf(-d1)
+
+
+@pytest.mark.parametrize('strike', [20.0, 60.0, 100.0, 150.0, 300.0])
+@pytest.mark.parametrize('is_call', [True, False])
+def test_batch_prices_keep_relative_accuracy_in_the_tails(strike, is_call):
+    calculator = OptionsCalculator()
+    price = calculator.calculate_theoretical_prices(101.0, strike, 0.1, 0.3, is_call)
+    expected = _reference_price(101.0, strike, 0.1, 0.3, calculator.risk_free_rate, is_call)
+
+    # Deep out-of-the-money prices are tiny but must not collapse to 0
+    assert price > 0
+    assert price == pytest.approx(expected, rel=1e-6)
+
+
+@pytest.mark.parametrize('strike', [20.0, 60.0, 100.0, 150.0, 300.0])
+@pytest.mark.parametrize('option_type', ['call', 'put'])
+def test_scalar_price_keeps_relative_accuracy_in_the_tails(strike, option_type):
+    calculator = OptionsCalculator()
+    price = calculator.calculate_theoretical_price(101.0, strike, 0.1, 0.3, option_type)
+    expected = _reference_price(101.0, strike, 0.1, 0.3, calculator.risk_free_rate, option_type == 'call')
+
+    assert price > 0
+    assert price == pytest.approx(expected, rel=1e-6)
+
+
+# Puts in the money by more than 6 sigma*sqrt(t) of log-moneyness; the r*t
+# drift pulls d1 back toward the money for all but the last
+@pytest.mark.parametrize('strike', [110.0, 115.0, 120.0, 125.0])
+def test_batch_prices_account_for_drift_in_deep_lanes(strike):
+    # Low vol, long dated, high rate: r*t dwarfs sigma*sqrt(t)
+    calculator = OptionsCalculator(risk_free_rate=0.05)
+    price = calculator.calculate_theoretical_prices(100.0, strike, 2.0, 0.01, False)
+    expected = _reference_price(100.0, strike, 2.0, 0.01, 0.05, False)
+
+    assert price == pytest.approx(expected, rel=1e-9)
@@ -0,0 +1,157 @@
+"""Tests for the data fetcher's database stores"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import text
+
+import data_fetcher
+from data_fetcher import DataFetcher
+from models import OptionContract, OptionPrice, StockPrice, Symbol
+
+
+def _stock_frame(volume):
+    return pd.DataFrame({
+        'Date': [datetime(2024, 1, 2), datetime(2024, 1, 3)],
+        'Open': [100.0, 101.0],
+        'High': [102.0, 103.0],
+        'Low': [99.0, 100.0],
+        'Close': [101.0, 102.0],
+        'Volume': volume
+    })
+
+
+def _add_symbols(db, *names):
+    symbols = [Symbol(symbol=name, is_active=True) for name in names]
+    db.add_all(symbols)
+    db.commit()
+    return [symbol.id for symbol in symbols]
+
+
+def test_failing_stock_store_keeps_earlier_symbols(db):
+    good_id, bad_id = _add_symbols(db, 'AAA', 'BBB')
+    fetcher = DataFetcher()
+    try:
+        assert fetcher.store_stock_data('AAA', _stock_frame([1000, 2000]), good_id, commit=False)
+        # NaN volume fails the integer conversion
+        assert not fetcher.store_stock_data('BBB', _stock_frame([np.nan, 2000]), bad_id, commit=False)
+        fetcher.get_session().commit()
+    finally:
+        fetcher.close_session()
+
+    assert db.query(StockPrice).filter(StockPrice.symbol_id == good_id).count() == 2
+    assert db.query(StockPrice).filter(StockPrice.symbol_id == bad_id).count() == 0
+
+
+def test_failing_options_store_keeps_earlier_symbols(db):
+    good_id, bad_id = _add_symbols(db, 'AAA', 'BBB')
+    chain = pd.DataFrame({
+        'contractSymbol': ['AAA240119C00100000'],
+        'strike': [100.0],
+        'option_type': ['call'],
+        'expiry_date': [datetime(2024, 1, 19)],
+        'bid': [1.0],
+        'ask': [1.2],
+        'volume': [10]
+    })
+    fetcher = DataFetcher()
+    try:
+        assert fetcher.store_stock_data('AAA', _stock_frame([1000, 2000]), good_id, commit=False)
+        assert fetcher.store_options_data('AAA', {'calls': {'2024-01-19': chain}}, good_id, commit=False)
+        # A chain without expirations fails part-way through the store
+        broken = chain.drop(columns='expiry_date').assign(contractSymbol='BBB240119C00100000')
+        assert not fetcher.store_options_data('BBB', {'calls': {'2024-01-19': broken}}, bad_id, commit=False)
+        fetcher.get_session().commit()
+    finally:
+        fetcher.close_session()
+
+    assert db.query(StockPrice).filter(StockPrice.symbol_id == good_id).count() == 2
+    assert [c.symbol_id for c in db.query(OptionContract)] == [good_id]
+
+
+def test_database_failure_mid_batch_rolls_back_only_its_store(db):
+    good_id, bad_id = _add_symbols(db, 'AAA', 'BBB')
+    # Fails the third price row, after BBB's contracts and first price are written
+    db.execute(text(
+        "CREATE TRIGGER fail_third_price BEFORE INSERT ON option_prices "
+        "WHEN (SELECT COUNT(*) FROM option_prices) >= 2 "
+        "BEGIN SELECT RAISE(ABORT, 'simulated write failure'); END"
+    ))
+    db.commit()
+
+    def chain(symbol, strikes):
+        return pd.DataFrame({
+            'contractSymbol': [f'{symbol}240119C00{int(strike)}000' for strike in strikes],
+            'strike': strikes,
+            'option_type': ['call'] * len(strikes),
+            'expiry_date': [datetime(2024, 1, 19)] * len(strikes),
+            'bid': [1.0] * len(strikes),
+            'ask': [1.2] * len(strikes),
+            'volume': [10] * len(strikes)
+        })
+
+    fetcher = DataFetcher()
+    try:
+        assert fetcher.store_options_data('AAA', {'calls': {'2024-01-19': chain('AAA', [100.0])}}, good_id, commit=False)
+        assert not fetcher.store_options_data(
+            'BBB', {'calls': {'2024-01-19': chain('BBB', [100.0, 105.0])}}, bad_id, commit=False
+        )
+        fetcher.get_session().commit()
+    finally:
+        fetcher.close_session()
+
+    assert [c.symbol_id for c in db.query(OptionContract)] == [good_id]
+    assert db.query(OptionPrice).count() == 1
+
+
+def test_iv_analysis_failure_keeps_earlier_symbols(db, monkeypatch):
+    good_id, bad_id = _add_symbols(db, 'AAA', 'BBB')
+    fetcher = DataFetcher()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("query failed")
+
+    try:
+        assert fetcher.store_stock_data('AAA', _stock_frame([1000, 2000]), good_id, commit=False)
+        session = fetcher.get_session()
+        monkeypatch.setattr(session, 'query', fail)
+        assert not fetcher.calculate_and_store_iv_analysis('BBB', bad_id, commit=False)
+        monkeypatch.undo()
+        session.commit()
+    finally:
+        fetcher.close_session()
+
+    assert db.query(StockPrice).filter(StockPrice.symbol_id == good_id).count() == 2
+
+
+@pytest.mark.parametrize('native_upsert', [True, False])
+def test_stock_store_updates_existing_bars(db, monkeypatch, native_upsert):
+    if not native_upsert:
+        # Dialects without ON CONFLICT take the select-then-update path
+        monkeypatch.setattr(data_fetcher, 'UPSERT_INSERTS', {})
+    symbol_id, = _add_symbols(db, 'AAA')
+    fetcher = DataFetcher()
+    try:
+        assert fetcher.store_stock_data('AAA', _stock_frame([1000, 2000]), symbol_id)
+        revised = _stock_frame([1500, 2500]).assign(Close=[111.0, 112.0])
+        assert fetcher.store_stock_data('AAA', pd.concat([revised, _stock_frame([1, 2]).assign(
+            Date=[datetime(2024, 1, 4), datetime(2024, 1, 5)])]), symbol_id)
+    finally:
+        fetcher.close_session()
+
+    bars = db.query(StockPrice).order_by(StockPrice.timestamp).all()
+    assert [(bar.close_price, bar.volume) for bar in bars] == [(111.0, 1500), (112.0, 2500), (101.0, 1), (102.0, 2)]
+
+
+def test_forked_fetchers_share_caches_but_not_sessions(db):
+    fetcher = DataFetcher()
+    fork = fetcher.fork()
+    try:
+        assert fork.get_session() is not fetcher.get_session()
+        assert fork._chain_cache is fetcher._chain_cache
+        assert fork._symbol_ids is fetcher._symbol_ids
+        assert fork.rate_limiter is fetcher.rate_limiter
+    finally:
+        fork.close_session()
+        fetcher.close_session()
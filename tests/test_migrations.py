@@ -0,0 +1,138 @@
+"""Tests for the startup schema migrations"""
+import logging
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import StatementError
+
+import migrations
+from models import OptionContract, StockPrice, Symbol, TradingOpportunity
+
+
+def test_stock_price_index_migration_dedups_once(db, monkeypatch):
+    symbol = Symbol(symbol='AAA', is_active=True)
+    db.add(symbol)
+    db.commit()
+    db.execute(text("DROP INDEX uq_stock_prices_symbol_timestamp"))
+    db.add_all([
+        StockPrice(symbol_id=symbol.id, timestamp=datetime(2024, 1, 2), close_price=close)
+        for close in (100.0, 101.0, 102.0)
+    ])
+    db.add(StockPrice(symbol_id=symbol.id, timestamp=datetime(2024, 1, 3), close_price=103.0))
+    db.commit()
+
+    migrations.migrate_stock_prices_unique_index()
+
+    closes = sorted(price.close_price for price in db.query(StockPrice).all())
+    assert closes == [102.0, 103.0]
+    assert migrations.index_exists('stock_prices', 'uq_stock_prices_symbol_timestamp')
+
+    # With the index in place later boots must not touch the table again
+    sessions = []
+    monkeypatch.setattr(migrations, 'SessionLocal', lambda: sessions.append(1))
+    migrations.migrate_stock_prices_unique_index()
+    assert not sessions
+
+
+def test_active_opportunity_index_migration_deactivates_duplicates_once(db, monkeypatch):
+    db.execute(text("DROP INDEX uq_trading_opportunities_active"))
+    db.add_all([
+        TradingOpportunity(contract_id=1, opportunity_type='overpriced', score=score, is_active=True)
+        for score in (60.0, 70.0)
+    ])
+    db.add(TradingOpportunity(contract_id=1, opportunity_type='gamma_scalp', score=80.0, is_active=True))
+    db.commit()
+
+    migrations.migrate_active_opportunity_index()
+
+    active = db.query(TradingOpportunity).filter(TradingOpportunity.is_active == True).all()
+    assert sorted((opp.opportunity_type, opp.score) for opp in active) == [('gamma_scalp', 80.0), ('overpriced', 70.0)]
+    assert migrations.index_exists('trading_opportunities', 'uq_trading_opportunities_active')
+
+    sessions = []
+    monkeypatch.setattr(migrations, 'SessionLocal', lambda: sessions.append(1))
+    migrations.migrate_active_opportunity_index()
+    assert not sessions
+
+
+def _store_names_as_text(db, table, column):
+    # Recreate the table the way releases before the codes created it
+    ddl = db.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :table"), {'table': table}
+    ).scalar()
+    db.execute(text(f"DROP TABLE {table}"))
+    db.execute(text(ddl.replace(f"{column} SMALLINT", f"{column} VARCHAR(20)")))
+    db.commit()
+
+
+def test_migrations_convert_legacy_option_type_names(db):
+    _store_names_as_text(db, 'option_contracts', 'option_type')
+    symbol = Symbol(symbol='AAA', is_active=True)
+    db.add(symbol)
+    db.commit()
+    # Rows written by a release that stored the name itself
+    db.execute(text(
+        "INSERT INTO option_contracts (symbol_id, contract_symbol, option_type, strike_price, is_active) "
+        "VALUES (:symbol_id, 'AAA240119C00100000', 'CALL', 100.0, 1), "
+        "(:symbol_id, 'AAA240119P00100000', 'put', 100.0, 1)"
+    ), {'symbol_id': symbol.id})
+    db.commit()
+
+    migrations.run_migrations()
+
+    calls = db.query(OptionContract).filter(OptionContract.option_type == 'call').all()
+    assert [contract.contract_symbol for contract in calls] == ['AAA240119C00100000']
+
+
+def test_coded_names_round_trip_as_codes(db):
+    db.add_all([
+        OptionContract(contract_symbol='AAA240119C00100000', option_type='Call'),
+        OptionContract(contract_symbol='AAA240119P00100000', option_type='put'),
+        OptionContract(contract_symbol='AAA240119X00100000', option_type=None)
+    ])
+    db.commit()
+
+    stored = db.execute(text(
+        "SELECT option_type FROM option_contracts ORDER BY contract_symbol"
+    )).scalars().all()
+    assert stored == [0, 1, None]
+
+    db.expire_all()
+    loaded = db.query(OptionContract).order_by(OptionContract.contract_symbol).all()
+    assert [contract.option_type for contract in loaded] == ['call', 'put', None]
+
+
+def test_unknown_coded_name_is_rejected(db):
+    db.add(OptionContract(contract_symbol='AAA240119X00100000', option_type='straddle'))
+    with pytest.raises(StatementError, match="Unknown OptionType name"):
+        db.commit()
+
+
+def test_opportunity_type_migration_reports_unmapped_names(db, caplog):
+    _store_names_as_text(db, 'trading_opportunities', 'opportunity_type')
+    db.execute(text(
+        "INSERT INTO trading_opportunities (opportunity_type, score, is_active) "
+        "VALUES ('overpriced', 50.0, 0), ('butterfly', 40.0, 0), ('butterfly', 30.0, 0)"
+    ))
+    db.commit()
+
+    with caplog.at_level(logging.WARNING, logger='migrations'):
+        migrations.migrate_opportunity_type_codes()
+    assert "2 trading_opportunities rows have opportunity_type 'butterfly' with no code" in caplog.text
+
+    # Once no names are left to convert the table is not scanned again
+    caplog.clear()
+    with caplog.at_level(logging.WARNING, logger='migrations'):
+        migrations.migrate_opportunity_type_codes()
+    assert "with no code" not in caplog.text
+
+
+def test_code_migrations_skip_smallint_columns(db, monkeypatch):
+    scans = []
+    monkeypatch.setattr(migrations, 'log_unmapped_names', lambda *args: scans.append(args))
+
+    migrations.migrate_option_type_codes()
+    migrations.migrate_opportunity_type_codes()
+
+    assert scans == []
@@ -0,0 +1,77 @@
+"""Tests for the engine and session helpers"""
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from models import OptionPrice, SessionLocal, Symbol, begin_write_transaction, bulk_insert
+
+
+def _write_after_stale_read(db, write_scope):
+    # db reads first, then another session commits a write, then db writes
+    db.query(Symbol).all()
+    other = SessionLocal()
+    try:
+        other.add(Symbol(symbol='AAA', is_active=True))
+        other.commit()
+    finally:
+        other.close()
+
+    write_scope(db)
+    db.add(Symbol(symbol='BBB', is_active=True))
+    db.commit()
+
+
+def test_deferred_transaction_cannot_write_after_stale_read(db):
+    # The failure begin_write_transaction avoids: the busy timeout doesn't
+    # help a read snapshot that another writer has overtaken
+    with pytest.raises(OperationalError, match='locked'):
+        _write_after_stale_read(db, lambda session: None)
+    db.rollback()
+
+
+def test_write_transaction_writes_after_stale_read(db):
+    _write_after_stale_read(db, begin_write_transaction)
+
+    assert sorted(symbol.symbol for symbol in db.query(Symbol).all()) == ['AAA', 'BBB']
+
+
+def test_sqlite_connections_wait_for_the_write_lock(db):
+    timeout = db.connection().exec_driver_sql('PRAGMA busy_timeout').scalar()
+
+    assert timeout > 0
+
+
+class _CopyCursor:
+    """DBAPI cursor stand-in that records COPY loads"""
+
+    def __init__(self):
+        self.copies = []
+
+    def copy_expert(self, sql, file):
+        self.copies.append((sql, file.read()))
+
+    def close(self):
+        pass
+
+
+def _postgresql_session(cursor):
+    return SimpleNamespace(
+        get_bind=lambda: SimpleNamespace(dialect=SimpleNamespace(name='postgresql')),
+        connection=lambda: SimpleNamespace(connection=SimpleNamespace(cursor=lambda: cursor))
+    )
+
+
+def test_bulk_insert_loads_with_copy_on_postgresql():
+    cursor = _CopyCursor()
+    rows = [
+        {'contract_id': 1, 'bid': 1.25, 'ask': None},
+        {'contract_id': 2, 'bid': 0.5, 'ask': 0.75}
+    ]
+
+    bulk_insert(_postgresql_session(cursor), OptionPrice, rows)
+
+    assert cursor.copies == [(
+        'COPY "option_prices" ("contract_id", "bid", "ask") FROM STDIN WITH (FORMAT csv)',
+        '1,1.25,\n2,0.5,0.75\n'
+    )]
@@ -0,0 +1,222 @@
+"""Tests for the vectorized opportunity detectors"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import calculations
+import opportunities
+from models import IVAnalysis, OptionContract, OptionPrice, StockPrice, Symbol, TradingOpportunity
+from opportunities import EnhancedOpportunityDetector
+
+NOW = datetime(2024, 1, 2, 12, 0)
+STOCK_PRICE = 101.0
+
+# (contract symbol, type, strike, days to expiry, latest quote)
+CHAIN = [
+    # Near the money, liquid, full Greeks
+    ('ATMC', 'call', 100.0, 30, dict(
+        bid=3.9, ask=4.1, last_price=4.0, volume=500, open_interest=2000, implied_volatility=0.30,
+        delta=0.55, gamma=0.05, theta=-0.04, vega=0.15, spread_percentage=2.0)),
+    ('ATMP', 'put', 102.0, 30, dict(
+        bid=3.4, ask=3.6, last_price=3.5, volume=300, open_interest=800, implied_volatility=0.28,
+        delta=-0.48, gamma=0.045, theta=-0.035, vega=0.14, spread_percentage=4.0)),
+    # Longer dated, for premium buying
+    ('LONGC', 'call', 105.0, 90, dict(
+        bid=4.4, ask=4.6, last_price=4.5, volume=150, open_interest=1200, implied_volatility=0.25,
+        delta=0.45, gamma=0.02, theta=-0.015, vega=0.22, spread_percentage=3.0)),
+    # Deep in the money, for high delta
+    ('ITMC', 'call', 80.0, 60, dict(
+        bid=21.8, ask=22.2, last_price=22.0, volume=60, open_interest=600, implied_volatility=0.30,
+        delta=0.92, gamma=0.008, theta=-0.02, vega=0.06, spread_percentage=1.5)),
+    ('ITMP', 'put', 125.0, 60, dict(
+        bid=24.6, ask=25.4, last_price=25.0, volume=20, open_interest=150, implied_volatility=0.30,
+        delta=-0.88, gamma=0.01, theta=-0.01, vega=0.07, spread_percentage=3.2)),
+    # Far out of the money: fair value ~1e-30 against a 5 cent bid
+    ('FARC', 'call', 300.0, 30, dict(
+        bid=0.05, ask=0.06, last_price=0.05, volume=500, open_interest=2000, implied_volatility=0.30,
+        delta=0.001, gamma=0.0001, theta=-0.001, vega=0.001, spread_percentage=2.0)),
+    # All Greeks zero, quoted well under fair value
+    ('ZEROG', 'call', 95.0, 30, dict(
+        bid=2.0, ask=2.1, last_price=2.05, volume=200, open_interest=1000, implied_volatility=0.30,
+        delta=0.0, gamma=0.0, theta=0.0, vega=0.0, spread_percentage=4.5)),
+    # Missing quote fields: no bid, positive bid without an ask, no volume
+    ('NOBID', 'call', 101.0, 30, dict(
+        bid=None, ask=4.0, last_price=3.9, volume=500, open_interest=2000, implied_volatility=0.30,
+        delta=0.5, gamma=0.05, theta=-0.04, vega=0.15, spread_percentage=2.0)),
+    ('NOASK', 'put', 100.0, 30, dict(
+        bid=3.0, ask=None, last_price=3.1, volume=500, open_interest=2000, implied_volatility=0.30,
+        delta=-0.45, gamma=0.05, theta=-0.04, vega=0.15, spread_percentage=2.0)),
+    ('NOVOL', 'call', 99.0, 30, dict(
+        bid=4.6, ask=4.8, last_price=4.7, volume=None, open_interest=2000, implied_volatility=0.30,
+        delta=0.6, gamma=0.05, theta=-0.04, vega=0.15, spread_percentage=2.0)),
+    # Zero bid and no ask: the last trade stands in for the mid
+    ('LASTONLY', 'put', 98.0, 30, dict(
+        bid=0.0, ask=None, last_price=2.5, volume=100, open_interest=500, implied_volatility=0.30,
+        delta=-0.4, gamma=0.04, theta=-0.03, vega=0.12, spread_percentage=None)),
+]
+
+QUOTE_FIELDS = (
+    'bid', 'ask', 'last_price', 'volume', 'open_interest', 'implied_volatility',
+    'delta', 'gamma', 'theta', 'vega', 'spread_percentage'
+)
+
+
+def _contract(contract_id, option_type, strike, days=30):
+    return SimpleNamespace(
+        id=contract_id, option_type=option_type, strike_price=strike,
+        expiry_date=NOW + timedelta(days=days)
+    )
+
+
+def _quote(**fields):
+    return SimpleNamespace(**{field: fields.get(field) for field in QUOTE_FIELDS})
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    monkeypatch.setattr(opportunities, 'datetime', FrozenDatetime)
+    monkeypatch.setattr(calculations, 'datetime', FrozenDatetime)
+
+
+def _scan_chain(db, iv_rank):
+    """Store CHAIN for one symbol and scan it; returns (contract, type, score, description)"""
+    symbol = Symbol(symbol='TEST', is_active=True)
+    db.add(symbol)
+    db.flush()
+    db.add(StockPrice(symbol_id=symbol.id, timestamp=NOW - timedelta(hours=1), close_price=STOCK_PRICE))
+    db.add(IVAnalysis(symbol_id=symbol.id, timestamp=NOW - timedelta(hours=1), current_iv=0.3, iv_rank=iv_rank))
+    contract_symbols = {}
+    for contract_symbol, option_type, strike, days, quote in CHAIN:
+        contract = OptionContract(
+            symbol_id=symbol.id, contract_symbol=contract_symbol, option_type=option_type,
+            strike_price=strike, expiry_date=NOW + timedelta(days=days), is_active=True
+        )
+        db.add(contract)
+        db.flush()
+        contract_symbols[contract.id] = contract_symbol
+        db.add(OptionPrice(contract_id=contract.id, timestamp=NOW - timedelta(minutes=5), **quote))
+    db.commit()
+
+    found = EnhancedOpportunityDetector(db).scan_symbol_opportunities(symbol, save_to_db=False)
+    return [
+        (contract_symbols[opp['contract_id']], opp['opportunity_type'], opp['score'], opp['description'])
+        for opp in found
+    ]
+
+
+def _assert_opportunities(found, expected):
+    assert [(contract, kind) for contract, kind, _, _ in found] == [(contract, kind) for contract, kind, _, _ in expected]
+    for (_, _, score, description), (_, _, expected_score, expected_description) in zip(found, expected):
+        assert score == pytest.approx(expected_score, abs=1e-4)
+        # The far call's percentage has ~37 digits; only its prefix is stable
+        assert description.startswith(expected_description)
+
+
+def _frame(detector, chain, stock_price):
+    contracts = [contract for contract, _ in chain]
+    latest_prices = {contract.id: quote for contract, quote in chain}
+    return detector.build_contract_frame(contracts, latest_prices, stock_price, NOW)
+
+
+def test_deep_out_of_the_money_call_is_flagged_overpriced():
+    # Fair value of a $300 call on a $101 stock is ~1e-30, so any bid is rich
+    detector = EnhancedOpportunityDetector(db_session=None)
+    chain = [(_contract(1, 'call', 300.0), _quote(
+        bid=0.05, ask=0.06, volume=500, open_interest=2000,
+        implied_volatility=0.3, spread_percentage=2.0
+    ))]
+
+    found = detector.detect_mispricing_opportunities(_frame(detector, chain, 101.0), 101.0)
+
+    assert [(row, opp['opportunity_type']) for row, opp in found] == [(0, 'overpriced')]
+    assert found[0][1]['score'] == pytest.approx(100.0)
+    assert 0 < found[0][1]['metadata']['theoretical_price'] < 1e-20
+
+
+# Expected scan results, in contract order, as produced by the original
+# per-contract detectors. NOBID, NOASK and NOVOL never qualify; ZEROG only
+# for mispricing, which does not read the Greeks.
+FAR_CALL = 'MISPRICING (SELL): CALL $300 exp 02/01 is '
+SHARED = {
+    'ATMC': ('ATMC', 'gamma_scalp', 94.75, 'GAMMA SCALP: CALL $100 exp 02/01 (Gamma: 0.050, G/T Ratio: 1.2, Stock: $101.00, Moneyness: 101.00%)'),
+    'ATMP': ('ATMP', 'gamma_scalp', 91.9434, 'GAMMA SCALP: PUT $102 exp 02/01 (Gamma: 0.045, G/T Ratio: 1.3, Stock: $101.00, Moneyness: 100.99%)'),
+    'LONGC': ('LONGC', 'overpriced', 87.6722, 'MISPRICING (SELL): CALL $105 exp 04/01 is 17.7% overpriced. Market: $4.50, Fair: $3.82'),
+    'ITMC': ('ITMC', 'high_delta', 93.4286, 'HIGH DELTA: TEST CALL $80 exp 03/02 (Delta: 0.92, D/T: 46.0, Stock: $101.00)'),
+    'ITMP': ('ITMP', 'high_delta', 89.1429, 'HIGH DELTA: TEST PUT $125 exp 03/02 (Delta: 0.88, D/T: 88.0, Stock: $101.00)'),
+    'FARC': ('FARC', 'overpriced', 100.0, FAR_CALL),
+    'ZEROG': ('ZEROG', 'underpriced', 100.0, 'MISPRICING (BUY): CALL $95 exp 02/01 is 72.6% underpriced. Market: $2.05, Fair: $7.47'),
+    'LASTONLY_GAMMA': ('LASTONLY', 'gamma_scalp', 83.2112, 'GAMMA SCALP: PUT $98 exp 02/01 (Gamma: 0.040, G/T Ratio: 1.3, Stock: $101.00, Moneyness: 97.03%)'),
+    'LASTONLY_MISPRICED': ('LASTONLY', 'overpriced', 86.7946, 'MISPRICING (SELL): PUT $98 exp 02/01 is 26.8% overpriced. Market: $2.50, Fair: $1.97'),
+}
+
+
+def test_high_iv_rank_chain(db, frozen_now):
+    _assert_opportunities(_scan_chain(db, iv_rank=85), [
+        ('ATMC', 'premium_sell', 86.0, 'PREMIUM SELL: TEST CALL $100 exp 02/01 (IV Rank: 85%, Theta: $0.040/day, Premium: $4.00, Delta: 0.55)'),
+        SHARED['ATMC'],
+        ('ATMP', 'premium_sell', 84.25, 'PREMIUM SELL: TEST PUT $102 exp 02/01 (IV Rank: 85%, Theta: $0.035/day, Premium: $3.50, Delta: 0.48)'),
+        SHARED['ATMP'],
+        SHARED['LONGC'],
+        ('ITMC', 'premium_sell', 76.0, 'PREMIUM SELL: TEST CALL $80 exp 03/02 (IV Rank: 85%, Theta: $0.020/day, Premium: $22.00, Delta: 0.92)'),
+        SHARED['ITMC'],
+        SHARED['ITMP'],
+        SHARED['FARC'],
+        SHARED['ZEROG'],
+        ('LASTONLY', 'premium_sell', 79.5, 'PREMIUM SELL: TEST PUT $98 exp 02/01 (IV Rank: 85%, Theta: $0.030/day, Premium: $2.50, Delta: 0.40)'),
+        SHARED['LASTONLY_GAMMA'],
+        SHARED['LASTONLY_MISPRICED'],
+    ])
+
+
+def test_low_iv_rank_chain(db, frozen_now):
+    _assert_opportunities(_scan_chain(db, iv_rank=15), [
+        ('ATMC', 'premium_buy', 87.5, 'PREMIUM BUY: TEST CALL $100 exp 02/01 (IV Rank: 15%, Vega: 0.15, Cost: $4.00, Delta: 0.55)'),
+        SHARED['ATMC'],
+        ('ATMP', 'premium_buy', 86.0, 'PREMIUM BUY: TEST PUT $102 exp 02/01 (IV Rank: 15%, Vega: 0.14, Cost: $3.50, Delta: 0.48)'),
+        SHARED['ATMP'],
+        ('LONGC', 'premium_buy', 96.0, 'PREMIUM BUY: TEST CALL $105 exp 04/01 (IV Rank: 15%, Vega: 0.22, Cost: $4.50, Delta: 0.45)'),
+        SHARED['LONGC'],
+        ('ITMC', 'premium_buy', 81.0, 'PREMIUM BUY: TEST CALL $80 exp 03/02 (IV Rank: 15%, Vega: 0.06, Cost: $22.00, Delta: 0.92)'),
+        SHARED['ITMC'],
+        ('ITMP', 'premium_buy', 84.5, 'PREMIUM BUY: TEST PUT $125 exp 03/02 (IV Rank: 15%, Vega: 0.07, Cost: $25.00, Delta: 0.88)'),
+        SHARED['ITMP'],
+        SHARED['FARC'],
+        SHARED['ZEROG'],
+        ('LASTONLY', 'premium_buy', 81.0, 'PREMIUM BUY: TEST PUT $98 exp 02/01 (IV Rank: 15%, Vega: 0.12, Cost: $2.50, Delta: 0.40)'),
+        SHARED['LASTONLY_GAMMA'],
+        SHARED['LASTONLY_MISPRICED'],
+    ])
+
+
+@pytest.mark.parametrize('native_upsert', [True, False])
+def test_saving_updates_active_opportunities(db, monkeypatch, native_upsert):
+    if not native_upsert:
+        # Dialects without ON CONFLICT take the per-row path
+        monkeypatch.setattr(opportunities, 'UPSERT_INSERTS', {})
+    detector = EnhancedOpportunityDetector(db)
+    db.add(TradingOpportunity(contract_id=1, opportunity_type='overpriced', score=10.0, is_active=False))
+    db.commit()
+
+    detector._save_opportunities([
+        {'contract_id': 1, 'opportunity_type': 'overpriced', 'score': 60.0, 'description': 'first'},
+        {'contract_id': 2, 'opportunity_type': 'gamma_scalp', 'score': 70.0, 'description': 'first'},
+    ], timestamp=NOW)
+    detector._save_opportunities([
+        {'contract_id': 1, 'opportunity_type': 'overpriced', 'score': 65.0, 'description': 'second'},
+    ], timestamp=NOW + timedelta(minutes=15))
+
+    db.expire_all()
+    saved = db.query(TradingOpportunity).order_by(TradingOpportunity.id).all()
+    assert [(opp.contract_id, opp.opportunity_type, opp.score, opp.description, opp.is_active) for opp in saved] == [
+        (1, 'overpriced', 10.0, None, False),
+        (1, 'overpriced', 65.0, 'second', True),
+        (2, 'gamma_scalp', 70.0, 'first', True),
+    ]
+    assert saved[1].timestamp == NOW + timedelta(minutes=15)
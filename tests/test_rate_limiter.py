@@ -0,0 +1,32 @@
+"""Tests for the client-side API rate limiter"""
+import time
+
+from rate_limiter import TokenBucket
+
+
+def test_acquire_waits_for_the_oldest_call_to_age_out():
+    bucket = TokenBucket(2, period=0.2)
+    start = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.2
+
+
+def test_saturate_blocks_a_full_period_even_with_free_slots():
+    bucket = TokenBucket(5, period=0.2)
+    bucket.acquire()
+    bucket.saturate()
+    start = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.2
+
+
+def test_saturate_blocks_a_full_period_when_the_window_is_full():
+    bucket = TokenBucket(1, period=0.2)
+    bucket.acquire()
+    time.sleep(0.15)
+    bucket.saturate()
+    start = time.monotonic()
+    bucket.acquire()
+    # Without the block the oldest call would age out after ~0.05s
+    assert time.monotonic() - start >= 0.2